@@ -0,0 +1,263 @@
+"""Benchmark: end-to-end latency and throughput with stand-in models.
+
+Runs the web app and the ml worker drain loop in one process, against an
+in-memory mongomock database (--mongomock) or the MONGO_URI server (in a
+separate --dbname that is dropped first). Speech to text and the summarizer
+are replaced by stubs that sleep --stt-ms per recording and --summary-ms per
+summary batch, so the numbers measure our own hot paths: uploads, queue
+claims, caches, result writes and result polling.
+
+Each of --users simulated users signs up, logs in, then uploads --recordings
+recordings one after another and waits on /jobs/<id> for each result.
+Prints p50/p95/p99 per step and finished recordings per second.
+
+Run from the repo root:
+    python benchmarks/end_to_end.py --mongomock --users 20 --recordings 5
+"""
+
+# pylint: disable=import-error, wrong-import-position
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+from unittest.mock import patch
+
+from bson.objectid import ObjectId
+from gridfs import GridFSBucket
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# the ml client's client.py must win over the legacy shared/client.py
+sys.path.insert(0, os.path.join(ROOT, "machine-learning-client"))
+sys.path.append(os.path.join(ROOT, "web-app", "src"))
+sys.path.append(os.path.join(ROOT, "shared"))
+
+import app as web_app
+import client as ml_client
+import worker
+from cache import ResultCache
+from watcher import InsertSignal
+
+
+class MemoryGridFS:
+    """Keeps uploads in a dict, mongomock can't run gridfs."""
+
+    def __init__(self):
+        self.files = {}
+
+    def upload_from_stream(self, _filename, source, **_):
+        """store the whole stream under a fresh id"""
+        file_id = ObjectId()
+        self.files[file_id] = source.read()
+        return file_id
+
+    def open_download_stream(self, file_id):
+        """a file-like handle on a stored upload"""
+        return io.BytesIO(self.files[file_id])
+
+
+def use_database(database, audio_fs):
+    """Point both apps at the benchmark database."""
+    web_app.db.db = database
+    web_app.db.accounts = database.accounts
+    web_app.db.messages = database.messages
+    web_app.db.recordings = database.recordings
+    web_app.db.counters = database.counters
+    web_app.db.audio_fs = audio_fs
+
+    ml_client.db = database
+    ml_client.audio_collection = database.recordings
+    ml_client.messages_collection = database.messages
+    ml_client.audio_fs = audio_fs
+    ml_client.transcript_cache = ResultCache(database, "transcript")
+    ml_client.summary_cache = ResultCache(database, "summary")
+
+
+def stub_models(stt_ms, summary_ms):
+    """Patches that swap decoding, speech to text and the summarizer for sleeps.
+    Preprocessing passes the stub's bytes through, it needs decoded audio."""
+
+    def load_audio(stream):
+        return stream.read()
+
+    def transcribe(audio_data, on_segment=None):  # pylint: disable=unused-argument
+        time.sleep(stt_ms / 1000)
+        # unique per recording so the summary cache doesn't hide the summarizer
+        return f"Recording {hashlib.sha1(audio_data).hexdigest()} was transcribed."
+
+    def summarizer(texts, **_):
+        time.sleep(summary_ms / 1000)
+        return [{"summary_text": text[:30]} for text in texts]
+
+    return [
+        patch.object(ml_client, "load_audio", load_audio),
+        patch.object(ml_client, "preprocess", lambda audio_data: (audio_data, 0.0)),
+        patch.object(ml_client, "transcribe", transcribe),
+        patch.object(ml_client, "summarizer", summarizer),
+    ]
+
+
+class Results:
+    """Latency samples per step, shared by the user threads."""
+
+    def __init__(self):
+        self.samples = {}
+        self.finished = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def add(self, step, seconds):
+        """record one sample in milliseconds"""
+        with self.lock:
+            self.samples.setdefault(step, []).append(seconds * 1000)
+
+    def count(self, done):
+        """count a recording that finished or timed out"""
+        with self.lock:
+            if done:
+                self.finished += 1
+            else:
+                self.failed += 1
+
+
+def percentile(values, fraction):
+    """nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def timed(results, step, func, *args, **kwargs):
+    """call func and record how long it took"""
+    started = time.perf_counter()
+    response = func(*args, **kwargs)
+    results.add(step, time.perf_counter() - started)
+    return response
+
+
+def run_user(name, args, results):
+    """one simulated user: signup, login, then upload and wait, recording by recording"""
+    user = web_app.app.test_client()
+    credentials = {"username": name, "password": "benchmark"}
+    timed(results, "signup", user.post, "/signup", data=credentials)
+    timed(results, "login", user.post, "/login", data=credentials)
+
+    for _ in range(args.recordings):
+        started = time.perf_counter()
+        response = timed(
+            results,
+            "upload",
+            user.post,
+            "/upload",
+            data=os.urandom(args.audio_bytes),
+            content_type="audio/webm",
+        )
+        job_id = response.get_json()["job_id"]
+
+        uploaded = time.perf_counter()
+        deadline = uploaded + args.timeout
+        status = None
+        while status != "done" and time.perf_counter() < deadline:
+            status = user.get(f"/jobs/{job_id}?wait=5").get_json()["status"]
+        if status == "done":
+            results.add("result wait", time.perf_counter() - uploaded)
+            results.add("end to end", time.perf_counter() - started)
+        results.count(status == "done")
+
+
+def run(args):
+    """Start the workers, run every user to completion, return (results, seconds)."""
+    worker.POLL_INTERVAL = args.poll_interval
+    web_app.JOB_POLL_INTERVAL = args.job_poll_interval
+    web_app.app.config["TESTING"] = True
+
+    stop_event = threading.Event()
+    inserts = InsertSignal()
+    drainers = [
+        threading.Thread(
+            target=worker.drain, args=(ml_client, f"bench.{i}", stop_event, inserts)
+        )
+        for i in range(args.workers)
+    ]
+    for thread in drainers:
+        thread.start()
+
+    results = Results()
+    run_id = os.urandom(4).hex()
+    users = [
+        threading.Thread(target=run_user, args=(f"bench-{run_id}-{i}", args, results))
+        for i in range(args.users)
+    ]
+    started = time.perf_counter()
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stop_event.set()
+    inserts.notify()
+    for thread in drainers:
+        thread.join()
+    return results, elapsed
+
+
+def main():
+    """Run the load and print latency percentiles and throughput."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongomock", action="store_true")
+    parser.add_argument("--dbname", default="speech2text_bench")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--recordings", type=int, default=5, help="per user")
+    parser.add_argument("--workers", type=int, default=4, help="drain threads")
+    parser.add_argument("--stt-ms", type=float, default=200)
+    parser.add_argument("--summary-ms", type=float, default=100)
+    parser.add_argument("--audio-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--job-poll-interval", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=60, help="per recording")
+    parser.add_argument("--verbose", action="store_true", help="keep app output")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock  # pylint: disable=import-outside-toplevel
+
+        database = mongomock.MongoClient()[args.dbname]
+        audio_fs = MemoryGridFS()
+    else:
+        web_app.db.connection.drop_database(args.dbname)
+        database = web_app.db.connection[args.dbname]
+        audio_fs = GridFSBucket(database, bucket_name="audio")
+        web_app.db.ensure_indexes(database)
+    use_database(database, audio_fs)
+
+    output = (
+        contextlib.nullcontext()
+        if args.verbose
+        else contextlib.redirect_stdout(io.StringIO())
+    )
+    with contextlib.ExitStack() as stack:
+        for stub in stub_models(args.stt_ms, args.summary_ms):
+            stack.enter_context(stub)
+        with output:
+            results, elapsed = run(args)
+
+    print(
+        f"{'step':>12} | {'count':>6} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}"
+    )
+    for step, values in results.samples.items():
+        print(
+            f"{step:>12} | {len(values):>6} | {percentile(values, 0.50):>8.1f} | "
+            f"{percentile(values, 0.95):>8.1f} | {percentile(values, 0.99):>8.1f}"
+        )
+    print(
+        f"{results.finished} recordings in {elapsed:.2f}s = "
+        f"{results.finished / elapsed:.2f} recordings/s, {results.failed} timed out"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Decoding of uploaded recordings into what the recognizers want.
+
+The browser's MediaRecorder uploads webm/opus, which sr.AudioFile can't read.
+decode_pcm() demuxes and decodes it in memory with PyAV (ffmpeg's libraries,
+no subprocess or temp files), resampling once to 16kHz 16-bit mono, and
+load_audio() wraps the result in an sr.AudioData without another copy.
+preprocess() trims the silence before and after the speech and evens out
+the level, so the recognizers get less audio at a consistent loudness.
+speech_segments() finds the spoken parts by frame energy so long recordings
+can be transcribed piece by piece.
+"""
+
+# pylint: disable=import-error
+
+import os
+
+import av
+import numpy as np
+import speech_recognition as sr
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # bytes, s16
+
+# voice activity detection, see speech_segments()
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+# a pause at least this long ends a segment
+VAD_MIN_SILENCE_MS = int(os.getenv("VAD_MIN_SILENCE_MS", "400"))
+# silence kept around each segment so words aren't clipped
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "150"))
+# longer stretches of speech are cut anyway so segments stay parallel
+VAD_MAX_SEGMENT_S = float(os.getenv("VAD_MAX_SEGMENT_S", "15"))
+# a frame is speech when it is this many times louder than the quietest frames
+VAD_NOISE_RATIO = float(os.getenv("VAD_NOISE_RATIO", "3"))
+# and at least this loud (s16 RMS, ~-50dBFS) so near-digital-silence never counts
+VAD_MIN_RMS = float(os.getenv("VAD_MIN_RMS", "100"))
+
+# trim and normalize before speech to text, see preprocess()
+AUDIO_PREPROCESS = os.getenv("AUDIO_PREPROCESS", "1") == "1"
+# level the speech is brought to, RMS in dBFS
+TARGET_DBFS = float(os.getenv("AUDIO_TARGET_DBFS", "-20"))
+# most a quiet recording is boosted, so a far away speaker doesn't become hiss
+MAX_GAIN_DB = float(os.getenv("AUDIO_MAX_GAIN_DB", "20"))
+# peaks are kept 1dB below full scale so nothing clips
+PEAK_LIMIT = 32767 * 10 ** (-1 / 20)
+
+
+class DecodeError(Exception):
+    """The upload isn't audio ffmpeg can read."""
+
+
+def decode_pcm(stream, sample_rate=SAMPLE_RATE):
+    """Decode any ffmpeg-readable audio from a file-like object to s16 mono PCM.
+    Returns a bytearray, each decoded frame is copied into it exactly once."""
+    pcm = bytearray()
+    resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+    with av.open(stream, mode="r") as container:
+        for frame in container.decode(audio=0):
+            for out in resampler.resample(frame):
+                # plane buffers can be padded past the last sample
+                pcm += memoryview(out.planes[0])[: out.samples * SAMPLE_WIDTH]
+    for out in resampler.resample(None):
+        pcm += memoryview(out.planes[0])[: out.samples * SAMPLE_WIDTH]
+    return pcm
+
+
+def load_audio(stream, sample_rate=SAMPLE_RATE):
+    """Decode a recording straight into an AudioData for the recognizers.
+    The rate already matches what the backends ask for, so they don't convert again."""
+    try:
+        pcm = decode_pcm(stream, sample_rate)
+    except av.error.FFmpegError as e:  # pylint: disable=c-extension-no-member
+        raise DecodeError(str(e)) from e
+    return sr.AudioData(pcm, sample_rate, SAMPLE_WIDTH)
+
+
+def frame_rms(samples, frame_len):
+    """RMS energy of each whole frame of an int16 array, as one vectorized pass."""
+    count = len(samples) // frame_len
+    frames = samples[: count * frame_len].reshape(count, frame_len)
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+
+
+def speech_threshold(rms):
+    """Frame RMS above which a frame counts as speech: louder than the noise
+    floor, but never more than half the loudest frame so a recording without
+    any pause still counts as speech."""
+    noise_floor = np.percentile(rms, 10)
+    return max(min(noise_floor * VAD_NOISE_RATIO, rms.max() / 2), VAD_MIN_RMS)
+
+
+def normalize(samples, level):
+    """Scale int16 samples whose speech has RMS level to TARGET_DBFS, boosting
+    by at most MAX_GAIN_DB and never past PEAK_LIMIT."""
+    peak = np.abs(samples.astype(np.int32)).max()
+    gain = min(
+        10 ** ((TARGET_DBFS - 20 * np.log10(level / 32768)) / 20),
+        10 ** (MAX_GAIN_DB / 20),
+        PEAK_LIMIT / max(peak, 1),
+    )
+    if abs(gain - 1) <= 0.05:
+        return samples
+    return np.rint(samples.astype(np.float32) * gain).astype(np.int16)
+
+
+def preprocess(audio_data):
+    """Cut the silence before the first and after the last speech frame (keeping
+    VAD_PAD_MS) and scale the speech to TARGET_DBFS, vectorized over the whole
+    recording. Returns (AudioData, seconds cut). Audio without any speech frame
+    is returned untouched, the recognizer gets the final word on it. Decoding
+    already downmixed to mono."""
+    samples = np.frombuffer(audio_data.frame_data, dtype=np.int16)
+    rate = audio_data.sample_rate
+    frame_len = rate * VAD_FRAME_MS // 1000
+    if len(samples) < frame_len:
+        return audio_data, 0.0
+
+    rms = frame_rms(samples, frame_len)
+    voiced = np.flatnonzero(rms > speech_threshold(rms))
+    if len(voiced) == 0:
+        return audio_data, 0.0
+
+    pad = rate * VAD_PAD_MS // 1000
+    start = max(0, int(voiced[0]) * frame_len - pad)
+    end = (int(voiced[-1]) + 1) * frame_len
+    # the frames only cover whole frame_lens, a voiced last frame keeps the tail
+    end = len(samples) if voiced[-1] == len(rms) - 1 else min(len(samples), end + pad)
+    kept = samples[start:end]
+
+    # the level of the speech frames only, the pauses would drag it down
+    kept = normalize(kept, np.sqrt(np.mean(np.square(rms[voiced]))))
+    trimmed = (len(samples) - len(kept)) / rate
+    return sr.AudioData(kept.tobytes(), rate, audio_data.sample_width), trimmed
+
+
+def split_evenly(start, end, max_len):
+    """(start, end) cut into the fewest equal pieces no longer than max_len."""
+    pieces = -(-(end - start) // max_len)
+    bounds = np.linspace(start, end, pieces + 1).astype(int)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def speech_segments(pcm, sample_rate=SAMPLE_RATE):
+    """Split s16 mono PCM on silence, returns (start, end) sample offsets of speech.
+    Pauses shorter than VAD_MIN_SILENCE_MS are kept inside a segment and
+    segments longer than VAD_MAX_SEGMENT_S are cut into equal pieces."""
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    frame_len = sample_rate * VAD_FRAME_MS // 1000
+    if len(samples) < frame_len:
+        return [(0, len(samples))] if len(samples) else []
+
+    rms = frame_rms(samples, frame_len)
+    voiced = np.concatenate(([0], (rms > speech_threshold(rms)).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(voiced))
+    starts, ends = edges[::2], edges[1::2]
+    if len(starts) == 0:
+        return []
+
+    # merge voiced runs separated by pauses too short to be a break
+    keep = (starts[1:] - ends[:-1]) * VAD_FRAME_MS >= VAD_MIN_SILENCE_MS
+    starts = np.concatenate((starts[:1], starts[1:][keep]))
+    ends = np.concatenate((ends[:-1][keep], ends[-1:]))
+
+    pad = sample_rate * VAD_PAD_MS // 1000
+    max_len = int(sample_rate * VAD_MAX_SEGMENT_S)
+    segments = []
+    for start, end in zip(starts * frame_len, ends * frame_len):
+        start = max(0, int(start) - pad)
+        end = len(samples) if end >= len(rms) * frame_len else int(end) + pad
+        segments.extend(split_evenly(start, min(len(samples), end), max_len))
+    return segments
@@ -0,0 +1,229 @@
+"""Re-run speech to text and summaries over existing recordings.
+
+For after a model change: every processed recording (optionally the failed
+ones too, or one user's) is transcribed and summarized again, skipping the
+result caches, which still hold the old models' output.
+
+Recordings are read in _id order, --batch-size at a time, each batch a fresh
+range query after the last _id, so no cursor sits idle for the hours a big
+backfill takes. Batches go to a pool of --processes processes that load the
+models once; each runs a batch on --threads threads so their summaries
+share a model batch, like the worker pool does. Results are written per
+batch with unordered bulk_write()s, one for messages and one for recordings.
+
+Batches finish out of order but are written in order, and after each one
+the last _id is saved to --checkpoint, so an interrupted backfill picks up
+where it stopped when run again with the same options (--restart ignores
+the checkpoint).
+
+Run from machine-learning-client/:
+    python backfill.py --processes 4 --threads 4 --batch-size 32
+"""
+
+# pylint: disable=import-error
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+SHARED_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../shared"))
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+# pylint: disable=wrong-import-position
+from mongo import get_database
+from stt import get_transcriber
+
+BATCH_SIZE = 32
+CHECKPOINT = "backfill.checkpoint.json"
+
+
+def backfill_query(include_failed=False, user_id=None):
+    """Recordings to re-run: the processed ones, plus failed ones if asked.
+    Queued recordings are left to the workers, and recordings whose audio the
+    retention policy deleted have nothing to re-run."""
+    query = (
+        {"$or": [{"processed": True}, {"failed": True}]}
+        if include_failed
+        else {"processed": True}
+    )
+    query["storage.policy"] = {"$ne": "delete"}
+    if user_id is not None:
+        query["user_id"] = ObjectId(user_id)
+    return query
+
+
+def load_checkpoint(path, query):
+    """The checkpoint saved for the same query, or a fresh one."""
+    try:
+        with open(path, encoding="utf-8") as handle:
+            checkpoint = json.load(handle)
+    except FileNotFoundError:
+        return {"query": repr(query), "last_id": None, "done": 0, "failed": 0}
+    if checkpoint["query"] != repr(query):
+        raise SystemExit(
+            f"{path} belongs to a backfill with other options, "
+            "rerun with those or pass --restart"
+        )
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    """Write the checkpoint so a crash mid-write keeps the previous one."""
+    partial = f"{path}.part"
+    with open(partial, "w", encoding="utf-8") as handle:
+        json.dump(checkpoint, handle)
+    os.replace(partial, path)
+
+
+def batches(collection, query, last_id, batch_size):
+    """Recordings matching query after last_id, in _id order, batch by batch."""
+    while True:
+        page = query if last_id is None else {**query, "_id": {"$gt": last_id}}
+        batch = list(collection.find(page, sort=[("_id", 1)], limit=batch_size))
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]["_id"]
+
+
+def load_models():
+    """Pool process initializer: load the models once per process."""
+    import client  # pylint: disable=import-outside-toplevel
+
+    client.summarizer.load()
+    try:
+        get_transcriber()
+    except client.sr.RequestError as e:
+        print(f"speech recognition unavailable: {e}")
+
+
+def reprocess_batch(docs, threads):
+    """Runs in a pool process: fresh results for a batch of recordings, one per
+    doc, None where processing failed."""
+    import client  # pylint: disable=import-outside-toplevel
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(
+            pool.map(lambda doc: client.build_result(doc, use_cache=False), docs)
+        )
+
+
+def write_results(database, docs, results):
+    """Store a batch's results with one unordered bulk write per collection,
+    returns how many recordings were written."""
+    import client  # pylint: disable=import-outside-toplevel
+
+    message_ops, recording_ops = [], []
+    for doc, result_doc in zip(docs, results):
+        if result_doc is None:
+            continue
+        message_update, recording_update = client.result_updates(result_doc)
+        message_ops.append(
+            UpdateOne({"source_audio_id": doc["_id"]}, message_update, upsert=True)
+        )
+        # a failed recording that worked this time isn't failed any more
+        recording_update["$unset"]["failed"] = ""
+        recording_ops.append(UpdateOne({"_id": doc["_id"]}, recording_update))
+    if not message_ops:
+        return 0
+    try:
+        database.messages.bulk_write(message_ops, ordered=False)
+    except BulkWriteError as e:
+        # unordered, so everything but these went through
+        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+        print(f"{len(failed)} messages failed to write")
+        recording_ops = [op for i, op in enumerate(recording_ops) if i not in failed]
+    if recording_ops:
+        # recordings only change flags, a failure just leaves them as they were
+        try:
+            database.recordings.bulk_write(recording_ops, ordered=False)
+        except BulkWriteError as e:
+            print(f"{len(e.details.get('writeErrors', []))} recordings not updated")
+    return len(recording_ops)
+
+
+def report_progress(checkpoint, total, started, done_at_start):
+    """One progress line with throughput and time left."""
+    processed = checkpoint["done"] + checkpoint["failed"]
+    elapsed = time.monotonic() - started
+    rate = (processed - done_at_start) / elapsed if elapsed else 0.0
+    left = total - processed
+    eta = f"{left / rate / 60:.1f} min" if rate else "?"
+    print(
+        f"{processed}/{total} recordings ({checkpoint['failed']} failed), "
+        f"{rate:.2f}/s, ETA {eta}"
+    )
+
+
+def run(database, executor, options):
+    """Drive the backfill: keep up to 2 batches per process in flight, write
+    and checkpoint them in order. Returns the final checkpoint."""
+    query = backfill_query(options.include_failed, options.user)
+    if options.restart and os.path.exists(options.checkpoint):
+        os.remove(options.checkpoint)
+    checkpoint = load_checkpoint(options.checkpoint, query)
+    last_id = ObjectId(checkpoint["last_id"]) if checkpoint["last_id"] else None
+
+    done_at_start = checkpoint["done"] + checkpoint["failed"]
+    total = done_at_start + database.recordings.count_documents(
+        query if last_id is None else {**query, "_id": {"$gt": last_id}}
+    )
+    print(f"{total - done_at_start} recordings to process")
+    started = time.monotonic()
+
+    def finish(docs, future):
+        written = write_results(database, docs, future.result())
+        checkpoint["done"] += written
+        checkpoint["failed"] += len(docs) - written
+        checkpoint["last_id"] = str(docs[-1]["_id"])
+        save_checkpoint(options.checkpoint, checkpoint)
+        report_progress(checkpoint, total, started, done_at_start)
+
+    in_flight = collections.deque()
+    for docs in batches(database.recordings, query, last_id, options.batch_size):
+        in_flight.append(
+            (docs, executor.submit(reprocess_batch, docs, options.threads))
+        )
+        if len(in_flight) >= 2 * options.processes:
+            finish(*in_flight.popleft())
+    while in_flight:
+        finish(*in_flight.popleft())
+    return checkpoint
+
+
+def main():
+    """Parse the options and run the backfill on a process pool."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=4, help="per process")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT)
+    parser.add_argument("--restart", action="store_true", help="ignore checkpoint")
+    parser.add_argument("--include-failed", action="store_true")
+    parser.add_argument("--user", help="only this user id's recordings")
+    options = parser.parse_args()
+
+    with ProcessPoolExecutor(
+        max_workers=options.processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=load_models,
+    ) as executor:
+        checkpoint = run(get_database(), executor, options)
+    print(
+        f"Backfill finished: {checkpoint['done']} recordings re-processed, "
+        f"{checkpoint['failed']} failed"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Micro-batching for the summarizer.
+
+Callers submit one transcript at a time and get a Future back. A background
+thread collects whatever is pending for up to a short window (or until the
+batch is full) and runs the whole batch through the model in one padded
+call, then hands each caller its own result.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class SummaryBatcher:
+    """Collects single summarize requests into batches for one model call."""
+
+    def __init__(self, run_batch, batch_size=8, window_ms=50):
+        """run_batch takes a list of texts and returns a list of summaries in order."""
+        self.run_batch = run_batch
+        self.batch_size = max(1, batch_size)
+        self.window = window_ms / 1000
+        self._pending = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, text):
+        """Queue a text for summarization, returns a Future with the summary."""
+        self._ensure_started()
+        future = Future()
+        self._pending.put((text, future))
+        return future
+
+    def summarize(self, text):
+        """Blocking helper, submit and wait for the result."""
+        return self.submit(text).result()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Block for the first item, then gather more until the window or batch fills."""
+        batch = [self._pending.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                summaries = self.run_batch(texts)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), summary in zip(batch, summaries):
+                future.set_result(summary)
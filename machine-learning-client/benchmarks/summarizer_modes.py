@@ -0,0 +1,86 @@
+"""Benchmark: summarizer startup time, memory and latency per SUMMARIZER_MODE.
+
+Each mode is measured in a fresh subprocess so load time and peak memory
+aren't skewed by a model that is already in memory. Run the modes once
+beforehand (or pass --warm) so the quantized/ONNX copies exist in the cache.
+
+Run from machine-learning-client/:
+    python benchmarks/summarizer_modes.py --modes fp32 int8 onnx --runs 10
+"""
+
+# pylint: disable=import-error, wrong-import-position
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from summarizer import LazySummarizer
+
+TRANSCRIPT = (
+    "The meeting was moved to Thursday because half the team is travelling. "
+    "We need to finish the report before the deadline on Friday afternoon, "
+    "so everyone should send their sections to Maria by Wednesday night. "
+    "After that we will review the numbers together and send it out."
+)
+
+
+def measure(mode, runs):
+    """Load one mode and time it, returns a dict of results."""
+    start = time.perf_counter()
+    summarizer = LazySummarizer(mode)
+    summarizer.load()
+    load_s = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        summarizer(TRANSCRIPT, max_length=20, min_length=10, do_sample=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "mode": mode,
+        "load_s": load_s,
+        # ru_maxrss is kilobytes on linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "median_ms": statistics.median(latencies) if latencies else 0.0,
+    }
+
+
+def main():
+    """Run every mode in its own process and print a comparison table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", nargs="+", default=["fp32", "int8"])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--warm", action="store_true", help="load each mode first")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.runs)))
+        return
+
+    rows = []
+    for mode in args.modes:
+        command = [sys.executable, __file__, "--child", mode, "--runs", str(args.runs)]
+        if args.warm:
+            subprocess.run(command[:-2] + ["--runs", "0"], check=True)
+        output = subprocess.run(command, check=True, capture_output=True, text=True)
+        rows.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':>6} | {'load s':>7} | {'peak RSS MB':>11} | {'median ms':>9}")
+    for row in rows:
+        print(
+            f"{row['mode']:>6} | {row['load_s']:>7.2f} | "
+            f"{row['peak_rss_mb']:>11.0f} | {row['median_ms']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
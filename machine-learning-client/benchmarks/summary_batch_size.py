@@ -0,0 +1,59 @@
+"""Benchmark: summarizer throughput (transcripts/sec) for different batch sizes.
+
+Run from machine-learning-client/:
+    python benchmarks/summary_batch_size.py --transcripts 32 --sizes 1 2 4 8 16
+"""
+
+# pylint: disable=import-error, wrong-import-position
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import client
+
+SENTENCES = [
+    "I went to the store this morning to pick up groceries for the week.",
+    "The meeting was moved to Thursday because half the team is travelling.",
+    "We need to finish the report before the deadline on Friday afternoon.",
+    "My brother called to say the flight landed an hour late.",
+    "The new library downtown has a great reading room on the top floor.",
+]
+
+
+def make_transcripts(count):
+    """Build transcripts of varying length so batches actually need padding."""
+    return [
+        " ".join(SENTENCES[j % len(SENTENCES)] for j in range(2 + i % 6))
+        for i in range(count)
+    ]
+
+
+def bench(batch_size, transcripts):
+    """Summarize every transcript in batches of batch_size, return transcripts/sec."""
+    start = time.perf_counter()
+    for i in range(0, len(transcripts), batch_size):
+        client.summarize_batch(transcripts[i : i + batch_size])
+    return len(transcripts) / (time.perf_counter() - start)
+
+
+def main():
+    """Print a small throughput table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transcripts", type=int, default=32)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    transcripts = make_transcripts(args.transcripts)
+    client.summarize_batch(transcripts[:1])  # warm up
+
+    print(f"{'batch size':>10} | {'transcripts/sec':>15}")
+    for size in args.sizes:
+        print(f"{size:>10} | {bench(size, transcripts):>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Content-addressed result cache, stored in Mongo.
+
+Re-uploads of the same audio and transcripts we have already summarized are
+looked up by sha256 instead of going back through the models:
+
+    transcript  keyed by the hash of the uploaded audio bytes
+    summary     keyed by the hash of the transcript text
+
+Each key also names the model that produced the value (the STT backend, the
+summarizer model and mode), so switching models starts a fresh set of
+entries instead of serving the old model's results; the stale ones age out.
+The cache is only an optimization: if Mongo fails, a get is a miss and a put
+is skipped, and the result is computed as if there were no cache.
+
+Entries expire CACHE_TTL_SECONDS after their last hit (TTL index) and each
+kind is trimmed back to CACHE_MAX_ENTRIES, oldest first. Hits and misses are
+counted in 'cache_stats' so hit rates survive restarts and cover every worker.
+"""
+
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+CACHE_ENABLED = os.getenv("ML_CACHE_ENABLED", "1") == "1"
+CACHE_TTL_SECONDS = int(os.getenv("ML_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("ML_CACHE_MAX_ENTRIES", "10000"))
+# how many writes between size checks, counting the collection isn't free
+CACHE_EVICT_EVERY = int(os.getenv("ML_CACHE_EVICT_EVERY", "50"))
+
+HASH_CHUNK = 1024 * 1024
+
+
+def hash_stream(stream):
+    """sha256 of a seekable file-like object, read in chunks and rewound after."""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(HASH_CHUNK), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def hash_text(text):
+    """sha256 of a string."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """One kind of cached result (transcript or summary) in a shared collection."""
+
+    def __init__(self, database, kind, max_entries=CACHE_MAX_ENTRIES, model=""):
+        self.entries = database["cache"]
+        self.stats = database["cache_stats"]
+        self.kind = kind
+        self.model = model
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _id(self, key):
+        return f"{self.kind}:{self.model}:{key}" if self.model else f"{self.kind}:{key}"
+
+    def get(self, key):
+        """The cached value for key or None, a hit refreshes the entry's TTL."""
+        if not CACHE_ENABLED:
+            return None
+        try:
+            entry = self.entries.find_one_and_update(
+                {"_id": self._id(key)},
+                {
+                    "$set": {"last_used": datetime.now(timezone.utc)},
+                    "$inc": {"hits": 1},
+                },
+            )
+            self.stats.update_one(
+                {"_id": self.kind},
+                {"$inc": {"hits" if entry else "misses": 1}},
+                upsert=True,
+            )
+        except PyMongoError as e:
+            print(f"[cache] {self.kind} lookup failed, treating as a miss: {e}")
+            return None
+        return entry["value"] if entry else None
+
+    def put(self, key, value):
+        """Store a value, trimming the oldest entries now and then."""
+        if not CACHE_ENABLED:
+            return
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._writes += 1
+            check = self._writes % CACHE_EVICT_EVERY == 0
+        try:
+            self.entries.update_one(
+                {"_id": self._id(key)},
+                {
+                    "$set": {"kind": self.kind, "value": value, "last_used": now},
+                    "$setOnInsert": {"created": now, "hits": 0},
+                },
+                upsert=True,
+            )
+            if check:
+                self.evict()
+        except PyMongoError as e:
+            print(f"[cache] could not store {self.kind}: {e}")
+
+    def evict(self):
+        """Delete the least recently used entries over max_entries, returns how many."""
+        excess = self.entries.count_documents({"kind": self.kind}) - self.max_entries
+        if excess <= 0:
+            return 0
+        oldest = self.entries.find(
+            {"kind": self.kind}, {"_id": 1}, sort=[("last_used", ASCENDING)]
+        ).limit(excess)
+        ids = [doc["_id"] for doc in oldest]
+        return self.entries.delete_many({"_id": {"$in": ids}}).deleted_count
+
+    def hit_rate(self):
+        """hits, misses and hit rate since the stats were started."""
+        doc = self.stats.find_one({"_id": self.kind}) or {}
+        hits, misses = doc.get("hits", 0), doc.get("misses", 0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+def ensure_cache_indexes(database, ttl_seconds=CACHE_TTL_SECONDS):
+    """TTL expiry on last use, and the index eviction sorts by."""
+    try:
+        database["cache"].create_index(
+            [("last_used", ASCENDING)], expireAfterSeconds=ttl_seconds
+        )
+        database["cache"].create_index([("kind", ASCENDING), ("last_used", ASCENDING)])
+    except PyMongoError as e:
+        print(f"Could not create cache indexes: {e}")
+        return False
+    return True
@@ -5,81 +5,289 @@ transcribes them, summarizes them, and writes results into 'messages'.
 # pylint: disable=import-error
 
 from datetime import datetime, timezone
+import functools
+import gzip
 import io
-from pymongo import MongoClient
+import os
+import sys
+from bson.objectid import ObjectId
+from gridfs import GridFSBucket
 import speech_recognition as sr
-from transformers import pipeline
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../shared")))
+
+# pylint: disable=wrong-import-position
+from mongo import get_database, ensure_indexes, queue_depth
+import metrics
+import metrics_store
+from batching import SummaryBatcher
+from leases import claim_next, release
+from stt import backend_identity, transcribe
+from audio import AUDIO_PREPROCESS, DecodeError, load_audio, preprocess
+from cache import ResultCache, ensure_cache_indexes, hash_stream, hash_text
+from summarizer import LazySummarizer
+from lifecycle import AUDIO_ARCHIVE_DIR
+
+# the worker pool reports these, /metrics can only add up metrics it registered
+import pool_metrics  # pylint: disable=unused-import
 
 app = Flask(__name__)
 
 
-recognizer = sr.Recognizer()
-summarizer = pipeline("summarization", model="sshleifer/distilbart-cnn-12-6", device=-1)
+# built on first use, see summarizer.py for SUMMARIZER_MODE (fp32/int8/onnx)
+summarizer = LazySummarizer()
 
-client = MongoClient("mongodb://mongodb:27017")
-db = client["speech2text"]
+db = get_database()
 audio_collection = db["recordings"]
 messages_collection = db["messages"]
+audio_fs = GridFSBucket(db, bucket_name="audio")
+# entries are per model, a new STT backend or summarizer doesn't reuse old results
+transcript_cache = ResultCache(
+    db,
+    "transcript",
+    model=backend_identity() + ("+preprocess" if AUDIO_PREPROCESS else ""),
+)
+summary_cache = ResultCache(db, "summary", model=summarizer.identity)
+
+HTTP_WORKER_ID = "http"
+
+STAGE_SECONDS = metrics.histogram(
+    "ml_stage_seconds",
+    "Time spent per pipeline stage "
+    "(queue_wait, fetch, decode, preprocess, transcribe, summarize, mongo_write)",
+)
+TRIMMED_SECONDS = metrics.histogram(
+    "ml_audio_trimmed_seconds",
+    "Seconds of silence cut from each recording before speech to text",
+    (0, 0.5, 1, 2, 5, 10, 20, 30, 60),
+)
+RECORDINGS_TOTAL = metrics.counter(
+    "ml_recordings_total", "Recordings processed, by outcome"
+)
+metrics.gauge(
+    "recordings_queue_depth", "Recordings waiting to be processed"
+).set_function(lambda: queue_depth(db))
 
+SUMMARY_BATCH_SIZE = int(os.getenv("ML_SUMMARY_BATCH_SIZE", "8"))
+SUMMARY_BATCH_WINDOW_MS = int(os.getenv("ML_SUMMARY_BATCH_WINDOW_MS", "50"))
 
-def process_audio():
-    """Processes the latest unprocessed audio blob."""
-    audio_doc = audio_collection.find_one(
-        {"processed": {"$ne": True}}, sort=[("timestamp", -1)]
+
+def summarize_batch(texts):
+    """Runs a list of transcripts through the summarizer in one padded batch."""
+    results = summarizer(
+        texts,
+        max_length=20,
+        min_length=10,
+        do_sample=False,
+        batch_size=len(texts),
+        truncation=True,
     )
+    return [result["summary_text"] for result in results]
+
+
+summary_batcher = SummaryBatcher(
+    summarize_batch, batch_size=SUMMARY_BATCH_SIZE, window_ms=SUMMARY_BATCH_WINDOW_MS
+)
+
+
+def process_audio(recording_id=None):
+    """Processes the given recording, or the oldest unprocessed audio blob.
+    Goes through the same lease as the worker pool so the two never overlap."""
+    query = {"_id": ObjectId(recording_id)} if recording_id is not None else None
+    audio_doc = claim_next(audio_collection, HTTP_WORKER_ID, query)
 
     if not audio_doc:
         print("No new audio recordings found.")
         return
 
-    audio_blob = audio_doc.get("audioData")
+    if not process_document(audio_doc):
+        release(audio_collection, audio_doc)
+
+
+def open_audio(audio_doc):
+    """Returns a file-like handle on a recording's audio, streamed from gridfs.
+    Older recordings that still carry an inline audioData blob are wrapped as is,
+    audio moved out by the retention policy (see lifecycle.py) is read from the
+    archive."""
+    if "audioFileId" in audio_doc:
+        return audio_fs.open_download_stream(audio_doc["audioFileId"])
+    storage = audio_doc.get("storage")
+    if storage is not None:
+        if "path" not in storage:
+            raise DecodeError("the audio was deleted by the retention policy")
+        return gzip.open(os.path.join(AUDIO_ARCHIVE_DIR, storage["path"]), "rb")
+    return io.BytesIO(audio_doc.get("audioData"))
+
+
+def store_partial(audio_doc, index, text, total):
+    """Saves one finished segment's transcript so the web app can show progress."""
+    messages_collection.update_one(
+        {"source_audio_id": audio_doc["_id"]},
+        {
+            "$set": {
+                f"partials.{index}": text,
+                "segments": total,
+                "status": "transcribing",
+                "user_id": audio_doc.get("user_id"),
+            }
+        },
+        upsert=True,
+    )
+
+
+def preprocess_audio(audio_data, timings):
+    """Trims the silence around the speech and levels it before speech to text."""
+    with STAGE_SECONDS.time(stage="preprocess") as timer:
+        audio_data, trimmed = preprocess(audio_data)
+    timings["preprocess_ms"] = timer.ms
+    TRIMMED_SECONDS.observe(trimmed)
+    print(f"[Preprocess] trimmed {trimmed:.2f}s of silence")
+    return audio_data
 
+
+def build_result(audio_doc, use_cache=True, on_segment=None):
+    """Transcribes and summarizes one recordings document, returns the messages
+    document for it or None if processing failed. use_cache=False skips cache
+    lookups (but still refreshes the cache), for re-runs with new models."""
+    timings = {}
     try:
-        with sr.AudioFile(io.BytesIO(audio_blob)) as source:
-            audio_data = recognizer.record(source)
+        with open_audio(audio_doc) as audio_stream:
+            with STAGE_SECONDS.time(stage="fetch"):
+                audio_hash = hash_stream(audio_stream)
+            text = transcript_cache.get(audio_hash) if use_cache else None
+            if text is None:
+                with STAGE_SECONDS.time(stage="decode") as timer:
+                    audio_data = load_audio(audio_stream)
+                timings["decode_ms"] = timer.ms
 
-        text = recognizer.recognize_google(audio_data)
+        if text is None:
+            if AUDIO_PREPROCESS:
+                audio_data = preprocess_audio(audio_data, timings)
+            with STAGE_SECONDS.time(stage="transcribe") as timer:
+                text = transcribe(audio_data, on_segment=on_segment)
+            timings["transcribe_ms"] = timer.ms
+            transcript_cache.put(audio_hash, text)
         print(f"[Transcribed] {text}")
 
-        summary = summarizer(text, max_length=20, min_length=10, do_sample=False)[0][
-            "summary_text"
-        ]
+        text_hash = hash_text(text)
+        summary = summary_cache.get(text_hash) if use_cache else None
+        if summary is None:
+            with STAGE_SECONDS.time(stage="summarize") as timer:
+                summary = summary_batcher.summarize(text)
+            timings["summarize_ms"] = timer.ms
+            summary_cache.put(text_hash, summary)
         print(f"Summary: {summary}")
 
+    except DecodeError as e:
+        print(f"Could not decode audio: {e}")
+        RECORDINGS_TOTAL.inc(outcome="decode_error")
+        return None
     except (KeyError, ValueError) as e:
         print(f"Summarization failed: {e}")  # pylint: disable=broad-exception-caught
-        return
+        RECORDINGS_TOTAL.inc(outcome="summarize_error")
+        return None
     except sr.UnknownValueError:
         print("Could not understand audio")
-        return
+        RECORDINGS_TOTAL.inc(outcome="unintelligible")
+        return None
     except sr.RequestError as e:
-        print(f"Google Speech API error: {e}")  # pylint: disable=broad-exception-caught
-        return
+        print(f"Speech recognition error: {e}")
+        RECORDINGS_TOTAL.inc(outcome="stt_error")
+        return None
     except Exception as e:  # pylint: disable=broad-exception-caught
         print(f"Unexpected error: {e}")
-        return
+        RECORDINGS_TOTAL.inc(outcome="error")
+        return None
 
-    result_doc = {
+    RECORDINGS_TOTAL.inc(outcome="done")
+    print(
+        "[Timing] " + ", ".join(f"{stage} {ms:.0f}ms" for stage, ms in timings.items())
+    )
+    return {
         "timestamp": datetime.now(timezone.utc),
         "transcript": text,
         "summary": summary,
         "source_audio_id": audio_doc["_id"],
+        # the uploader, so the web app only shows this transcript to them
+        "user_id": audio_doc.get("user_id"),
+        "audio_hash": audio_hash,
+        "timings": timings,
+        "status": "done",
     }
 
-    messages_collection.insert_one(result_doc)
-    audio_collection.update_one(
-        {"_id": audio_doc["_id"]}, {"$set": {"processed": True}}
+
+def result_updates(result_doc):
+    """(messages update, recordings update) that store a result, shared with
+    the bulk writes of backfill.py. Upserts so a recording re-run after a
+    crashed worker never gets two messages. Clearing search_indexed has the
+    web app's semantic search embed the new result."""
+    return (
+        {"$set": result_doc, "$unset": {"partials": "", "search_indexed": ""}},
+        {
+            "$set": {"processed": True, "processed_at": datetime.now(timezone.utc)},
+            "$unset": {"lease_owner": "", "lease_until": ""},
+        },
     )
+
+
+def process_document(audio_doc):
+    """Transcribes and summarizes one recordings document and stores the result.
+    Returns True once the result is written, False if processing failed."""
+    if isinstance(audio_doc["_id"], ObjectId):
+        # the id's timestamp is the upload time
+        waited = datetime.now(timezone.utc) - audio_doc["_id"].generation_time
+        STAGE_SECONDS.observe(waited.total_seconds(), stage="queue_wait")
+    result_doc = build_result(
+        audio_doc, on_segment=functools.partial(store_partial, audio_doc)
+    )
+    if result_doc is None:
+        return False
+
+    message_update, recording_update = result_updates(result_doc)
+    with STAGE_SECONDS.time(stage="mongo_write"):
+        messages_collection.update_one(
+            {"source_audio_id": audio_doc["_id"]}, message_update, upsert=True
+        )
+        audio_collection.update_one({"_id": audio_doc["_id"]}, recording_update)
     print("Latest audio processed and stored.")
+    return True
 
 
 @app.route("/process_audio", methods=["POST"])
 def api_to_process_audio():
-    """this should signal ml-client to process the audio put in the mongodb"""
-    process_audio()
+    """this should signal ml-client to process the audio put in the mongodb,
+    the web app sends the recording id of the job it just created"""
+    payload = request.get_json(silent=True) or {}
+    recording_id = payload.get("recording_id")
+    if recording_id is not None and not ObjectId.is_valid(recording_id):
+        return jsonify({"status": "error", "message": "Invalid recording id"}), 400
+    process_audio(recording_id)
     return jsonify({"status": "success", "message": "Audio processed"})
 
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint. Adds up this process and every worker pool or
+    HTTP worker process that reported recently, plus the current queue depth."""
+    others = metrics_store.snapshots(
+        db.metrics, exclude=metrics_store.process_id("http")
+    )
+    return Response(metrics.render(others), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/cache/stats")
+def cache_stats():
+    """hit rates of the transcript and summary caches"""
+    return jsonify(
+        {
+            "transcript": transcript_cache.hit_rate(),
+            "summary": summary_cache.hit_rate(),
+        }
+    )
+
+
 if __name__ == "__main__":
+    ensure_indexes(db)
+    ensure_cache_indexes(db)
     app.run(host="0.0.0.0", port=5001)
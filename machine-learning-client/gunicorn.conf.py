@@ -0,0 +1,56 @@
+"""Production server settings for the ml client's HTTP API, read by `gunicorn`.
+
+The summarizer is loaded once in the master before the workers are forked
+(preload), so its weights are shared copy-on-write instead of every worker
+loading its own copy. Threads let concurrent /process_audio requests share a
+summary batch. On SIGTERM a worker stops accepting requests and gets
+ML_GRACEFUL_TIMEOUT seconds to finish the recording it is processing; compose
+gives the container longer than that before it kills it.
+
+Bulk processing belongs to worker.py, this only serves on-demand requests.
+Every worker stores its metrics in mongo like the worker pool does, so the
+/metrics of whichever worker answers adds up all of them.
+
+    gunicorn            # picks this file up from the working directory
+"""
+
+# pylint: disable=invalid-name, import-outside-toplevel
+
+import os
+
+wsgi_app = "client:app"
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# every worker shares the preloaded model, but inference memory is per worker
+workers = int(os.getenv("ML_HTTP_WORKERS", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("ML_HTTP_THREADS", "4"))
+preload_app = True
+
+# one request transcribes and summarizes a whole recording
+timeout = int(os.getenv("ML_HTTP_TIMEOUT", "300"))
+graceful_timeout = int(os.getenv("ML_GRACEFUL_TIMEOUT", "300"))
+
+accesslog = "-"
+
+PRELOAD_MODEL = os.getenv("ML_PRELOAD_MODEL", "1") == "1"
+
+
+def when_ready(_server):
+    """Load the summarizer in the master, right before the workers are forked."""
+    if PRELOAD_MODEL:
+        import client
+
+        client.summarizer.load()
+
+
+def post_worker_init(_worker):
+    """Create indexes and start reporting metrics from a worker, so the master
+    never opens a mongo connection."""
+    import client
+
+    client.ensure_indexes(client.db)
+    client.ensure_cache_indexes(client.db)
+    client.metrics_store.start_reporter(
+        client.db.metrics, client.metrics_store.process_id("http")
+    )
@@ -0,0 +1,65 @@
+"""Leases on the recordings queue.
+
+A worker claims a recording by setting lease_owner and lease_until on it in
+one find_one_and_update, so two workers never process the same recording.
+A lease that runs out (its worker died) makes the recording claimable again,
+release() gives it back early after a failure. Used by the worker pool and
+by the ml client's /process endpoint.
+"""
+
+# pylint: disable=import-error
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+SHARED_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../shared"))
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+# pylint: disable=wrong-import-position
+from mongo import PENDING_RECORDINGS
+
+# seconds a claimed recording stays reserved for one worker
+LEASE_SECONDS = int(os.getenv("ML_LEASE_SECONDS", "300"))
+# give up on a recording after this many claims so bad audio can't loop forever
+MAX_ATTEMPTS = int(os.getenv("ML_MAX_ATTEMPTS", "3"))
+
+
+def claimable(now):
+    """Query for recordings that are neither finished, given up on nor leased."""
+    return {
+        **PENDING_RECORDINGS,
+        "$or": [
+            {"lease_until": {"$exists": False}},
+            {"lease_until": {"$lt": now}},
+        ],
+    }
+
+
+def claim_next(collection, worker_id, query=None, lease_seconds=LEASE_SECONDS):
+    """Atomically lease the oldest unprocessed recording that nobody holds,
+    optionally narrowed down by an extra query (e.g. a specific _id)."""
+    now = datetime.now(timezone.utc)
+    return collection.find_one_and_update(
+        {**(query or {}), **claimable(now)},
+        {
+            "$set": {
+                "lease_owner": worker_id,
+                "lease_until": now + timedelta(seconds=lease_seconds),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("_id", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def release(collection, audio_doc, max_attempts=MAX_ATTEMPTS):
+    """Give a failed recording back to the queue, or park it once it hit max attempts."""
+    update = {"$unset": {"lease_owner": "", "lease_until": ""}}
+    if audio_doc.get("attempts", 0) >= max_attempts:
+        update["$set"] = {"failed": True}
+    collection.update_one({"_id": audio_doc["_id"]}, update)
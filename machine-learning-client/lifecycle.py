@@ -0,0 +1,260 @@
+"""Retention for processed audio.
+
+Once a recording has a transcript its audio is only needed again for a
+re-run, yet it stayed in mongo (gridfs 'audio' chunks, or the inline
+audioData blob of older uploads) forever. compact() applies
+AUDIO_RETENTION to recordings processed more than AUDIO_RETENTION_DAYS ago:
+
+    keep     leave everything where it is (default)
+    archive  move the audio to a gzip file under AUDIO_ARCHIVE_DIR, open_audio()
+             in client.py still reads it from there
+    delete   drop the audio for good
+
+Either way the recordings document stays as a small stub whose 'storage'
+field says what happened, how big the audio was and where it went. A TTL
+index can't do this: it removes whole documents, and gridfs chunks belong
+to a file document it knows nothing about.
+
+The worker pool runs compact() every AUDIO_COMPACTION_INTERVAL seconds.
+Run from machine-learning-client/ to see or reclaim the space by hand:
+    python lifecycle.py --dry-run
+    python lifecycle.py --policy archive --days 30 --compact
+"""
+
+# pylint: disable=import-error
+
+import argparse
+import gzip
+import os
+import shutil
+import sys
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo.errors import OperationFailure, PyMongoError
+
+SHARED_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../shared"))
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+# pylint: disable=wrong-import-position
+from mongo import get_database
+import metrics
+
+POLICIES = ("keep", "archive", "delete")
+AUDIO_RETENTION = os.getenv("AUDIO_RETENTION", "keep")
+AUDIO_RETENTION_DAYS = float(os.getenv("AUDIO_RETENTION_DAYS", "30"))
+AUDIO_ARCHIVE_DIR = os.getenv("AUDIO_ARCHIVE_DIR", "/archive")
+# opus barely compresses, the legacy wav blobs do, so a cheap level is enough
+ARCHIVE_COMPRESSLEVEL = int(os.getenv("AUDIO_ARCHIVE_COMPRESSLEVEL", "6"))
+AUDIO_COMPACTION_INTERVAL = float(os.getenv("AUDIO_COMPACTION_INTERVAL", "3600"))
+# recordings handled per query
+COMPACTION_BATCH = 100
+
+RECLAIMED_BYTES = metrics.counter(
+    "ml_storage_reclaimed_bytes_total", "Bytes of processed audio moved out of mongo"
+)
+COMPACTED_TOTAL = metrics.counter(
+    "ml_storage_compacted_total", "Recordings whose audio was archived or deleted"
+)
+
+
+def expired(cutoff):
+    """Query for processed recordings past retention that still hold audio.
+    Recordings processed before processed_at existed go by upload time."""
+    return {
+        "processed": True,
+        "storage": {"$exists": False},
+        "$or": [
+            {"processed_at": {"$lt": cutoff}},
+            {
+                "processed_at": {"$exists": False},
+                "_id": {"$lt": ObjectId.from_datetime(cutoff)},
+            },
+        ],
+    }
+
+
+def audio_size(database, doc):
+    """Bytes of audio a recording holds in mongo."""
+    if "audioFileId" in doc:
+        info = database["audio.files"].find_one({"_id": doc["audioFileId"]})
+        return info["length"] if info else 0
+    return len(doc.get("audioData") or b"")
+
+
+def archive_path(doc):
+    """Where a recording's audio is archived, relative to AUDIO_ARCHIVE_DIR."""
+    return os.path.join(f"{doc['_id'].generation_time:%Y/%m}", f"{doc['_id']}.gz")
+
+
+def write_archive(audio_fs, doc, archive_dir):
+    """Stream the audio into a gzip file, returns (relative path, bytes on disk).
+    Written to a temporary name and renamed so a crash never leaves half a file."""
+    relative = archive_path(doc)
+    path = os.path.join(archive_dir, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.part"
+    with gzip.open(partial, "wb", compresslevel=ARCHIVE_COMPRESSLEVEL) as out:
+        if "audioFileId" in doc:
+            with audio_fs.open_download_stream(doc["audioFileId"]) as source:
+                shutil.copyfileobj(source, out)
+        else:
+            out.write(doc.get("audioData") or b"")
+    os.replace(partial, path)
+    return relative, os.path.getsize(path)
+
+
+def compact_one(database, audio_fs, doc, policy, archive_dir):
+    """Archive or delete one recording's audio and leave the stub, returns the
+    stub's storage field, None if another compactor got there first."""
+    storage = {
+        "policy": policy,
+        "bytes": audio_size(database, doc),
+        "at": datetime.now(timezone.utc),
+    }
+    if policy == "archive":
+        storage["path"], storage["archived_bytes"] = write_archive(
+            audio_fs, doc, archive_dir
+        )
+
+    # the stub goes in before the audio goes, a crash in between only leaves
+    # an orphaned gridfs file, never a recording pointing at missing audio
+    result = database.recordings.update_one(
+        {"_id": doc["_id"], "storage": {"$exists": False}},
+        {"$set": {"storage": storage}, "$unset": {"audioData": "", "audioFileId": ""}},
+    )
+    if result.modified_count == 0:
+        return None
+    if "audioFileId" in doc:
+        try:
+            audio_fs.delete(doc["audioFileId"])
+        except NoFile:
+            pass
+    RECLAIMED_BYTES.inc(storage["bytes"])
+    COMPACTED_TOTAL.inc()
+    return storage
+
+
+def compact(
+    database=None,
+    policy=AUDIO_RETENTION,
+    days=AUDIO_RETENTION_DAYS,
+    archive_dir=AUDIO_ARCHIVE_DIR,
+    dry_run=False,
+):
+    """Apply the retention policy to every expired recording, returns a report:
+    {"policy", "recordings", "reclaimed_bytes", "archived_bytes"}. dry_run
+    only adds up what would be reclaimed."""
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown retention policy: {policy}")
+    report = {
+        "policy": policy,
+        "recordings": 0,
+        "reclaimed_bytes": 0,
+        "archived_bytes": 0,
+    }
+    if policy == "keep":
+        return report
+
+    database = database if database is not None else get_database()
+    audio_fs = GridFSBucket(database, bucket_name="audio")
+    query = expired(datetime.now(timezone.utc) - timedelta(days=days))
+    last_id = None
+    while True:
+        batch = list(
+            database.recordings.find(
+                query if last_id is None else {**query, "_id": {"$gt": last_id}},
+                sort=[("_id", 1)],
+                limit=COMPACTION_BATCH,
+            )
+        )
+        if not batch:
+            break
+        for doc in batch:
+            if dry_run:
+                storage = {"bytes": audio_size(database, doc)}
+            else:
+                storage = compact_one(database, audio_fs, doc, policy, archive_dir)
+            if storage is not None:
+                report["recordings"] += 1
+                report["reclaimed_bytes"] += storage["bytes"]
+                report["archived_bytes"] += storage.get("archived_bytes", 0)
+        last_id = batch[-1]["_id"]
+    return report
+
+
+def storage_sizes(database):
+    """Storage size in bytes of the collections audio lives in."""
+    sizes = {}
+    for name in ("recordings", "audio.files", "audio.chunks"):
+        try:
+            sizes[name] = database.command("collStats", name).get("storageSize", 0)
+        except OperationFailure:
+            sizes[name] = 0
+    return sizes
+
+
+def release_space(database):
+    """Run mongo's compact on the audio collections so the freed pages go
+    back to the filesystem, returns the storage sizes before and after."""
+    before = storage_sizes(database)
+    for name in before:
+        try:
+            database.command("compact", name)
+        except OperationFailure as e:
+            print(f"Could not compact {name}: {e}")
+    return before, storage_sizes(database)
+
+
+def format_report(report):
+    """One line summary of a compaction run."""
+    line = (
+        f"{report['policy']}: {report['recordings']} recordings, "
+        f"{report['reclaimed_bytes'] / 2**20:.1f} MiB reclaimed from mongo"
+    )
+    if report["archived_bytes"]:
+        line += f", {report['archived_bytes'] / 2**20:.1f} MiB in the archive"
+    return line
+
+
+def run_compaction(stop_event, interval=AUDIO_COMPACTION_INTERVAL):
+    """Compact every interval seconds until stopped, for the worker pool."""
+    if AUDIO_RETENTION == "keep":
+        return
+    while not stop_event.wait(interval):
+        try:
+            print(f"[compaction] {format_report(compact())}")
+        except (PyMongoError, OSError) as e:
+            print(f"[compaction] failed: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--policy", choices=POLICIES, default=AUDIO_RETENTION)
+    parser.add_argument("--days", type=float, default=AUDIO_RETENTION_DAYS)
+    parser.add_argument("--archive-dir", default=AUDIO_ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="only report")
+    parser.add_argument(
+        "--compact", action="store_true", help="run mongo's compact afterwards"
+    )
+    args = parser.parse_args()
+    print(
+        format_report(
+            compact(
+                policy=args.policy,
+                days=args.days,
+                archive_dir=args.archive_dir,
+                dry_run=args.dry_run,
+            )
+        )
+    )
+    if args.compact and not args.dry_run:
+        sizes_before, sizes_after = release_space(get_database())
+        for collection, size in sizes_before.items():
+            print(
+                f"{collection}: {size / 2**20:.1f} MiB -> "
+                f"{sizes_after[collection] / 2**20:.1f} MiB"
+            )
@@ -0,0 +1,29 @@
+"""Worker pool utilization metrics.
+
+Declared here rather than in worker.py so that the ml client, which serves
+/metrics but doesn't import the worker, registers them too: render() only
+adds up snapshot entries for metrics its own registry knows.
+"""
+
+# pylint: disable=import-error
+
+import os
+import sys
+
+SHARED_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../shared"))
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+# pylint: disable=wrong-import-position
+import metrics
+
+# utilization is ml_worker_busy_threads / ml_worker_threads
+WORKER_THREADS_GAUGE = metrics.gauge(
+    "ml_worker_threads", "Drain threads running across the worker pool"
+)
+BUSY_THREADS = metrics.gauge(
+    "ml_worker_busy_threads", "Drain threads currently processing a recording"
+)
+BUSY_SECONDS = metrics.counter(
+    "ml_worker_busy_seconds_total", "Seconds drain threads spent processing"
+)
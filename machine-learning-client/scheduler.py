@@ -0,0 +1,111 @@
+"""Fair scheduling for the recordings queue.
+
+Claiming strictly oldest first lets one user who uploads fifty recordings
+hold every worker until all fifty are done. Instead each user with pending
+recordings is a queue of its own, served oldest first, and the queues take
+turns by start-time fair queuing:
+
+- every claim charges the user the recording's cost, its estimated length in
+  seconds (size / ML_ASSUMED_BITRATE, capped at ML_MAX_RECORDING_SECONDS, the
+  recorder's limit; recordings of unknown size pay the cap)
+- a user's next recording may start at max(virtual clock, what they've been
+  charged up to), and the lowest start goes first, so light users go ahead
+  of a backlog while a single busy user still gets every idle worker
+- aging: each second a user's oldest recording has waited takes
+  ML_SCHEDULER_AGING virtual seconds off its start, so however far behind a
+  user has fallen their recordings still get picked in bounded time
+
+The per-user charges and the clock live in the 'scheduler' collection, so
+every worker process shares them. The lease in claim_next() still decides
+who processes a recording, the scheduler only decides which one to try.
+"""
+
+# pylint: disable=import-error
+
+import os
+from datetime import datetime, timezone
+
+from pymongo.errors import PyMongoError
+
+# recordings longer than this are cut off by the recorder, record.html's timer
+MAX_RECORDING_SECONDS = float(os.getenv("ML_MAX_RECORDING_SECONDS", "60"))
+# the web app's AUDIO_BITRATE, to turn a recording's size into seconds
+ASSUMED_BITRATE = int(os.getenv("ML_ASSUMED_BITRATE", "32000"))
+# virtual seconds of priority a recording gains per second it waits
+AGING_RATE = float(os.getenv("ML_SCHEDULER_AGING", "0.5"))
+# most users looked at per claim, the ones with the oldest recordings win ties
+MAX_CANDIDATES = int(os.getenv("ML_SCHEDULER_CANDIDATES", "50"))
+
+CLOCK_ID = "clock"
+ANONYMOUS = "anonymous"
+
+
+def recording_cost(audio_doc):
+    """seconds of audio a recording is charged as"""
+    size = audio_doc.get("size_bytes")
+    if not size:
+        return MAX_RECORDING_SECONDS
+    return min(size * 8 / ASSUMED_BITRATE, MAX_RECORDING_SECONDS)
+
+
+def user_key(user_id):
+    """the scheduler document id for a user, anonymous uploads share one"""
+    return str(user_id) if user_id is not None else ANONYMOUS
+
+
+def queue_heads(collection, pending_query, limit=MAX_CANDIDATES):
+    """the oldest claimable recording of each user with something pending"""
+    return list(
+        collection.aggregate(
+            [
+                {"$match": pending_query},
+                {"$sort": {"_id": 1}},
+                {
+                    "$group": {
+                        "_id": "$user_id",
+                        "recording_id": {"$first": "$_id"},
+                        "size_bytes": {"$first": "$size_bytes"},
+                    }
+                },
+                {"$sort": {"recording_id": 1}},
+                {"$limit": limit},
+            ]
+        )
+    )
+
+
+def plan(heads, charges, now=None, aging_rate=AGING_RATE):
+    """heads in the order to try them, with the virtual start each one gets.
+    charges maps user keys (and CLOCK_ID) to virtual seconds."""
+    now = now or datetime.now(timezone.utc)
+    clock = charges.get(CLOCK_ID, 0.0)
+    order = []
+    for head in heads:
+        start = max(clock, charges.get(user_key(head["_id"]), 0.0))
+        waited = (now - head["recording_id"].generation_time).total_seconds()
+        order.append((start - aging_rate * max(waited, 0.0), start, head))
+    order.sort(key=lambda item: (item[0], item[2]["recording_id"]))
+    return [(head, start) for _, start, head in order]
+
+
+def load_charges(state, heads):
+    """the clock and the charges of the users in heads"""
+    keys = [user_key(head["_id"]) for head in heads] + [CLOCK_ID]
+    return {
+        doc["_id"]: doc.get("finish", 0.0) for doc in state.find({"_id": {"$in": keys}})
+    }
+
+
+def charge(state, user_id, start, cost):
+    """bill a claimed recording to its user and move the clock up to its start.
+    the user's charge is updated in one pipeline so concurrent claims add up"""
+    try:
+        state.update_one(
+            {"_id": user_key(user_id)},
+            [{"$set": {"finish": {"$add": [{"$max": ["$finish", start]}, cost]}}}],
+            upsert=True,
+        )
+        state.update_one({"_id": CLOCK_ID}, {"$max": {"finish": start}}, upsert=True)
+    except PyMongoError as e:
+        # only fairness suffers, the recording is claimed either way
+        print(f"Could not update scheduler state: {e}")
@@ -0,0 +1,161 @@
+"""Speech-to-text backends.
+
+Every backend takes a speech_recognition AudioData and returns the text.
+The backend is picked with STT_BACKEND and built once per process:
+
+    vosk    local, offline Kaldi model on the CPU (default)
+    google  the free Google Web Speech API, needs network
+
+Backends raise sr.UnknownValueError when nothing intelligible was said and
+sr.RequestError when the engine itself is unavailable, same as
+speech_recognition's own recognizers.
+
+With STT_STREAMING on, transcribe() splits the audio on silence and runs the
+segments concurrently, reporting each one as it finishes.
+"""
+
+# pylint: disable=import-error
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import speech_recognition as sr
+
+from audio import speech_segments
+
+STT_BACKEND = os.getenv("STT_BACKEND", "vosk")
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "/models/vosk-model-small-en-us-0.15")
+# the rate the recognizers are fed, audio is converted to 16-bit mono at this rate
+SAMPLE_RATE = 16000
+STT_STREAMING = os.getenv("STT_STREAMING", "1") == "1"
+# segments of one recording transcribed at the same time
+STT_SEGMENT_WORKERS = int(os.getenv("STT_SEGMENT_WORKERS", "4"))
+
+
+class Transcriber:  # pylint: disable=too-few-public-methods
+    """Base class, subclasses implement transcribe()."""
+
+    name = "base"
+
+    def transcribe(self, audio_data):
+        """Returns the text spoken in audio_data."""
+        raise NotImplementedError
+
+
+class GoogleTranscriber(Transcriber):  # pylint: disable=too-few-public-methods
+    """Network round trip to Google, kept for comparison and as a fallback."""
+
+    name = "google"
+
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, audio_data):
+        return self.recognizer.recognize_google(audio_data)
+
+
+class VoskTranscriber(Transcriber):  # pylint: disable=too-few-public-methods
+    """Offline Kaldi model, loaded once and shared by every thread in the process."""
+
+    name = "vosk"
+
+    def __init__(self, model_path=VOSK_MODEL_PATH):
+        try:
+            import vosk  # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise sr.RequestError("vosk is not installed (pip install vosk)") from e
+        if not os.path.isdir(model_path):
+            raise sr.RequestError(f"vosk model not found at {model_path}")
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        self.model = vosk.Model(model_path)
+
+    def transcribe(self, audio_data):
+        # recognizers keep decoding state, so each call gets its own
+        recognizer = self.vosk.KaldiRecognizer(self.model, SAMPLE_RATE)
+        recognizer.AcceptWaveform(
+            audio_data.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2)
+        )
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+BACKENDS = {
+    GoogleTranscriber.name: GoogleTranscriber,
+    VoskTranscriber.name: VoskTranscriber,
+}
+
+_transcribers = {}
+_lock = threading.Lock()
+
+
+def get_transcriber(name=None):
+    """The process-wide instance of a backend, built on first use."""
+    backend = name or STT_BACKEND
+    with _lock:
+        if backend not in _transcribers:
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown STT backend: {backend}")
+            _transcribers[backend] = BACKENDS[backend]()
+        return _transcribers[backend]
+
+
+def backend_identity(name=None):
+    """The backend and model transcripts come from, e.g. for cache keys."""
+    backend = name or STT_BACKEND
+    if backend == "vosk":
+        return f"vosk:{os.path.basename(VOSK_MODEL_PATH.rstrip('/'))}"
+    return backend
+
+
+def transcribe_segment(transcriber, audio_data):
+    """One segment's text, a segment with nothing intelligible is just empty."""
+    try:
+        return transcriber.transcribe(audio_data)
+    except sr.UnknownValueError:
+        return ""
+
+
+def transcribe_segments(audio_data, segments, on_segment=None):
+    """Transcribe (start, end) sample ranges of audio_data concurrently.
+    on_segment(index, text, total) is called as each segment completes,
+    the full text is returned in recording order."""
+    transcriber = get_transcriber()
+    width = audio_data.sample_width
+    raw = memoryview(audio_data.frame_data)
+    texts = [""] * len(segments)
+    with ThreadPoolExecutor(max_workers=STT_SEGMENT_WORKERS) as pool:
+        futures = {
+            pool.submit(
+                transcribe_segment,
+                transcriber,
+                sr.AudioData(
+                    bytes(raw[start * width : end * width]),
+                    audio_data.sample_rate,
+                    width,
+                ),
+            ): index
+            for index, (start, end) in enumerate(segments)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            texts[index] = future.result()
+            if on_segment is not None:
+                on_segment(index, texts[index], len(segments))
+
+    text = " ".join(t for t in texts if t)
+    if not text:
+        raise sr.UnknownValueError()
+    return text
+
+
+def transcribe(audio_data, on_segment=None):
+    """Transcribe with the configured backend, segment by segment when streaming."""
+    if not STT_STREAMING:
+        return get_transcriber().transcribe(audio_data)
+    segments = speech_segments(audio_data.frame_data, audio_data.sample_rate)
+    return transcribe_segments(audio_data, segments, on_segment)
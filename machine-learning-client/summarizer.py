@@ -0,0 +1,115 @@
+"""Lazily loaded distilbart summarizer, optionally quantized.
+
+Nothing is loaded at import, the model is built on the first call (or an
+explicit load()) so the service starts immediately. SUMMARIZER_MODE picks
+what gets loaded:
+
+    fp32  the plain transformers pipeline, as before (default)
+    int8  linear layers dynamically quantized to int8 with torch, usually
+          about half the memory and noticeably faster on CPU
+    onnx  exported to ONNX and run with onnxruntime (needs optimum[onnxruntime])
+
+Model files live in SUMMARIZER_CACHE_DIR. The quantized model and the ONNX
+export are written there the first time, so later starts only load them.
+"""
+
+# pylint: disable=import-error, import-outside-toplevel
+
+import os
+import threading
+
+SUMMARIZER_MODEL = os.getenv("SUMMARIZER_MODEL", "sshleifer/distilbart-cnn-12-6")
+SUMMARIZER_MODE = os.getenv("SUMMARIZER_MODE", "fp32")
+SUMMARIZER_CACHE_DIR = os.getenv("SUMMARIZER_CACHE_DIR", "/models/summarizer")
+
+
+def _slug(model_name):
+    return model_name.replace("/", "--")
+
+
+def load_fp32(model_name, cache_dir):
+    """The original full precision pipeline."""
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name, cache_dir=cache_dir)
+    return pipeline("summarization", model=model, tokenizer=tokenizer, device=-1)
+
+
+def load_int8(model_name, cache_dir):
+    """Dynamic int8 quantization of every nn.Linear, saved once and reloaded after."""
+    import torch
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+    quantized_path = os.path.join(cache_dir, f"{_slug(model_name)}-int8.pt")
+    if os.path.exists(quantized_path):
+        model = torch.load(quantized_path, weights_only=False)
+    else:
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name, cache_dir=cache_dir)
+        model = torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        os.makedirs(cache_dir, exist_ok=True)
+        torch.save(model, quantized_path)
+    return pipeline("summarization", model=model, tokenizer=tokenizer, device=-1)
+
+
+def load_onnx(model_name, cache_dir):
+    """ONNX export run by onnxruntime, exported once into the cache directory."""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer, pipeline
+
+    onnx_dir = os.path.join(cache_dir, f"{_slug(model_name)}-onnx")
+    if os.path.isdir(onnx_dir):
+        tokenizer = AutoTokenizer.from_pretrained(onnx_dir)
+        model = ORTModelForSeq2SeqLM.from_pretrained(onnx_dir)
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+        model = ORTModelForSeq2SeqLM.from_pretrained(
+            model_name, export=True, cache_dir=cache_dir
+        )
+        model.save_pretrained(onnx_dir)
+        tokenizer.save_pretrained(onnx_dir)
+    return pipeline("summarization", model=model, tokenizer=tokenizer, device=-1)
+
+
+LOADERS = {"fp32": load_fp32, "int8": load_int8, "onnx": load_onnx}
+
+
+class LazySummarizer:
+    """Callable like a transformers pipeline, but only built on first use."""
+
+    def __init__(
+        self,
+        mode=SUMMARIZER_MODE,
+        model_name=SUMMARIZER_MODEL,
+        cache_dir=SUMMARIZER_CACHE_DIR,
+    ):
+        if mode not in LOADERS:
+            raise ValueError(f"Unknown SUMMARIZER_MODE: {mode}")
+        self.mode = mode
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    @property
+    def identity(self):
+        """Model and mode, the summaries of different ones aren't interchangeable."""
+        return f"{self.model_name}:{self.mode}"
+
+    @property
+    def loaded(self):
+        """Whether the model has been built yet."""
+        return self._pipeline is not None
+
+    def load(self):
+        """Build the pipeline if needed and return it, safe to call from any thread."""
+        with self._lock:
+            if self._pipeline is None:
+                self._pipeline = LOADERS[self.mode](self.model_name, self.cache_dir)
+        return self._pipeline
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
@@ -0,0 +1,115 @@
+"""Unit tests for in-memory audio decoding."""
+
+import io
+import av
+import numpy as np
+import pytest
+import speech_recognition as sr
+import audio
+
+
+def make_webm(seconds=1.0, rate=48000):
+    """Encode a stereo sine tone as webm/opus, like MediaRecorder uploads."""
+    buf = io.BytesIO()
+    with av.open(buf, "w", format="webm") as out:
+        stream = out.add_stream("libopus", rate=rate)
+        stream.layout = "stereo"
+        tone = np.sin(2 * np.pi * 440 * np.arange(int(rate * seconds)) / rate) * 0.3
+        frame = av.AudioFrame.from_ndarray(
+            np.stack([tone, tone]).astype(np.float32), format="fltp", layout="stereo"
+        )
+        frame.rate = rate
+        for packet in stream.encode(frame):
+            out.mux(packet)
+        for packet in stream.encode(None):
+            out.mux(packet)
+    buf.seek(0)
+    return buf
+
+
+def test_decode_webm_to_16k_mono():
+    """A 48kHz stereo opus recording comes out as 16kHz s16 mono."""
+    pcm = audio.decode_pcm(make_webm(seconds=1.0))
+    samples = len(pcm) // audio.SAMPLE_WIDTH
+    assert abs(samples - 16000) < 800
+
+
+def test_load_audio_needs_no_conversion():
+    """The AudioData is already at the rate and width the recognizers ask for."""
+    audio_data = audio.load_audio(make_webm())
+    assert audio_data.sample_rate == 16000
+    assert audio_data.sample_width == 2
+    raw = audio_data.get_raw_data(convert_rate=16000, convert_width=2)
+    assert raw is audio_data.frame_data
+
+
+def test_garbage_is_decode_error():
+    """Bytes that aren't audio raise DecodeError."""
+    with pytest.raises(audio.DecodeError):
+        audio.load_audio(io.BytesIO(b"definitely not webm"))
+
+
+def tone_with_gaps(pattern, rate=16000):
+    """s16 PCM of 440Hz tone (True) and silence (False) blocks of half a second."""
+    block = np.arange(rate // 2) / rate
+    parts = [
+        (np.sin(2 * np.pi * 440 * block) * 8000 if voiced else np.zeros_like(block))
+        for voiced in pattern
+    ]
+    return np.concatenate(parts).astype(np.int16).tobytes()
+
+
+def test_speech_segments_split_on_silence():
+    """Two stretches of speech around a pause become two segments."""
+    pcm = tone_with_gaps([False, True, True, False, False, True, False])
+    segments = audio.speech_segments(pcm)
+    assert len(segments) == 2
+    (first_start, first_end), (second_start, _) = segments
+    assert 5000 < first_start < 8000
+    assert first_end < second_start
+
+
+def test_speech_segments_silence_only():
+    """All silence has nothing to transcribe."""
+    assert not audio.speech_segments(tone_with_gaps([False, False]))
+
+
+def test_speech_segments_cap_length():
+    """Long uninterrupted speech is cut into pieces no longer than the cap."""
+    pcm = tone_with_gaps([True] * 8)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(audio, "VAD_MAX_SEGMENT_S", 1.0)
+        segments = audio.speech_segments(pcm)
+    assert len(segments) == 4
+    assert all(end - start <= 16000 for start, end in segments)
+    assert segments[-1][1] == len(pcm) // 2
+
+
+def test_preprocess_trims_leading_and_trailing_silence():
+    """Silence around the speech is cut, keeping the pad, and reported in seconds."""
+    pcm = tone_with_gaps([False, False, True, True, False, False, False])
+    processed, trimmed = audio.preprocess(sr.AudioData(pcm, 16000, 2))
+    pad = 16000 * audio.VAD_PAD_MS // 1000
+    frame = 16000 * audio.VAD_FRAME_MS // 1000
+    kept = len(processed.frame_data) // 2
+    # cut on frame boundaries, so up to a frame more on either side
+    assert 16000 + 2 * pad <= kept <= 16000 + 2 * pad + 2 * frame
+    assert trimmed == pytest.approx(3.5 - kept / 16000)
+
+
+def test_preprocess_normalizes_level():
+    """Quiet and loud speech both end up near the target level, without clipping."""
+    for amplitude in (800, 30000):
+        tone = np.sin(2 * np.pi * 440 * np.arange(16000) / 16000) * amplitude
+        audio_data = sr.AudioData(tone.astype(np.int16).tobytes(), 16000, 2)
+        processed, _ = audio.preprocess(audio_data)
+        samples = np.frombuffer(processed.frame_data, dtype=np.int16)
+        rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64)))
+        assert 20 * np.log10(rms / 32768) == pytest.approx(audio.TARGET_DBFS, abs=0.5)
+        assert np.abs(samples.astype(np.int32)).max() <= audio.PEAK_LIMIT + 1
+
+
+def test_preprocess_leaves_silence_alone():
+    """Without any speech frame the audio is passed on unchanged."""
+    audio_data = sr.AudioData(tone_with_gaps([False, False]), 16000, 2)
+    assert audio.preprocess(audio_data) == (audio_data, 0.0)
@@ -0,0 +1,138 @@
+"""Unit tests for the bulk re-processing CLI."""
+
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+import pytest
+
+import backfill
+
+
+def options(tmp_path, **overrides):
+    """Command line options with a checkpoint in tmp_path."""
+    values = {
+        "processes": 2,
+        "threads": 2,
+        "batch_size": 2,
+        "checkpoint": str(tmp_path / "checkpoint.json"),
+        "restart": False,
+        "include_failed": False,
+        "user": None,
+    }
+    values.update(overrides)
+    return argparse.Namespace(**values)
+
+
+def paged_recordings(docs):
+    """A recordings collection mock that answers _id range pages from docs."""
+    collection = MagicMock()
+
+    def find(query, sort, limit):  # pylint: disable=unused-argument
+        after = query.get("_id", {}).get("$gt")
+        return [doc for doc in docs if after is None or doc["_id"] > after][:limit]
+
+    collection.find.side_effect = find
+    collection.count_documents.side_effect = lambda query: len(find(query, None, None))
+    return collection
+
+
+def result_for(doc, **_):
+    """A stand-in for client.build_result that fails on 'bad' recordings."""
+    if doc.get("bad"):
+        return None
+    return {"source_audio_id": doc["_id"], "transcript": "new", "status": "done"}
+
+
+def test_query_skips_queue_and_deleted_audio():
+    """Only finished recordings with audio left are re-run."""
+    query = backfill.backfill_query()
+    assert query["processed"] is True
+    assert query["storage.policy"] == {"$ne": "delete"}
+    user_id = ObjectId()
+    query = backfill.backfill_query(include_failed=True, user_id=str(user_id))
+    assert {"failed": True} in query["$or"]
+    assert query["user_id"] == user_id
+
+
+def test_write_results_unordered_bulk():
+    """Results go out as one unordered bulk write per collection, failures skipped."""
+    database = MagicMock()
+    docs = [{"_id": ObjectId()}, {"_id": ObjectId(), "bad": True}]
+    written = backfill.write_results(database, docs, [result_for(d) for d in docs])
+
+    assert written == 1
+    ops = database.messages.bulk_write.call_args.args[0]
+    assert database.messages.bulk_write.call_args.kwargs == {"ordered": False}
+    assert len(ops) == 1
+    recording_op = database.recordings.bulk_write.call_args.args[0][0]
+    assert "failed" in recording_op._doc["$unset"]  # pylint: disable=protected-access
+
+
+def test_write_results_keeps_failed_messages_unprocessed():
+    """A message that failed to write doesn't get its recording re-flagged."""
+    database = MagicMock()
+    docs = [{"_id": ObjectId()}, {"_id": ObjectId()}]
+    database.messages.bulk_write.side_effect = BulkWriteError(
+        {"writeErrors": [{"index": 0, "errmsg": "boom"}]}
+    )
+    written = backfill.write_results(database, docs, [result_for(d) for d in docs])
+
+    assert written == 1
+    ops = database.recordings.bulk_write.call_args.args[0]
+    assert [op._filter for op in ops] == [  # pylint: disable=protected-access
+        {"_id": docs[1]["_id"]}
+    ]
+
+
+@patch("client.build_result", side_effect=result_for)
+def test_run_processes_every_batch_and_checkpoints(_, tmp_path):
+    """Every recording is re-run once and the checkpoint ends at the last one."""
+    docs = [{"_id": ObjectId(), "bad": i == 3} for i in range(5)]
+    database = MagicMock()
+    database.recordings = paged_recordings(docs)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        checkpoint = backfill.run(database, executor, options(tmp_path))
+
+    assert checkpoint["done"] == 4
+    assert checkpoint["failed"] == 1
+    assert checkpoint["last_id"] == str(docs[-1]["_id"])
+    with open(tmp_path / "checkpoint.json", encoding="utf-8") as handle:
+        assert json.load(handle) == checkpoint
+    assert database.messages.bulk_write.call_count == 3
+
+
+@patch("client.build_result", side_effect=result_for)
+def test_run_resumes_after_checkpoint(mock_build, tmp_path):
+    """A second run only processes what came after the saved _id."""
+    docs = [{"_id": ObjectId()} for _ in range(4)]
+    database = MagicMock()
+    database.recordings = paged_recordings(docs)
+    query = backfill.backfill_query()
+    backfill.save_checkpoint(
+        str(tmp_path / "checkpoint.json"),
+        {"query": repr(query), "last_id": str(docs[1]["_id"]), "done": 2, "failed": 0},
+    )
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        checkpoint = backfill.run(database, executor, options(tmp_path))
+
+    assert [c.args[0]["_id"] for c in mock_build.call_args_list] == [
+        docs[2]["_id"],
+        docs[3]["_id"],
+    ]
+    assert checkpoint["done"] == 4
+
+
+def test_checkpoint_for_other_options_is_refused(tmp_path):
+    """Resuming with different options would skip the wrong recordings."""
+    path = str(tmp_path / "checkpoint.json")
+    backfill.save_checkpoint(
+        path, {"query": "{}", "last_id": None, "done": 0, "failed": 0}
+    )
+    with pytest.raises(SystemExit):
+        backfill.load_checkpoint(path, backfill.backfill_query())
@@ -0,0 +1,58 @@
+"""Unit tests for the summarizer micro-batcher."""
+
+import threading
+import pytest
+from batching import SummaryBatcher
+
+
+def test_single_submit_gets_its_result():
+    """One text still goes through and comes back."""
+    batcher = SummaryBatcher(lambda texts: [t.upper() for t in texts], window_ms=1)
+    assert batcher.summarize("hello") == "HELLO"
+
+
+def test_concurrent_submits_share_a_batch():
+    """Texts submitted together are run as one batch and fanned back out in order."""
+    batches = []
+
+    def run_batch(texts):
+        batches.append(list(texts))
+        return [f"summary of {t}" for t in texts]
+
+    batcher = SummaryBatcher(run_batch, batch_size=4, window_ms=500)
+    futures = [batcher.submit(f"t{i}") for i in range(4)]
+
+    assert [f.result(timeout=5) for f in futures] == [
+        f"summary of t{i}" for i in range(4)
+    ]
+    assert batches == [["t0", "t1", "t2", "t3"]]
+
+
+def test_batch_size_caps_a_batch():
+    """More texts than the batch size are split over several model calls."""
+    sizes = []
+    gate = threading.Event()
+
+    def run_batch(texts):
+        gate.wait(5)
+        sizes.append(len(texts))
+        return texts
+
+    batcher = SummaryBatcher(run_batch, batch_size=2, window_ms=200)
+    futures = [batcher.submit(str(i)) for i in range(5)]
+    gate.set()
+    for future in futures:
+        future.result(timeout=5)
+    assert sum(sizes) == 5
+    assert max(sizes) <= 2
+
+
+def test_errors_reach_every_caller():
+    """A failing model call raises in every caller of that batch."""
+
+    def run_batch(_):
+        raise ValueError("model broke")
+
+    batcher = SummaryBatcher(run_batch, window_ms=1)
+    with pytest.raises(ValueError):
+        batcher.summarize("text")
@@ -0,0 +1,90 @@
+"""Unit tests for the content-hash result cache."""
+
+import io
+from unittest.mock import MagicMock, patch
+from pymongo.errors import PyMongoError
+import cache
+
+
+def make_cache(max_entries=10):
+    """A ResultCache over mocked collections."""
+    database = MagicMock()
+    return cache.ResultCache(database, "transcript", max_entries), database
+
+
+def test_hash_stream_rewinds():
+    """Hashing reads the whole stream and leaves it at the start for decoding."""
+    stream = io.BytesIO(b"audio bytes")
+    assert cache.hash_stream(stream) == cache.hash_text("audio bytes")
+    assert stream.read() == b"audio bytes"
+
+
+def test_get_hit_counts_and_returns_value():
+    """A hit returns the stored value and counts as a hit."""
+    result_cache, database = make_cache()
+    database["cache"].find_one_and_update.return_value = {"value": "hello"}
+
+    assert result_cache.get("abc") == "hello"
+    query = database["cache"].find_one_and_update.call_args.args[0]
+    assert query == {"_id": "transcript:abc"}
+    database["cache_stats"].update_one.assert_called_once_with(
+        {"_id": "transcript"}, {"$inc": {"hits": 1}}, upsert=True
+    )
+
+
+def test_get_miss_counts_miss():
+    """A miss returns None and counts as a miss."""
+    result_cache, database = make_cache()
+    database["cache"].find_one_and_update.return_value = None
+
+    assert result_cache.get("abc") is None
+    update = database["cache_stats"].update_one.call_args.args[1]
+    assert update == {"$inc": {"misses": 1}}
+
+
+def test_evict_removes_oldest_over_limit():
+    """Eviction deletes just the entries over the limit, least recently used first."""
+    result_cache, database = make_cache(max_entries=10)
+    entries = database["cache"]
+    entries.count_documents.return_value = 12
+    entries.find.return_value.limit.return_value = [{"_id": "a"}, {"_id": "b"}]
+
+    result_cache.evict()
+    entries.find.return_value.limit.assert_called_once_with(2)
+    entries.delete_many.assert_called_once_with({"_id": {"$in": ["a", "b"]}})
+
+
+def test_put_checks_size_periodically():
+    """Size is only checked every CACHE_EVICT_EVERY writes."""
+    result_cache, _ = make_cache()
+    with patch.object(cache, "CACHE_EVICT_EVERY", 3), patch.object(
+        result_cache, "evict"
+    ) as mock_evict:
+        for i in range(6):
+            result_cache.put(str(i), "value")
+        assert mock_evict.call_count == 2
+
+
+def test_model_is_part_of_the_key():
+    """Results of another model are never served, they live under other keys."""
+    database = MagicMock()
+    database["cache"].find_one_and_update.return_value = None
+    cache.ResultCache(database, "summary", model="distilbart:int8").get("abc")
+    query = database["cache"].find_one_and_update.call_args.args[0]
+    assert query == {"_id": "summary:distilbart:int8:abc"}
+
+
+def test_mongo_errors_fall_through():
+    """A failing cache is a miss on get and a no-op on put, never an error."""
+    result_cache, database = make_cache()
+    database["cache"].find_one_and_update.side_effect = PyMongoError("down")
+    database["cache"].update_one.side_effect = PyMongoError("down")
+    assert result_cache.get("abc") is None
+    result_cache.put("abc", "value")
+
+
+def test_hit_rate():
+    """Hit rate is hits over lookups."""
+    result_cache, database = make_cache()
+    database["cache_stats"].find_one.return_value = {"hits": 3, "misses": 1}
+    assert result_cache.hit_rate() == {"hits": 3, "misses": 1, "hit_rate": 0.75}
@@ -1,31 +1,46 @@
 """Unit tests for the client module that handles transcription and summarization."""
 
+# pylint: disable=redefined-outer-name
+
 from unittest.mock import patch, MagicMock
+from bson.objectid import ObjectId
+import pytest
 import client
 
 
-@patch("client.audio_collection.find_one")
-@patch("client.messages_collection.insert_one")
+@pytest.fixture(autouse=True)
+def empty_caches():
+    """Every test starts with cache misses and no writes to the real cache."""
+    with patch("client.transcript_cache") as transcripts, patch(
+        "client.summary_cache"
+    ) as summaries:
+        transcripts.get.return_value = None
+        summaries.get.return_value = None
+        yield transcripts, summaries
+
+
+@pytest.fixture(autouse=True)
+def passthrough_preprocess():
+    """Mocked audio goes to the mocked recognizer as is."""
+    with patch("client.preprocess", side_effect=lambda audio: (audio, 0.0)) as mock:
+        yield mock
+
+
+@patch("client.claim_next")
+@patch("client.messages_collection.update_one")
 @patch("client.audio_collection.update_one")
 @patch("client.summarizer")
-@patch("client.recognizer.recognize_google", return_value="test audio")
-@patch("client.recognizer.record")
-@patch("client.sr.AudioFile")
+@patch("client.transcribe", return_value="test audio")
+@patch("client.load_audio")
 def test_process_audio_success(*_):
     """Test the full successful audio processing flow."""
     mock_find = MagicMock(return_value={"_id": "abc123", "data": b"fakeblob"})
-    mock_audiofile = MagicMock()
-    mock_audiofile.return_value.__enter__.return_value = MagicMock()
     mock_summarizer = MagicMock(return_value=[{"summary_text": "short summary"}])
 
-    with patch("client.audio_collection.find_one", mock_find), patch(
-        "client.sr.AudioFile", mock_audiofile
-    ), patch("client.recognizer.record"), patch(
-        "client.recognizer.recognize_google"
-    ), patch(
-        "client.summarizer", mock_summarizer
-    ), patch(
-        "client.messages_collection.insert_one"
+    with patch("client.claim_next", mock_find), patch("client.load_audio"), patch(
+        "client.transcribe", return_value="test audio"
+    ), patch("client.summarizer", mock_summarizer), patch(
+        "client.messages_collection.update_one"
     ), patch(
         "client.audio_collection.update_one"
     ), patch(
@@ -37,7 +52,7 @@ def test_process_audio_success(*_):
         mock_print.assert_any_call("Latest audio processed and stored.")
 
 
-@patch("client.audio_collection.find_one", return_value=None)
+@patch("client.claim_next", return_value=None)
 def test_no_audio_found(_):
     """Test when no audio documents exist."""
     with patch("builtins.print") as mock_print:
@@ -45,10 +60,9 @@ def test_no_audio_found(_):
         mock_print.assert_any_call("No new audio recordings found.")
 
 
-@patch(
-    "client.audio_collection.find_one", return_value={"_id": "x", "data": b"invalid"}
-)
-@patch("client.sr.AudioFile", side_effect=Exception("corrupted audio"))
+@patch("client.claim_next", return_value={"_id": "x", "data": b"invalid"})
+@patch("client.release")
+@patch("client.load_audio", side_effect=Exception("corrupted audio"))
 def test_audiofile_crash(*_):
     """Test when loading audio fails."""
     with patch("builtins.print") as mock_print:
@@ -56,28 +70,131 @@ def test_audiofile_crash(*_):
         mock_print.assert_any_call("Unexpected error: corrupted audio")
 
 
-@patch("client.audio_collection.find_one", return_value={"_id": "x", "data": b"blob"})
-@patch("client.recognizer.recognize_google", side_effect=Exception("fail"))
-@patch("client.sr.AudioFile")
-@patch("client.recognizer.record", return_value="mock_audio")
+@patch("client.claim_next", return_value={"_id": "x", "data": b"blob"})
+@patch("client.release")
+@patch("client.transcribe", side_effect=Exception("fail"))
+@patch("client.load_audio", return_value="mock_audio")
 def test_recognition_crash(*_):
     """Test handling of failure in speech recognition."""
-    with patch("client.sr.AudioFile") as mock_audiofile:
-        mock_audiofile.return_value.__enter__.return_value = MagicMock()
-        with patch("builtins.print") as mock_print:
-            client.process_audio()
-            mock_print.assert_any_call("Unexpected error: fail")
+    with patch("builtins.print") as mock_print:
+        client.process_audio()
+        mock_print.assert_any_call("Unexpected error: fail")
 
 
-@patch("client.audio_collection.find_one", return_value={"_id": "x", "data": b"blob"})
-@patch("client.recognizer.recognize_google", return_value="sample text")
+@patch("client.claim_next", return_value={"_id": "x", "data": b"blob"})
+@patch("client.release")
+@patch("client.transcribe", return_value="sample text")
 @patch("client.summarizer", side_effect=Exception("summary error"))
-@patch("client.sr.AudioFile")
-@patch("client.recognizer.record", return_value="mock_audio")
+@patch("client.load_audio", return_value="mock_audio")
 def test_summary_crash(*_):
     """Test if summarization failure is caught"""
-    with patch("client.sr.AudioFile") as mock_audiofile:
-        mock_audiofile.return_value.__enter__.return_value = MagicMock()
-        with patch("builtins.print") as mock_print:
-            client.process_audio()
-            mock_print.assert_any_call("Unexpected error: summary error")
+    with patch("builtins.print") as mock_print:
+        client.process_audio()
+        mock_print.assert_any_call("Unexpected error: summary error")
+
+
+@patch("client.claim_next", return_value={"_id": "x", "data": b"not audio"})
+@patch("client.release")
+@patch("client.load_audio", side_effect=client.DecodeError("invalid data"))
+def test_decode_error(*_):
+    """Test an upload that isn't audio is reported and released."""
+    with patch("builtins.print") as mock_print:
+        client.process_audio()
+        mock_print.assert_any_call("Could not decode audio: invalid data")
+
+
+def test_open_audio_streams_from_gridfs():
+    """Recordings that point at gridfs are opened as a download stream."""
+    with patch("client.audio_fs") as mock_fs:
+        handle = client.open_audio({"_id": "x", "audioFileId": "file1"})
+        mock_fs.open_download_stream.assert_called_once_with("file1")
+        assert handle is mock_fs.open_download_stream.return_value
+
+
+def test_open_audio_inline_blob():
+    """Older recordings with inline audioData still open."""
+    handle = client.open_audio({"_id": "x", "audioData": b"blob"})
+    assert handle.read() == b"blob"
+
+
+@patch("client.claim_next", return_value={"_id": "x", "data": b"blob"})
+@patch("client.messages_collection.update_one")
+@patch("client.audio_collection.update_one")
+@patch("client.load_audio")
+@patch("client.transcribe")
+@patch("client.summary_batcher")
+def test_cached_results_skip_models(
+    mock_batcher,
+    mock_transcribe,
+    mock_load,
+    _update_audio,
+    _update_messages,
+    _claim,
+    empty_caches,
+):
+    """Test a repeat upload is answered from the caches without running the models."""
+    transcripts, summaries = empty_caches
+    transcripts.get.return_value = "cached transcript"
+    summaries.get.return_value = "cached summary"
+    with patch("builtins.print") as mock_print:
+        client.process_audio()
+        mock_print.assert_any_call("Summary: cached summary")
+    mock_load.assert_not_called()
+    mock_transcribe.assert_not_called()
+    mock_batcher.summarize.assert_not_called()
+
+
+@patch("client.audio_collection.update_one")
+@patch("client.summary_batcher")
+@patch("client.transcribe", return_value="hello")
+@patch("client.load_audio")
+def test_result_keeps_uploader(*_):
+    """The message carries the recording's user so the web app can scope it."""
+    user_id = "user-1"
+    with patch("client.messages_collection.update_one") as mock_messages:
+        assert client.process_document(
+            {"_id": "abc", "audioData": b"blob", "user_id": user_id}
+        )
+        stored = mock_messages.call_args.args[1]["$set"]
+        assert stored["user_id"] == user_id
+        assert stored["source_audio_id"] == "abc"
+
+
+@patch("client.queue_depth", return_value=3)
+@patch("metrics_store.snapshots")
+def test_metrics_endpoint(mock_snapshots, _depth):
+    """The ml client's /metrics adds other processes' snapshots to its own numbers."""
+    mock_snapshots.return_value = [
+        {"ml_recordings_total": [{"labels": {"outcome": "done"}, "value": 4}]},
+        {"ml_worker_busy_threads": [{"labels": {}, "value": 3}]},
+    ]
+    response = client.app.test_client().get("/metrics")
+    text = response.get_data(as_text=True)
+    assert response.status_code == 200
+    assert "recordings_queue_depth 3.0" in text
+    assert 'ml_recordings_total{outcome="done"}' in text
+    assert "ml_worker_busy_threads 3.0" in text
+    assert "# TYPE ml_stage_seconds histogram" in text
+    assert mock_snapshots.call_args.kwargs["exclude"].startswith("http-")
+
+
+@patch("client.audio_collection.update_one")
+@patch("client.messages_collection.update_one")
+@patch("client.summary_batcher")
+@patch("client.transcribe", return_value="hello")
+@patch("client.load_audio")
+def test_process_document_times_stages(*_):
+    """Every pipeline stage that ran is observed in the stage histogram."""
+    before = {s[0]["stage"]: s[1]["count"] for s in client.STAGE_SECONDS.samples()}
+    client.process_document({"_id": ObjectId(), "audioData": b"blob"})
+    after = {s[0]["stage"]: s[1]["count"] for s in client.STAGE_SECONDS.samples()}
+    for stage in (
+        "queue_wait",
+        "fetch",
+        "decode",
+        "preprocess",
+        "transcribe",
+        "summarize",
+    ):
+        assert after[stage] == before.get(stage, 0) + 1
+    assert after["mongo_write"] == before.get("mongo_write", 0) + 1
@@ -0,0 +1,129 @@
+"""Unit tests for the processed audio retention job."""
+
+import gzip
+import io
+import os
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from bson.objectid import ObjectId
+import pytest
+
+import client
+import lifecycle
+
+
+def recordings_db(docs):
+    """A database mock whose recordings query returns docs once."""
+    database = MagicMock()
+    database.recordings.find.side_effect = [docs, []]
+    database.recordings.update_one.return_value.modified_count = 1
+    database["audio.files"].find_one.return_value = {"length": 1000}
+    return database
+
+
+def test_expired_query_falls_back_to_upload_time():
+    """Recordings without processed_at are judged by their id's timestamp."""
+    cutoff = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    query = lifecycle.expired(cutoff)
+    assert query["processed"] is True
+    assert query["storage"] == {"$exists": False}
+    assert {"processed_at": {"$lt": cutoff}} in query["$or"]
+    assert query["$or"][1]["_id"]["$lt"].generation_time == cutoff
+
+
+def test_keep_policy_touches_nothing():
+    """The default policy doesn't even query."""
+    database = MagicMock()
+    report = lifecycle.compact(database, policy="keep")
+    assert report["recordings"] == 0
+    database.recordings.find.assert_not_called()
+
+
+def test_unknown_policy_is_rejected():
+    """A typo in AUDIO_RETENTION fails loudly instead of keeping or deleting."""
+    with pytest.raises(ValueError):
+        lifecycle.compact(MagicMock(), policy="purge")
+
+
+@patch("lifecycle.GridFSBucket")
+def test_archive_moves_audio_and_leaves_stub(mock_bucket, tmp_path):
+    """Archived audio lands gzipped on disk, the gridfs file goes, a stub stays."""
+    file_id = ObjectId()
+    doc = {"_id": ObjectId(), "processed": True, "audioFileId": file_id}
+    database = recordings_db([doc])
+    audio_fs = mock_bucket.return_value
+    audio_fs.open_download_stream.return_value = io.BytesIO(b"a" * 1000)
+
+    report = lifecycle.compact(database, policy="archive", archive_dir=str(tmp_path))
+
+    storage = database.recordings.update_one.call_args.args[1]["$set"]["storage"]
+    with gzip.open(os.path.join(tmp_path, storage["path"])) as archived:
+        assert archived.read() == b"a" * 1000
+    assert storage["bytes"] == 1000
+    assert database.recordings.update_one.call_args.args[1]["$unset"] == {
+        "audioData": "",
+        "audioFileId": "",
+    }
+    audio_fs.delete.assert_called_once_with(file_id)
+    assert report["recordings"] == 1
+    assert report["reclaimed_bytes"] == 1000
+    assert 0 < report["archived_bytes"] < 1000
+
+
+@patch("lifecycle.GridFSBucket")
+def test_delete_drops_inline_audio(mock_bucket, tmp_path):
+    """The delete policy writes nothing to disk and reports the blob's size."""
+    doc = {"_id": ObjectId(), "processed": True, "audioData": b"x" * 300}
+    database = recordings_db([doc])
+
+    report = lifecycle.compact(database, policy="delete", archive_dir=str(tmp_path))
+
+    storage = database.recordings.update_one.call_args.args[1]["$set"]["storage"]
+    assert storage["policy"] == "delete"
+    assert "path" not in storage
+    assert not os.listdir(tmp_path)
+    mock_bucket.return_value.delete.assert_not_called()
+    assert report["reclaimed_bytes"] == 300
+
+
+@patch("lifecycle.GridFSBucket")
+def test_compaction_race_frees_nothing_twice(mock_bucket, tmp_path):
+    """If another compactor stubbed the recording first, its audio is left alone."""
+    doc = {"_id": ObjectId(), "processed": True, "audioFileId": ObjectId()}
+    database = recordings_db([doc])
+    database.recordings.update_one.return_value.modified_count = 0
+
+    report = lifecycle.compact(database, policy="delete", archive_dir=str(tmp_path))
+    mock_bucket.return_value.delete.assert_not_called()
+    assert report["recordings"] == 0
+
+
+@patch("lifecycle.GridFSBucket")
+def test_dry_run_only_reports(_, tmp_path):
+    """A dry run adds up the sizes without changing anything."""
+    docs = [{"_id": ObjectId(), "audioFileId": ObjectId()} for _ in range(3)]
+    database = recordings_db(docs)
+
+    report = lifecycle.compact(
+        database, policy="archive", archive_dir=str(tmp_path), dry_run=True
+    )
+    assert report["recordings"] == 3
+    assert report["reclaimed_bytes"] == 3000
+    database.recordings.update_one.assert_not_called()
+
+
+def test_open_audio_reads_archive(tmp_path):
+    """Archived recordings can still be processed again."""
+    with gzip.open(tmp_path / "a.gz", "wb") as out:
+        out.write(b"webm bytes")
+    doc = {"_id": ObjectId(), "storage": {"policy": "archive", "path": "a.gz"}}
+    with patch("client.AUDIO_ARCHIVE_DIR", str(tmp_path)):
+        with client.open_audio(doc) as stream:
+            assert stream.read() == b"webm bytes"
+
+
+def test_open_audio_deleted_is_decode_error():
+    """Deleted audio fails like undecodable audio instead of transcribing nothing."""
+    with pytest.raises(client.DecodeError):
+        client.open_audio({"_id": ObjectId(), "storage": {"policy": "delete"}})
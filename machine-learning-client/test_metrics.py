@@ -0,0 +1,109 @@
+"""Unit tests for the shared metrics module."""
+
+import os
+import sys
+from unittest.mock import MagicMock
+
+from pymongo.errors import PyMongoError
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../shared")))
+
+# pylint: disable=import-error, wrong-import-position
+import metrics
+import metrics_store
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Observations land in the first bucket that fits and render cumulatively."""
+    registry = metrics.Registry()
+    histogram = registry.histogram("stage_seconds", "help", buckets=(1, 5))
+    histogram.observe(0.5, stage="decode")
+    histogram.observe(3, stage="decode")
+    histogram.observe(10, stage="decode")
+
+    text = registry.render()
+    assert "# TYPE stage_seconds histogram" in text
+    assert 'stage_seconds_bucket{stage="decode",le="1.0"} 1' in text
+    assert 'stage_seconds_bucket{stage="decode",le="5.0"} 2' in text
+    assert 'stage_seconds_bucket{stage="decode",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{stage="decode"} 3' in text
+    assert 'stage_seconds_sum{stage="decode"} 13.5' in text
+
+
+def test_timer_and_decorator_observe():
+    """The context manager and decorator both record one observation per use."""
+    registry = metrics.Registry()
+    histogram = registry.histogram("stage_seconds", "help")
+
+    with histogram.time(stage="a") as timer:
+        pass
+    assert timer.seconds >= 0
+    assert timer.ms == timer.seconds * 1000
+
+    @histogram.timed(stage="b")
+    def work():
+        return 42
+
+    assert work() == 42
+    counts = {s[0]["stage"]: s[1]["count"] for s in histogram.samples()}
+    assert counts == {"a": 1, "b": 1}
+
+
+def test_render_adds_snapshots_from_other_processes():
+    """Worker snapshots are summed into the serving process's numbers."""
+    worker = metrics.Registry()
+    worker.counter("done_total", "help").inc(2, outcome="done")
+    worker.histogram("stage_seconds", "help", buckets=(1,)).observe(0.5)
+
+    server = metrics.Registry()
+    server.counter("done_total", "help").inc(outcome="done")
+    server.histogram("stage_seconds", "help", buckets=(1,))
+    snapshot = worker.snapshot()
+
+    text = server.render([snapshot, snapshot])
+    assert 'done_total{outcome="done"} 5.0' in text
+    assert 'stage_seconds_bucket{le="1.0"} 2' in text
+
+
+def test_function_gauge_only_on_scrape():
+    """Gauges read at scrape time aren't copied into snapshots."""
+    registry = metrics.Registry()
+    registry.gauge("queue_depth", "help").set_function(lambda: 7)
+    assert registry.snapshot() == {"queue_depth": []}
+    assert "queue_depth 7.0" in registry.render()
+
+
+def test_failing_gauge_function_is_skipped():
+    """A scrape still works if the gauge's query fails."""
+    registry = metrics.Registry()
+
+    def broken():
+        raise RuntimeError("mongo down")
+
+    registry.gauge("queue_depth", "help").set_function(broken)
+    lines = registry.render().splitlines()
+    assert not any(line.startswith("queue_depth ") for line in lines)
+
+
+def test_stored_snapshots_skip_own_and_stale_processes():
+    """Only other processes that reported recently are read back."""
+    collection = MagicMock()
+    collection.find.return_value = [{"_id": "web-b", "metrics": {"a": []}}]
+    assert metrics_store.snapshots(collection, exclude="web-a") == [{"a": []}]
+
+    query = collection.find.call_args.args[0]
+    assert query["_id"] == {"$ne": "web-a"}
+    assert "$gt" in query["updated_at"]
+
+
+def test_flush_stores_registry_snapshot():
+    """A process upserts its registry under its own id, mongo errors are logged."""
+    collection = MagicMock()
+    metrics_store.flush_metrics(collection, "web-a")
+    query, update = collection.update_one.call_args.args
+    assert query == {"_id": "web-a"}
+    assert update["$set"]["metrics"] == metrics.REGISTRY.snapshot()
+    assert collection.update_one.call_args.kwargs == {"upsert": True}
+
+    collection.update_one.side_effect = PyMongoError("down")
+    metrics_store.flush_metrics(collection, "web-a")
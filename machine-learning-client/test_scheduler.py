@@ -0,0 +1,121 @@
+"""Unit tests for the fair scheduler and fair claims."""
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+from bson.objectid import ObjectId
+
+import scheduler
+import worker
+
+NOW = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def head(user_id, seconds_ago=0):
+    """a queue head for user_id whose recording was uploaded seconds_ago"""
+    return {
+        "_id": user_id,
+        "recording_id": ObjectId.from_datetime(NOW - timedelta(seconds=seconds_ago)),
+    }
+
+
+def test_recording_cost_from_size():
+    """Size turns into seconds at the assumed bitrate, capped at the max length."""
+    assert scheduler.recording_cost({"size_bytes": 40000}) == 10
+    assert scheduler.recording_cost({"size_bytes": 10**9}) == 60
+    assert scheduler.recording_cost({}) == 60
+
+
+def test_plan_prefers_light_user_over_backlog():
+    """A user who has been charged a lot waits behind one who hasn't."""
+    heavy, light = ObjectId(), ObjectId()
+    heads = [head(heavy, seconds_ago=10), head(light, seconds_ago=1)]
+    charges = {scheduler.CLOCK_ID: 100.0, str(heavy): 400.0}
+
+    order = scheduler.plan(heads, charges, now=NOW, aging_rate=0.5)
+    assert [h["_id"] for h, _ in order] == [light, heavy]
+    assert order[0][1] == 100.0
+    assert order[1][1] == 400.0
+
+
+def test_plan_ages_old_recordings_to_the_front():
+    """Waiting long enough beats any amount of charge."""
+    heavy, light = ObjectId(), ObjectId()
+    heads = [head(heavy, seconds_ago=1000), head(light)]
+    charges = {scheduler.CLOCK_ID: 100.0, str(heavy): 400.0}
+
+    order = scheduler.plan(heads, charges, now=NOW, aging_rate=0.5)
+    assert order[0][0]["_id"] == heavy
+
+
+def test_plan_is_fifo_between_equal_users():
+    """Users with the same charge are served oldest recording first."""
+    first, second = ObjectId(), ObjectId()
+    heads = [head(second, seconds_ago=5), head(first, seconds_ago=5)]
+    heads[1]["recording_id"] = ObjectId.from_datetime(NOW - timedelta(seconds=6))
+
+    order = scheduler.plan(heads, {}, now=NOW, aging_rate=0)
+    assert [h["_id"] for h, _ in order] == [first, second]
+
+
+def test_queue_heads_groups_by_user():
+    """Heads come from one aggregation: oldest pending recording per user."""
+    collection = MagicMock()
+    scheduler.queue_heads(collection, {"processed": {"$ne": True}}, limit=7)
+
+    pipeline = collection.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$match": {"processed": {"$ne": True}}}
+    assert pipeline[1] == {"$sort": {"_id": 1}}
+    assert pipeline[2]["$group"]["_id"] == "$user_id"
+    assert pipeline[-1] == {"$limit": 7}
+
+
+def test_charge_bills_user_and_moves_clock():
+    """Charging adds the cost on top of the start and only ever raises the clock."""
+    state = MagicMock()
+    user_id = ObjectId()
+    scheduler.charge(state, user_id, 100.0, 10.0)
+
+    user_update, clock_update = state.update_one.call_args_list
+    assert user_update.args[0] == {"_id": str(user_id)}
+    assert user_update.args[1] == [
+        {"$set": {"finish": {"$add": [{"$max": ["$finish", 100.0]}, 10.0]}}}
+    ]
+    assert clock_update.args == ({"_id": "clock"}, {"$max": {"finish": 100.0}})
+
+
+def test_claim_fair_claims_planned_recording():
+    """The first head in fair order is leased and charged to its user."""
+    user_id = ObjectId()
+    collection, state = MagicMock(), MagicMock()
+    collection.aggregate.return_value = [head(user_id)]
+    state.find.return_value = []
+    claimed = {"_id": "abc", "user_id": user_id, "size_bytes": 4000}
+    collection.find_one_and_update.return_value = claimed
+
+    assert worker.claim_fair(collection, state, "w-1") is claimed
+    query = collection.find_one_and_update.call_args.args[0]
+    assert query["_id"] == collection.aggregate.return_value[0]["recording_id"]
+    user_update = state.update_one.call_args_list[0]
+    assert user_update.args[1][0]["$set"]["finish"]["$add"][1] == 1.0
+
+
+def test_claim_fair_empty_queue():
+    """No pending recordings means no claim attempt at all."""
+    collection, state = MagicMock(), MagicMock()
+    collection.aggregate.return_value = []
+    state.find.return_value = []
+
+    assert worker.claim_fair(collection, state, "w-1") is None
+    collection.find_one_and_update.assert_not_called()
+
+
+def test_claim_fair_falls_back_when_heads_are_taken():
+    """If other workers leased every head first, claim the oldest left."""
+    collection, state = MagicMock(), MagicMock()
+    collection.aggregate.return_value = [head(ObjectId())]
+    state.find.return_value = []
+    collection.find_one_and_update.side_effect = [None, {"_id": "next"}]
+
+    assert worker.claim_fair(collection, state, "w-1") == {"_id": "next"}
+    assert "_id" not in collection.find_one_and_update.call_args.args[0]
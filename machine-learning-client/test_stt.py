@@ -0,0 +1,100 @@
+"""Unit tests for the speech-to-text backends."""
+
+# pylint: disable=redefined-outer-name
+
+import json
+import sys
+from unittest.mock import MagicMock, patch
+import pytest
+import speech_recognition as sr
+import stt
+
+
+@pytest.fixture
+def fake_vosk(tmp_path):
+    """A stand-in vosk module and an empty model directory."""
+    module = MagicMock()
+    with patch.dict(sys.modules, {"vosk": module}):
+        yield module, str(tmp_path)
+
+
+def test_vosk_transcribes_16k_pcm(fake_vosk):
+    """Audio is converted to 16kHz 16-bit PCM and the final text returned."""
+    module, model_path = fake_vosk
+    module.KaldiRecognizer.return_value.FinalResult.return_value = json.dumps(
+        {"text": "hello world"}
+    )
+    audio = MagicMock()
+
+    transcriber = stt.VoskTranscriber(model_path)
+    assert transcriber.transcribe(audio) == "hello world"
+    audio.get_raw_data.assert_called_once_with(convert_rate=16000, convert_width=2)
+    module.Model.assert_called_once_with(model_path)
+
+
+def test_vosk_empty_result_is_unknown_value(fake_vosk):
+    """Silence comes back as UnknownValueError like the other recognizers."""
+    module, model_path = fake_vosk
+    module.KaldiRecognizer.return_value.FinalResult.return_value = '{"text": ""}'
+
+    with pytest.raises(sr.UnknownValueError):
+        stt.VoskTranscriber(model_path).transcribe(MagicMock())
+
+
+def test_vosk_missing_model_is_request_error(fake_vosk):
+    """A missing model directory is reported as the engine being unavailable."""
+    _, model_path = fake_vosk
+    with pytest.raises(sr.RequestError):
+        stt.VoskTranscriber(model_path + "/missing")
+
+
+def test_get_transcriber_builds_once():
+    """The backend is built on first use and reused after that."""
+    with patch.dict(stt.BACKENDS, {"fake": MagicMock()}), patch.dict(
+        stt._transcribers, clear=True  # pylint: disable=protected-access
+    ):
+        first = stt.get_transcriber("fake")
+        assert stt.get_transcriber("fake") is first
+        stt.BACKENDS["fake"].assert_called_once_with()
+
+
+def test_get_transcriber_unknown_backend():
+    """An unknown STT_BACKEND fails loudly."""
+    with pytest.raises(ValueError):
+        stt.get_transcriber("nope")
+
+
+def test_backend_identity_names_the_model():
+    """Vosk transcripts are told apart by model, google's by backend."""
+    with patch("stt.VOSK_MODEL_PATH", "/models/vosk-model-en-us-0.22/"):
+        assert stt.backend_identity("vosk") == "vosk:vosk-model-en-us-0.22"
+    assert stt.backend_identity("google") == "google"
+
+
+def test_transcribe_segments_in_order_with_progress():
+    """Segments are reported as they finish and joined in recording order."""
+    backend = MagicMock()
+    backend.transcribe.side_effect = lambda data: {b"ab": "one", b"cd": "two"}.get(
+        data.frame_data, ""
+    )
+    audio_data = sr.AudioData(b"abcdef", 16000, 1)
+    seen = []
+
+    with patch("stt.get_transcriber", return_value=backend):
+        text = stt.transcribe_segments(
+            audio_data,
+            [(0, 2), (2, 4), (4, 6)],
+            on_segment=lambda i, t, n: seen.append((i, t, n)),
+        )
+    assert text == "one two"
+    assert sorted(seen) == [(0, "one", 3), (1, "two", 3), (2, "", 3)]
+
+
+def test_transcribe_segments_nothing_heard():
+    """If no segment has words the whole recording is UnknownValueError."""
+    backend = MagicMock()
+    backend.transcribe.side_effect = sr.UnknownValueError()
+    with patch("stt.get_transcriber", return_value=backend), pytest.raises(
+        sr.UnknownValueError
+    ):
+        stt.transcribe_segments(sr.AudioData(b"ab", 16000, 1), [(0, 2)])
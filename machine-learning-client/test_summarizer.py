@@ -0,0 +1,54 @@
+"""Unit tests for the lazily loaded summarizer."""
+
+from unittest.mock import MagicMock, patch
+import pytest
+import summarizer
+
+
+def test_nothing_loads_until_first_call():
+    """Building the summarizer doesn't touch the model, the first call does, once."""
+    fake_pipeline = MagicMock(return_value=[{"summary_text": "s"}])
+    loader = MagicMock(return_value=fake_pipeline)
+    with patch.dict(summarizer.LOADERS, {"fp32": loader}):
+        lazy = summarizer.LazySummarizer("fp32", "some/model", "/tmp/cache")
+        assert not lazy.loaded
+        loader.assert_not_called()
+
+        assert lazy("text", max_length=20) == [{"summary_text": "s"}]
+        lazy("more text")
+    loader.assert_called_once_with("some/model", "/tmp/cache")
+    fake_pipeline.assert_any_call("text", max_length=20)
+
+
+def test_mode_picks_loader():
+    """SUMMARIZER_MODE selects the quantized loader."""
+    loaders = {"fp32": MagicMock(), "int8": MagicMock()}
+    with patch.dict(summarizer.LOADERS, loaders):
+        summarizer.LazySummarizer("int8").load()
+    loaders["int8"].assert_called_once()
+    loaders["fp32"].assert_not_called()
+
+
+def test_identity_names_model_and_mode():
+    """fp32 and int8 summaries of the same model count as different results."""
+    assert summarizer.LazySummarizer("int8", "some/model").identity == (
+        "some/model:int8"
+    )
+
+
+def test_unknown_mode():
+    """An unknown mode fails when configured, not on the first request."""
+    with pytest.raises(ValueError):
+        summarizer.LazySummarizer("fp4")
+
+
+def test_int8_reuses_saved_model(tmp_path):
+    """A quantized model already in the cache directory is loaded, not rebuilt."""
+    saved = tmp_path / "some--model-int8.pt"
+    saved.write_bytes(b"")
+    torch = MagicMock()
+    transformers = MagicMock()
+    with patch.dict("sys.modules", {"torch": torch, "transformers": transformers}):
+        summarizer.load_int8("some/model", str(tmp_path))
+    torch.load.assert_called_once_with(str(saved), weights_only=False)
+    torch.ao.quantization.quantize_dynamic.assert_not_called()
@@ -0,0 +1,100 @@
+"""Unit tests for the change stream watcher."""
+
+import threading
+from unittest.mock import MagicMock
+from pymongo.errors import OperationFailure
+import watcher
+
+
+def make_collection(changes, stop_event):
+    """A collection whose change stream yields changes, then stops the watcher."""
+    collection = MagicMock()
+    collection.name = "recordings"
+    stream = collection.watch.return_value.__enter__.return_value
+    stream.resume_token = {"_data": "token-2"}
+    pending = list(changes)
+
+    def try_next():
+        if pending:
+            return pending.pop(0)
+        stop_event.set()
+        return None
+
+    stream.try_next.side_effect = try_next
+    return collection
+
+
+def test_watch_inserts_calls_back_and_saves_token():
+    """Each insert is reported and its resume token persisted."""
+    stop_event = threading.Event()
+    collection = make_collection([None, {"documentKey": {"_id": "abc"}}], stop_event)
+    state = MagicMock()
+    state.find_one.return_value = None
+    on_insert = MagicMock()
+
+    watcher.watch_inserts(collection, state, on_insert, stop_event)
+
+    on_insert.assert_called_once_with("abc")
+    state.update_one.assert_called_once_with(
+        {"_id": "recordings"},
+        {"$set": {"resume_token": {"_data": "token-2"}}},
+        upsert=True,
+    )
+    pipeline = collection.watch.call_args.args[0]
+    assert pipeline == [{"$match": {"operationType": "insert"}}]
+
+
+def test_watch_inserts_resumes_from_saved_token():
+    """A restarted watcher picks up after the last saved token."""
+    stop_event = threading.Event()
+    collection = make_collection([], stop_event)
+    state = MagicMock()
+    state.find_one.return_value = {"_id": "recordings", "resume_token": "token-1"}
+
+    watcher.watch_inserts(collection, state, MagicMock(), stop_event)
+
+    assert collection.watch.call_args.kwargs["resume_after"] == "token-1"
+
+
+def test_watch_inserts_without_replica_set_returns():
+    """A standalone server leaves the workers polling."""
+    collection = MagicMock()
+    collection.watch.side_effect = OperationFailure(
+        "not a replica set", code=watcher.NOT_REPLICA_SET
+    )
+    state = MagicMock()
+    state.find_one.return_value = None
+    inserts = watcher.InsertSignal()
+
+    watcher.watch_inserts(collection, state, inserts.notify, threading.Event(), inserts)
+
+    assert collection.watch.call_count == 1
+    assert inserts.streaming is False
+
+
+def test_watch_inserts_drops_expired_token():
+    """If the oplog no longer has our token, watch from now instead."""
+    stop_event = threading.Event()
+    collection = make_collection([], stop_event)
+    stream = collection.watch.return_value
+    collection.watch.side_effect = [
+        OperationFailure("history lost", code=watcher.HISTORY_LOST),
+        stream,
+    ]
+    state = MagicMock()
+    state.find_one.return_value = {"resume_token": "old"}
+
+    watcher.watch_inserts(collection, state, MagicMock(), stop_event)
+
+    first, second = collection.watch.call_args_list
+    assert first.kwargs["resume_after"] == "old"
+    assert second.kwargs["resume_after"] is None
+
+
+def test_insert_signal_wakes_waiter():
+    """A notification ends the wait early, and the interval depends on streaming."""
+    inserts = watcher.InsertSignal()
+    inserts.notify("abc")
+    assert inserts.wait(5, 5) is True
+    inserts.streaming = True
+    assert inserts.wait(5, 0.01) is False
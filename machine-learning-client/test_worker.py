@@ -0,0 +1,104 @@
+"""Unit tests for the worker pool's lease handling."""
+
+from unittest.mock import MagicMock, patch
+from pymongo import ReturnDocument
+from pymongo.errors import AutoReconnect
+import worker
+
+
+def test_claim_next_leases_oldest_unclaimed():
+    """Claiming sets a lease owner and only matches unleased or expired docs."""
+    collection = MagicMock()
+    worker.claim_next(collection, "w-1")
+
+    query, update = collection.find_one_and_update.call_args.args
+    kwargs = collection.find_one_and_update.call_args.kwargs
+    assert query["processed"] == {"$ne": True}
+    assert {"lease_until": {"$exists": False}} in query["$or"]
+    assert update["$set"]["lease_owner"] == "w-1"
+    assert update["$inc"] == {"attempts": 1}
+    assert kwargs["sort"] == [("_id", 1)]
+    assert kwargs["return_document"] == ReturnDocument.AFTER
+
+
+def test_claim_next_extra_query():
+    """An extra query narrows the claim to a specific recording."""
+    collection = MagicMock()
+    worker.claim_next(collection, "w-1", {"_id": "abc"})
+
+    query = collection.find_one_and_update.call_args.args[0]
+    assert query["_id"] == "abc"
+
+
+def test_release_returns_doc_to_queue():
+    """A failed recording under the attempt limit loses its lease only."""
+    collection = MagicMock()
+    worker.release(collection, {"_id": "abc", "attempts": 1}, max_attempts=3)
+
+    update = collection.update_one.call_args.args[1]
+    assert "lease_owner" in update["$unset"]
+    assert "$set" not in update
+
+
+def test_release_parks_doc_after_max_attempts():
+    """A recording that keeps failing is marked failed instead of retried."""
+    collection = MagicMock()
+    worker.release(collection, {"_id": "abc", "attempts": 3}, max_attempts=3)
+
+    update = collection.update_one.call_args.args[1]
+    assert update["$set"] == {"failed": True}
+
+
+def stop_after(calls):
+    """A stop event that reports set after calls checks, waits return at once."""
+    stop_event = MagicMock()
+    stop_event.is_set.side_effect = [False] * calls + [True]
+    return stop_event
+
+
+@patch("worker.ERROR_BACKOFF", 0)
+@patch("worker.FAIR_SCHEDULING", False)
+def test_drain_survives_mongo_errors_while_claiming():
+    """A failed claim is logged and retried instead of ending the thread."""
+    client = MagicMock()
+    client.audio_collection.find_one_and_update.side_effect = [
+        AutoReconnect("down"),
+        {"_id": "abc", "attempts": 1},
+        None,
+    ]
+    stop_event = stop_after(3)
+
+    worker.drain(client, "w-1", stop_event, MagicMock())
+    client.process_document.assert_called_once()
+    stop_event.wait.assert_called_once_with(0)
+
+
+@patch("worker.ERROR_BACKOFF", 0)
+@patch("worker.FAIR_SCHEDULING", False)
+def test_drain_releases_recording_that_raised():
+    """A recording whose processing raised goes back to the queue."""
+    client = MagicMock()
+    client.audio_collection.find_one_and_update.return_value = {
+        "_id": "abc",
+        "attempts": 1,
+    }
+    client.process_document.side_effect = [AutoReconnect("down"), True]
+
+    worker.drain(client, "w-1", stop_after(2), MagicMock())
+    assert client.process_document.call_count == 2
+    client.audio_collection.update_one.assert_called_once()
+    assert worker.BUSY_THREADS.samples() == [({}, 0)]
+
+
+def test_pool_reports_compaction_metrics():
+    """The pool process stores its own snapshot, compaction's counters live there."""
+    database, stop_event = MagicMock(), MagicMock()
+    with patch("worker.threading.Thread") as thread:
+        owner = worker.start_compaction(database, stop_event)
+    assert owner.startswith("pool-")
+    started = {
+        call.kwargs["target"]: call.kwargs["args"] for call in thread.call_args_list
+    }
+    assert started[worker.run_compaction] == (stop_event,)
+    assert started[worker.report_metrics] == (database.metrics, owner, stop_event)
+    assert thread.return_value.start.call_count == 2
@@ -0,0 +1,93 @@
+"""Wakes the workers the moment a recording is inserted.
+
+watch_inserts() follows a MongoDB change stream on 'recordings' and calls
+back for every insert, saving the resume token in 'watch_state' after each
+one so a restarted worker carries on where it stopped. Change streams need a
+replica set (a single node one is enough). On a standalone mongod the watcher
+gives up and the workers keep polling every ML_POLL_INTERVAL instead.
+"""
+
+import os
+import threading
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+# how long one getMore waits for a change before we check for shutdown
+WATCH_MAX_AWAIT_MS = int(os.getenv("ML_WATCH_MAX_AWAIT_MS", "1000"))
+# seconds between reconnect attempts after the stream drops
+WATCH_RETRY_INTERVAL = float(os.getenv("ML_WATCH_RETRY_INTERVAL", "5"))
+
+# server error codes we handle
+NOT_REPLICA_SET = 40573
+HISTORY_LOST = 286
+
+
+class InsertSignal:
+    """Lets idle drain threads sleep until the watcher sees an insert."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.streaming = False
+
+    def notify(self, *_):
+        """Wake every waiting thread."""
+        self.event.set()
+
+    def wait(self, poll_interval, idle_interval):
+        """Sleep until notified, polling faster when no change stream is running.
+        Returns True if woken by a notification."""
+        woken = self.event.wait(idle_interval if self.streaming else poll_interval)
+        self.event.clear()
+        return woken
+
+
+def load_token(state, name):
+    """The last saved resume token, or None."""
+    doc = state.find_one({"_id": name})
+    return doc.get("resume_token") if doc else None
+
+
+def save_token(state, name, token):
+    """Remember how far the stream has been read."""
+    state.update_one({"_id": name}, {"$set": {"resume_token": token}}, upsert=True)
+
+
+def watch_inserts(collection, state, on_insert, stop_event, signal=None):
+    """Call on_insert(recording_id) for each insert until stop_event is set.
+    Returns early if the server can't do change streams."""
+    name = collection.name
+    token = load_token(state, name)
+    while not stop_event.is_set():
+        try:
+            with collection.watch(
+                [{"$match": {"operationType": "insert"}}],
+                resume_after=token,
+                max_await_time_ms=WATCH_MAX_AWAIT_MS,
+            ) as stream:
+                if signal is not None:
+                    signal.streaming = True
+                while not stop_event.is_set():
+                    change = stream.try_next()
+                    if change is None:
+                        continue
+                    on_insert(change["documentKey"]["_id"])
+                    token = stream.resume_token
+                    save_token(state, name, token)
+        except OperationFailure as e:
+            if e.code == NOT_REPLICA_SET:
+                print("Change streams need a replica set, polling instead")
+                return
+            if e.code == HISTORY_LOST and token is not None:
+                # the oplog moved past our token, the claim loop still finds
+                # anything inserted meanwhile, so just start from now
+                print("Resume token expired, watching from now")
+                token = None
+                continue
+            print(f"Change stream failed: {e}")
+            stop_event.wait(WATCH_RETRY_INTERVAL)
+        except PyMongoError as e:
+            print(f"Change stream interrupted: {e}")
+            stop_event.wait(WATCH_RETRY_INTERVAL)
+        finally:
+            if signal is not None:
+                signal.streaming = False
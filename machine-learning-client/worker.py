@@ -0,0 +1,222 @@
+"""Long-running worker pool that drains the 'recordings' queue.
+
+Each worker process loads the models once and then claims unprocessed
+recordings one at a time with a lease, so several workers can run in
+parallel without processing the same recording twice. If a worker dies
+its lease simply expires and another worker picks the recording up.
+
+Idle workers don't poll: a change stream on 'recordings' wakes them as soon
+as the web app inserts one (see watcher.py). Without a replica set they fall
+back to polling every ML_POLL_INTERVAL seconds.
+"""
+
+# pylint: disable=import-error
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from pymongo.errors import PyMongoError
+
+SHARED_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../shared"))
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+# pylint: disable=wrong-import-position
+from mongo import ensure_indexes, get_database
+from metrics_store import flush_metrics, process_id, report_metrics
+import scheduler
+from cache import ensure_cache_indexes
+from leases import claimable, claim_next, release
+from lifecycle import run_compaction
+from pool_metrics import BUSY_SECONDS, BUSY_THREADS, WORKER_THREADS_GAUGE
+from stt import get_transcriber
+from watcher import InsertSignal, watch_inserts
+
+NUM_WORKERS = int(os.getenv("ML_WORKERS", "2"))
+# recordings each worker process handles at once, their summaries share a batch
+WORKER_THREADS = int(os.getenv("ML_WORKER_THREADS", "4"))
+# seconds an idle worker waits before looking at the queue again
+POLL_INTERVAL = float(os.getenv("ML_POLL_INTERVAL", "1"))
+# same, while a change stream is watching for inserts, only catches expired leases
+IDLE_POLL_INTERVAL = float(os.getenv("ML_IDLE_POLL_INTERVAL", "30"))
+# seconds a drain thread backs off after mongo or a recording blew up
+ERROR_BACKOFF = float(os.getenv("ML_ERROR_BACKOFF", "5"))
+# per-user fair queuing with aging instead of strictly oldest first
+FAIR_SCHEDULING = os.getenv("ML_FAIR_SCHEDULING", "1") == "1"
+
+
+def claim_fair(collection, state, worker_id):
+    """Lease the next recording in fair order (see scheduler.py): try each
+    user's oldest recording by priority, falling back to plain oldest first if
+    other workers took them all first or the scheduler can't be read."""
+    try:
+        heads = scheduler.queue_heads(collection, claimable(datetime.now(timezone.utc)))
+        order = scheduler.plan(heads, scheduler.load_charges(state, heads))
+    except PyMongoError as e:
+        print(f"[{worker_id}] scheduler unavailable, claiming oldest: {e}")
+        return claim_next(collection, worker_id)
+    if not order:
+        return None
+    for head, start in order:
+        audio_doc = claim_next(collection, worker_id, {"_id": head["recording_id"]})
+        if audio_doc is not None:
+            scheduler.charge(
+                state,
+                audio_doc.get("user_id"),
+                start,
+                scheduler.recording_cost(audio_doc),
+            )
+            return audio_doc
+    return claim_next(collection, worker_id)
+
+
+def drain(client, worker_id, stop_event, inserts):
+    """Claim and process recordings until stopped, one at a time. Errors are
+    logged and backed off from so a mongo hiccup doesn't kill the thread."""
+    while not stop_event.is_set():
+        try:
+            if FAIR_SCHEDULING:
+                audio_doc = claim_fair(
+                    client.audio_collection, client.db.scheduler, worker_id
+                )
+            else:
+                audio_doc = claim_next(client.audio_collection, worker_id)
+        except PyMongoError as e:
+            print(f"[{worker_id}] could not claim a recording: {e}")
+            stop_event.wait(ERROR_BACKOFF)
+            continue
+        if audio_doc is None:
+            inserts.wait(POLL_INTERVAL, IDLE_POLL_INTERVAL)
+            continue
+
+        print(f"[{worker_id}] claimed {audio_doc['_id']}")
+        BUSY_THREADS.inc()
+        started = time.perf_counter()
+        try:
+            if not client.process_document(audio_doc):
+                release(client.audio_collection, audio_doc)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            print(f"[{worker_id}] failed on {audio_doc['_id']}: {e}")
+            try:
+                release(client.audio_collection, audio_doc)
+            except PyMongoError:
+                # the lease runs out and another worker retries it
+                pass
+            stop_event.wait(ERROR_BACKOFF)
+        finally:
+            BUSY_SECONDS.inc(time.perf_counter() - started)
+            BUSY_THREADS.dec()
+
+
+def run_worker(worker_id, stop_event, threads=WORKER_THREADS):
+    """Worker process body: load the models once, then drain the queue from a few
+    threads so concurrent transcripts can be summarized as one batch."""
+    # imported here so the models are loaded inside the worker process
+    import client  # pylint: disable=import-outside-toplevel
+
+    client.summarizer.load()
+    try:
+        get_transcriber()
+    except client.sr.RequestError as e:
+        print(f"[{worker_id}] speech recognition unavailable: {e}")
+    print(f"[{worker_id}] ready")
+    inserts = InsertSignal()
+    threads = max(1, threads)
+    WORKER_THREADS_GAUGE.set(threads)
+    drainers = [
+        threading.Thread(
+            target=drain, args=(client, f"{worker_id}.{i}", stop_event, inserts)
+        )
+        for i in range(threads)
+    ]
+    watcher = threading.Thread(
+        target=watch_inserts,
+        args=(
+            client.audio_collection,
+            client.db.watch_state,
+            inserts.notify,
+            stop_event,
+            inserts,
+        ),
+        daemon=True,
+    )
+    reporter = threading.Thread(
+        target=report_metrics,
+        args=(client.db.metrics, worker_id, stop_event),
+        daemon=True,
+    )
+    for thread in drainers:
+        thread.start()
+    watcher.start()
+    reporter.start()
+    # wake sleeping drainers on shutdown
+    stop_event.wait()
+    inserts.notify()
+    for thread in drainers:
+        thread.join()
+    flush_metrics(client.db.metrics, worker_id)
+    print(f"[{worker_id}] stopped")
+
+
+def start_compaction(database, stop_event):
+    """Compact processed audio past retention in the background (a no-op with
+    AUDIO_RETENTION=keep). Compaction counts its reclaimed bytes in this
+    process, which the workers' reporters don't cover, so it reports its own
+    metrics too. Returns the id they are stored under."""
+    owner = process_id("pool")
+    threading.Thread(target=run_compaction, args=(stop_event,), daemon=True).start()
+    threading.Thread(
+        target=report_metrics,
+        args=(database.metrics, owner, stop_event),
+        daemon=True,
+    ).start()
+    return owner
+
+
+def run_pool(num_workers=NUM_WORKERS):
+    """Start the worker processes and restart any that die until we are told to stop."""
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+
+    def spawn(index):
+        proc = ctx.Process(
+            target=run_worker, args=(f"{prefix}-{index}", stop_event), daemon=False
+        )
+        proc.start()
+        return proc
+
+    def handle_stop(*_):
+        print("Stopping workers after their current recording...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    ensure_indexes()
+    ensure_cache_indexes(get_database())
+    workers = [spawn(i) for i in range(num_workers)]
+    owner = start_compaction(get_database(), stop_event)
+    while not stop_event.is_set():
+        for i, proc in enumerate(workers):
+            if not proc.is_alive():
+                print(f"Worker {i} exited with {proc.exitcode}, restarting")
+                workers[i] = spawn(i)
+        time.sleep(1)
+
+    for proc in workers:
+        proc.join()
+    flush_metrics(get_database().metrics, owner)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS)
+    run_pool(parser.parse_args().workers)
@@ -3,17 +3,22 @@ transcribes them, summarizes them, and writes results into 'messages'.
 """
 
 from datetime import datetime, timezone
+import functools
 import io
-from pymongo import MongoClient
 from transformers import pipeline
 import speech_recognition as sr
-
+from mongo import get_database
 
 recognizer = sr.Recognizer()
-summarizer = pipeline("summarization", model="sshleifer/distilbart-cnn-12-6", device=-1)
 
-client = MongoClient("mongodb://mongodb:27017")
-db = client["speech2text"]
+
+@functools.lru_cache(maxsize=None)
+def summarizer():
+    """The summarization pipeline, built on first use instead of at import."""
+    return pipeline("summarization", model="sshleifer/distilbart-cnn-12-6", device=-1)
+
+
+db = get_database()
 audio_collection = db["recordings"]
 messages_collection = db["messages"]
 
@@ -37,7 +42,7 @@ def process_audio():
         text = recognizer.recognize_google(audio_data)
         print(f"[Transcribed] {text}")
 
-        summary = summarizer(text, max_length=20, min_length=10, do_sample=False)[0][
+        summary = summarizer()(text, max_length=20, min_length=10, do_sample=False)[0][
             "summary_text"
         ]
         print(f"[Summary] {summary}")
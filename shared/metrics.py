@@ -0,0 +1,313 @@
+"""Small in-process metrics with a Prometheus text /metrics output.
+
+Counters, gauges and histograms live in a Registry (REGISTRY by default) and
+render() turns them into the Prometheus exposition format. Stage timings are
+taken with a context manager or decorator:
+
+    with STAGE_SECONDS.time(stage="decode") as timer:
+        ...
+    timer.seconds
+
+    @STAGE_SECONDS.timed(stage="summarize")
+    def summarize(text): ...
+
+Processes without an HTTP server (the worker pool) can snapshot() their
+registry into mongo and whoever serves /metrics passes those snapshots to
+render(), which adds them to its own numbers.
+"""
+
+import functools
+import threading
+import time
+
+# seconds, from a fast mongo write up to a long transcription
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# bytes, 16KB up to 64MB
+SIZE_BUCKETS = tuple(2**power for power in range(14, 27, 2))
+
+
+def _key(labels):
+    """Labels as a hashable, order independent key."""
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(pairs):
+    """{name="value",...} or nothing for no labels."""
+    if not pairs:
+        return ""
+    inner = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + inner + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+class Metric:
+    """Base class, one value per set of labels."""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def samples(self, scrape=False):  # pylint: disable=unused-argument
+        """(labels, value) pairs, value as stored in a snapshot."""
+        with self._lock:
+            return [
+                (dict(key), self._copy(value)) for key, value in self._values.items()
+            ]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+    @staticmethod
+    def merge(current, other):
+        """Combine two values of this metric from different processes."""
+        return current + other
+
+    def lines(self, values):
+        """Exposition lines for already merged {labels key: value}."""
+        return [
+            f"{self.name}{_format_labels(key)} {_format_value(v)}"
+            for key, v in values.items()
+        ]
+
+
+class Counter(Metric):
+    """Only goes up."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        """Add amount to the counter for these labels."""
+        with self._lock:
+            key = _key(labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Goes up and down, or is read from a function when scraped."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation)
+        self._function = None
+
+    def set(self, value, **labels):
+        """Set the gauge for these labels."""
+        with self._lock:
+            self._values[_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        """Add amount to the gauge for these labels."""
+        with self._lock:
+            key = _key(labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        """Subtract amount from the gauge for these labels."""
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """Read the (unlabelled) value from function() at scrape time, e.g. a count
+        query. Not part of snapshots. If it raises the value is left out."""
+        self._function = function
+
+    def samples(self, scrape=False):
+        samples = super().samples()
+        if scrape and self._function is not None:
+            try:
+                samples.append(({}, self._function()))
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                print(f"Could not read {self.name}: {e}")
+        return samples
+
+
+class Timer:
+    """Context manager that observes its elapsed seconds into a histogram."""
+
+    def __init__(self, metric, labels):
+        self.metric = metric
+        self.labels = labels
+        self.seconds = 0.0
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        self.seconds = time.perf_counter() - self._started
+        self.metric.observe(self.seconds, **self.labels)
+        return False
+
+    @property
+    def ms(self):
+        """Elapsed milliseconds, for logging."""
+        return self.seconds * 1000
+
+
+class Histogram(Metric):
+    """Counts observations into cumulative buckets, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        """Record one observation."""
+        with self._lock:
+            key = _key(labels)
+            if key not in self._values:
+                self._values[key] = {
+                    "counts": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            entry = self._values[key]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["counts"][i] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    def time(self, **labels):
+        """Context manager timing its block."""
+        return Timer(self, labels)
+
+    def timed(self, **labels):
+        """Decorator timing every call of the function."""
+
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def _copy(value):
+        return {
+            "counts": list(value["counts"]),
+            "sum": value["sum"],
+            "count": value["count"],
+        }
+
+    @staticmethod
+    def merge(current, other):
+        return {
+            "counts": [a + b for a, b in zip(current["counts"], other["counts"])],
+            "sum": current["sum"] + other["sum"],
+            "count": current["count"] + other["count"],
+        }
+
+    def lines(self, values):
+        lines = []
+        for key, value in values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, value["counts"]):
+                cumulative += count
+                labels = _format_labels(key + (("le", _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(
+                f"{self.name}_sum{_format_labels(key)} {repr(float(value['sum']))}"
+            )
+            lines.append(f"{self.name}_count{_format_labels(key)} {value['count']}")
+        return lines
+
+
+class Registry:
+    """A set of metrics that render together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric, or return the one already registered under its name."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation):
+        """Register a counter."""
+        return self.register(Counter(name, documentation))
+
+    def gauge(self, name, documentation):
+        """Register a gauge."""
+        return self.register(Gauge(name, documentation))
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        """Register a histogram."""
+        return self.register(Histogram(name, documentation, buckets))
+
+    def snapshot(self):
+        """Plain dicts/lists of every value, safe to store in mongo."""
+        return {
+            name: [
+                {"labels": labels, "value": value} for labels, value in metric.samples()
+            ]
+            for name, metric in self._metrics.items()
+        }
+
+    def render(self, snapshots=()):
+        """Prometheus text format, with the given snapshots added to our own values.
+        Snapshot entries for metrics this registry doesn't know are skipped."""
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            values = {}
+            sources = [metric.samples(scrape=True)] + [
+                [(s["labels"], s["value"]) for s in snapshot.get(name, [])]
+                for snapshot in snapshots
+            ]
+            for samples in sources:
+                for labels, value in samples:
+                    key = _key(labels)
+                    values[key] = (
+                        metric.merge(values[key], value) if key in values else value
+                    )
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.lines(values))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# content type Prometheus expects from /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name, documentation):
+    """A counter on the default registry."""
+    return REGISTRY.counter(name, documentation)
+
+
+def gauge(name, documentation):
+    """A gauge on the default registry."""
+    return REGISTRY.gauge(name, documentation)
+
+
+def histogram(name, documentation, buckets=DEFAULT_BUCKETS):
+    """A histogram on the default registry."""
+    return REGISTRY.histogram(name, documentation, buckets)
+
+
+def render(snapshots=()):
+    """The default registry in Prometheus text format."""
+    return REGISTRY.render(snapshots)
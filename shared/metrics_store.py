@@ -0,0 +1,79 @@
+"""Metric snapshots shared through mongo.
+
+Every process keeps its metrics in memory (see metrics.py), so a /metrics
+served by one of several processes - gunicorn workers, the worker pool - only
+knows its own numbers. Instead each process stores a snapshot of its registry
+in a collection every METRICS_FLUSH_INTERVAL seconds, and /metrics renders its
+own live values plus the snapshots the other processes stored recently.
+
+The worker pool and the ml client's HTTP workers share 'metrics', the web
+app's server processes use 'web_metrics'. Both expire through TTL indexes
+(see mongo.py) once their process is long gone.
+"""
+
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import PyMongoError
+
+import metrics
+
+# seconds between a process's snapshots, and when /metrics stops counting one
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "15"))
+METRICS_STALE_SECONDS = float(os.getenv("METRICS_STALE_SECONDS", "120"))
+
+
+def process_id(prefix):
+    """An id for this process's snapshot, unique across hosts and restarts."""
+    return f"{prefix}-{socket.gethostname()}-{os.getpid()}"
+
+
+def flush_metrics(collection, owner):
+    """Store this process's metrics under owner's id."""
+    try:
+        collection.update_one(
+            {"_id": owner},
+            {
+                "$set": {
+                    "updated_at": datetime.now(timezone.utc),
+                    "metrics": metrics.REGISTRY.snapshot(),
+                }
+            },
+            upsert=True,
+        )
+    except PyMongoError as e:
+        print(f"[{owner}] could not store metrics: {e}")
+
+
+def report_metrics(collection, owner, stop_event):
+    """Flush metrics every METRICS_FLUSH_INTERVAL seconds until stopped."""
+    while not stop_event.wait(METRICS_FLUSH_INTERVAL):
+        flush_metrics(collection, owner)
+
+
+def start_reporter(collection, owner):
+    """Flush from a daemon thread for as long as the process runs, for servers
+    whose processes have no shutdown hook of their own."""
+    threading.Thread(
+        target=report_metrics,
+        args=(collection, owner, threading.Event()),
+        daemon=True,
+    ).start()
+
+
+def snapshots(collection, exclude=None, stale_seconds=METRICS_STALE_SECONDS):
+    """Metric snapshots stored recently by other processes than exclude, the
+    caller's own numbers come live from its registry instead."""
+    since = datetime.now(timezone.utc) - timedelta(seconds=stale_seconds)
+    try:
+        return [
+            doc["metrics"]
+            for doc in collection.find(
+                {"updated_at": {"$gt": since}, "_id": {"$ne": exclude}}
+            )
+        ]
+    except PyMongoError as e:
+        print(f"Could not read stored metrics: {e}")
+        return []
@@ -0,0 +1,114 @@
+"""One place to get a MongoDB connection for every service.
+
+The web app and the ml client both import this instead of building their own
+MongoClient. The client is created once per process (pymongo pools connections
+internally, and a client must not be shared across a fork), configured from
+the environment, and ensure_indexes() creates the indexes our hot queries use.
+"""
+
+import os
+
+from pymongo import ASCENDING, DESCENDING, TEXT, MongoClient
+from pymongo.errors import PyMongoError
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017")
+MONGO_DBNAME = os.getenv("MONGO_DBNAME", "speech2text")
+# unfinished chunked uploads are dropped after this long
+UPLOAD_TTL_SECONDS = int(os.getenv("UPLOAD_TTL_SECONDS", str(24 * 3600)))
+
+POOL_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "60000")),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "serverSelectionTimeoutMS": int(
+        os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")
+    ),
+    "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "30000")),
+}
+
+# (collection, keys, options) for every index a request path depends on
+INDEXES = [
+    ("accounts", [("username", ASCENDING)], {"unique": True}),
+    # claims and the scheduler's per-user heads walk pending recordings by _id,
+    # recordings never had the timestamp the old (processed, timestamp) index used
+    ("recordings", [("processed", ASCENDING), ("_id", ASCENDING)], {}),
+    # the retention job looks for recordings processed before a cutoff
+    ("recordings", [("processed", ASCENDING), ("processed_at", ASCENDING)], {}),
+    ("messages", [("source_audio_id", ASCENDING)], {}),
+    # per-user history pages are _id ranges within one user
+    ("messages", [("user_id", ASCENDING), ("_id", DESCENDING)], {}),
+    # keyword search, the user_id prefix keeps a query inside one user's messages
+    (
+        "messages",
+        [("user_id", ASCENDING), ("summary", TEXT), ("transcript", TEXT)],
+        {"name": "messages_user_text", "weights": {"summary": 2, "transcript": 1}},
+    ),
+    # the semantic search index reads finished messages it hasn't embedded
+    ("messages", [("status", ASCENDING), ("search_indexed", ASCENDING)], {}),
+    # chunked uploads, resent chunks overwrite, abandoned ones expire
+    (
+        "upload_chunks",
+        [("upload_id", ASCENDING), ("index", ASCENDING)],
+        {"unique": True},
+    ),
+    (
+        "upload_chunks",
+        [("created_at", ASCENDING)],
+        {"expireAfterSeconds": UPLOAD_TTL_SECONDS},
+    ),
+    (
+        "uploads",
+        [("created_at", ASCENDING)],
+        {"expireAfterSeconds": UPLOAD_TTL_SECONDS},
+    ),
+    # per-process metric snapshots, dropped once their process is long gone
+    ("metrics", [("updated_at", ASCENDING)], {"expireAfterSeconds": 3600}),
+    ("web_metrics", [("updated_at", ASCENDING)], {"expireAfterSeconds": 3600}),
+]
+
+# recordings nobody has finished or given up on yet
+PENDING_RECORDINGS = {"processed": {"$ne": True}, "failed": {"$ne": True}}
+
+_clients = {}
+
+
+def get_client():
+    """The process-wide MongoClient, a new one is made after a fork."""
+    pid = os.getpid()
+    if pid not in _clients:
+        _clients.clear()
+        # connect=False: nothing is opened until the first query, so a gunicorn
+        # master that imports the app before forking hands its workers an
+        # unopened client instead of sockets and monitor threads
+        _clients[pid] = MongoClient(MONGO_URI, connect=False, **POOL_OPTIONS)
+    return _clients[pid]
+
+
+def get_database(name=None):
+    """The application database, MONGO_DBNAME unless a name is given."""
+    return get_client()[name or MONGO_DBNAME]
+
+
+def ensure_indexes(database=None):
+    """Create the indexes the services rely on, safe to run on every startup.
+    Returns False instead of raising if mongo can't be reached."""
+    database = database if database is not None else get_database()
+    created = True
+    for collection, keys, options in INDEXES:
+        try:
+            database[collection].create_index(keys, **options)
+        except PyMongoError as e:
+            print(f"Could not create index on {collection}: {e}")
+            created = False
+    return created
+
+
+def queue_depth(database=None):
+    """How many recordings are waiting to be processed."""
+    database = database if database is not None else get_database()
+    return database.recordings.count_documents(PENDING_RECORDINGS)
+
+
+if __name__ == "__main__":
+    print("Indexes ready." if ensure_indexes() else "Index creation failed.")
@@ -0,0 +1,85 @@
+"""Benchmark: sumy's LexRank vs the NumPy version at growing transcript lengths.
+
+Documents are built from random words with a plain space tokenizer so the
+numbers measure ranking, not NLTK. sumy's version is quadratic in Python, so
+it is skipped above --max-reference sentences.
+
+Run from web-app/:
+    python benchmarks/lexrank_scaling.py --sizes 50 500 5000
+"""
+
+# pylint: disable=import-error, wrong-import-position
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from sumy.models.dom import ObjectDocumentModel, Paragraph, Sentence
+from sumy.nlp.stemmers import Stemmer
+from sumy.summarizers.lex_rank import LexRankSummarizer
+from sumy.utils import get_stop_words
+
+from lexrank import VectorizedLexRankSummarizer
+
+
+class SpaceTokenizer:  # pylint: disable=too-few-public-methods
+    """Splits on spaces, no NLTK data needed"""
+
+    language = "english"
+
+    @staticmethod
+    def to_words(text):
+        """words of a sentence"""
+        return text.split()
+
+
+def make_document(count, vocabulary_size=3000, seed=0):
+    """count sentences of 5-20 random words"""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(vocabulary_size)]
+    tokenizer = SpaceTokenizer()
+    sentences = [
+        Sentence(
+            " ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 20))),
+            tokenizer,
+        )
+        for _ in range(count)
+    ]
+    return ObjectDocumentModel([Paragraph(sentences)])
+
+
+def time_summarizer(summarizer_class, document):
+    """seconds for one 3 sentence summary, and the sentences picked"""
+    summarizer = summarizer_class(Stemmer("english"))
+    summarizer.stop_words = get_stop_words("english")
+    start = time.perf_counter()
+    picked = [str(s) for s in summarizer(document, 3)]
+    return time.perf_counter() - start, picked
+
+
+def main():
+    """Print seconds per summary for both implementations."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--max-reference", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"{'sentences':>9} | {'sumy s':>8} | {'numpy s':>8} | same picks")
+    for size in args.sizes:
+        document = make_document(size)
+        fast, fast_picks = time_summarizer(VectorizedLexRankSummarizer, document)
+        if size <= args.max_reference:
+            slow, slow_picks = time_summarizer(LexRankSummarizer, document)
+            print(
+                f"{size:>9} | {slow:>8.3f} | {fast:>8.3f} | {slow_picks == fast_picks}"
+            )
+        else:
+            print(f"{size:>9} | {'skipped':>8} | {fast:>8.3f} | -")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark: per-call overhead of summarize_text before and after caching.
+
+"rebuild" constructs the tokenizer, stemmer, LexRank summarizer and stop words
+on every call like summarize_text used to, "cached" is summarize_text now and
+"many" is summarize_many over the whole batch.
+
+Run from web-app/:
+    python benchmarks/summarize_overhead.py --texts 200
+"""
+
+# pylint: disable=import-error, wrong-import-position
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+from sumy.nlp.stemmers import Stemmer
+from sumy.nlp.tokenizers import Tokenizer
+from sumy.parsers.plaintext import PlaintextParser
+from sumy.summarizers.lex_rank import LexRankSummarizer
+from sumy.utils import get_stop_words
+
+import summarize_function
+
+SENTENCES = [
+    "I went to the store this morning to pick up groceries for the week.",
+    "The meeting was moved to Thursday because half the team is travelling.",
+    "We need to finish the report before the deadline on Friday afternoon.",
+    "My brother called to say the flight landed an hour late.",
+    "The new library downtown has a great reading room on the top floor.",
+]
+
+
+def rebuild_every_call(text):
+    """What summarize_text did before: build everything, then summarize."""
+    parser = PlaintextParser.from_string(text, Tokenizer("english"))
+    summarizer = LexRankSummarizer(Stemmer("english"))
+    summarizer.stop_words = get_stop_words("english")
+    return " ".join(str(s) for s in summarizer(parser.document, 1))
+
+
+def per_call_ms(func, texts):
+    """Average milliseconds per text."""
+    start = time.perf_counter()
+    func(texts)
+    return (time.perf_counter() - start) * 1000 / len(texts)
+
+
+def main():
+    """Print average milliseconds per summary for each variant."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=200)
+    args = parser.parse_args()
+
+    texts = [
+        " ".join(SENTENCES[(i + j) % len(SENTENCES)] for j in range(3))
+        for i in range(args.texts)
+    ]
+    summarize_function.summarize_text(texts[0], "english", 1)  # warm the cache
+
+    results = {
+        "rebuild": per_call_ms(lambda ts: [rebuild_every_call(t) for t in ts], texts),
+        "cached": per_call_ms(
+            lambda ts: [summarize_function.summarize_text(t, "english", 1) for t in ts],
+            texts,
+        ),
+        "many": per_call_ms(
+            lambda ts: summarize_function.summarize_many(ts, "english", 1), texts
+        ),
+    }
+    print(f"{'variant':>8} | {'ms/summary':>10}")
+    for name, ms in results.items():
+        print(f"{name:>8} | {ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
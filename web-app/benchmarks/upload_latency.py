@@ -0,0 +1,112 @@
+"""Benchmark: /upload latency as the recordings history grows.
+
+Compares the old allocator (load every recording, parse filenames) with the
+counter document, at several history sizes. Runs against MONGO_URI, or an
+in-memory mongomock database with --mongomock (pip install mongomock).
+
+Run from web-app/:
+    python benchmarks/upload_latency.py --mongomock --sizes 0 1000 10000
+"""
+
+# pylint: disable=import-error, wrong-import-position
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+from unittest.mock import patch
+
+from bson.objectid import ObjectId
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../src")))
+
+import app as app_module
+
+# roughly a few seconds of opus, the legacy scan pulled this in for every recording
+FAKE_AUDIO = b"\0" * 4096
+
+
+class NullGridFS:  # pylint: disable=too-few-public-methods
+    """Drains the upload stream instead of storing it, gridfs isn't what we measure."""
+
+    def upload_from_stream(self, _filename, source, **_):
+        """read the stream and hand back a fresh id"""
+        while source.read(255 * 1024):
+            pass
+        return ObjectId()
+
+
+def legacy_next_file_number():
+    """The allocator this benchmark replaces: every recording, blob included."""
+    recordings = list(app_module.db.recordings.find({}))
+    numbers = []
+    for recording in recordings:
+        try:
+            numbers.append(int(recording["filename"].split("_")[1].split(".")[0]))
+        except (IndexError, ValueError):
+            continue
+    return max(numbers) + 1 if numbers else 1
+
+
+def fill_history(database, size):
+    """Reset the collections and insert size old recordings with inline blobs."""
+    database.recordings.drop()
+    database.counters.drop()
+    batch = [
+        {"filename": f"recording_{i}.webm", "audioData": FAKE_AUDIO}
+        for i in range(1, size + 1)
+    ]
+    for i in range(0, len(batch), 1000):
+        database.recordings.insert_many(batch[i : i + 1000])
+
+
+def time_uploads(test_client, uploads):
+    """Median /upload latency in milliseconds over a number of uploads."""
+    samples = []
+    for _ in range(uploads):
+        start = time.perf_counter()
+        test_client.post(
+            "/upload",
+            data={"audio": (BytesIO(b"audio"), "recording.webm")},
+            content_type="multipart/form-data",
+        )
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    """Print median upload latency per history size for both allocators."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000, 10000])
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--mongomock", action="store_true")
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock  # pylint: disable=import-outside-toplevel
+
+        database = mongomock.MongoClient()["speech2text_bench"]
+    else:
+        database = app_module.db.connection["speech2text_bench"]
+
+    app_module.app.config["TESTING"] = True
+    # the history counts as queued recordings, backpressure would 429 the uploads
+    with patch("app.queue_depth", return_value=0), patch.object(
+        app_module.db, "recordings", database.recordings
+    ), patch.object(app_module.db, "counters", database.counters), patch.object(
+        app_module.db, "audio_fs", NullGridFS()
+    ), app_module.app.test_client() as test_client:
+        print(f"{'history':>8} | {'legacy scan ms':>14} | {'counter ms':>10}")
+        for size in args.sizes:
+            fill_history(database, size)
+            with patch("app.get_next_file_number", legacy_next_file_number):
+                legacy = time_uploads(test_client, args.uploads)
+            fill_history(database, size)
+            counter = time_uploads(test_client, args.uploads)
+            print(f"{size:>8} | {legacy:>14.2f} | {counter:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
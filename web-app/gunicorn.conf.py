@@ -0,0 +1,43 @@
+"""Production server settings for the web app, read by `gunicorn` from web-app/.
+
+Threaded workers (gthread) so long-polls and event streams on /jobs don't tie
+up a whole process. The app is imported once in the master before forking
+(preload), so the LexRank summarizer and the session key are shared by every
+worker. On SIGTERM workers stop accepting requests and get GRACEFUL_TIMEOUT
+seconds to finish the ones in flight. Every worker stores its metrics in
+mongo, so the /metrics of whichever worker answers adds up all of them.
+
+    gunicorn            # picks this file up from the working directory
+"""
+
+# pylint: disable=invalid-name, import-outside-toplevel
+
+import multiprocessing
+import os
+
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+wsgi_app = "app:app"
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+
+workers = int(os.getenv("WEB_WORKERS", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+preload_app = True
+
+# a long-poll may legitimately wait JOB_WAIT_MAX (25s) for a result
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+accesslog = "-"
+
+
+def post_worker_init(_worker):
+    """Create indexes and start reporting metrics from the worker, the master
+    never touches mongo so forked workers don't inherit an open client."""
+    import app
+
+    app.db.setup()
+    app.metrics_store.start_reporter(
+        app.db.db.web_metrics, app.metrics_store.process_id("web")
+    )
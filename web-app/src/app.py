@@ -2,34 +2,87 @@
 
 import os
 import sys
+import json
+import math
 import time
 
-
 # import glob
 
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import (
+    Flask,
+    Response,
+    render_template,
+    request,
+    redirect,
+    url_for,
+    session,
+    jsonify,
+)
 
-from werkzeug.security import generate_password_hash, check_password_hash
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 sys.path.append(
     os.path.abspath(
         os.path.join(os.path.dirname(__file__), "../../machine-learning-client")
     )
 )
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../../shared"))
+)
 
 # pylint: disable=import-error, wrong-import-position
 # from client import process_audio
 
-from pymongo import MongoClient
+import metrics
+import metrics_store
+from mongo import queue_depth
 
 import db
-
+from passwords import HashPoolBusy, hash_password, verify_password
+import uploads
+import search
 from summarize_function import summarize_text_access
 
-
 app = Flask(__name__)
-app.secret_key = os.urandom(12)
+# set SECRET_KEY when running several server processes so they accept each
+# other's session cookies (a preloaded gunicorn master shares the random one)
+app.secret_key = os.getenv("SECRET_KEY") or os.urandom(12)
+
+# how long a single long-poll / event-stream request may wait for a result
+JOB_WAIT_MAX = float(os.getenv("JOB_WAIT_MAX", "25"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+# opus bitrate the recorder asks for, 32kbps is plenty for speech
+AUDIO_BITRATE = int(os.getenv("AUDIO_BITRATE", "32000"))
+# how often the recorder hands a chunk to the upload while recording
+UPLOAD_CHUNK_MS = int(os.getenv("UPLOAD_CHUNK_MS", "1000"))
+# transcripts per page of a user's history
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+# default number of /search results
+SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", "10"))
+# new uploads get a 429 while this many recordings wait, 0 turns it off
+MAX_QUEUE_DEPTH = int(os.getenv("UPLOAD_MAX_QUEUE_DEPTH", "200"))
+# recordings per second the workers get through, for the Retry-After hint
+QUEUE_DRAIN_RATE = float(os.getenv("UPLOAD_QUEUE_DRAIN_RATE", "2"))
+# seconds a counted queue depth is reused, so uploads don't each count it
+QUEUE_DEPTH_TTL = 1.0
+
+UPLOAD_BYTES = metrics.histogram(
+    "web_upload_bytes", "Size of uploaded recordings", metrics.SIZE_BUCKETS
+)
+STAGE_SECONDS = metrics.histogram(
+    "web_stage_seconds", "Time spent per upload stage (gridfs_write, mongo_write)"
+)
+UPLOADS_REJECTED = metrics.counter(
+    "web_uploads_rejected_total", "Uploads turned away because the queue was full"
+)
+metrics.gauge(
+    "recordings_queue_depth", "Recordings waiting to be processed"
+).set_function(lambda: queue_depth(db.db))
+
+_queue_depth = {"value": 0, "at": -math.inf}
 
 
 @app.route("/")
@@ -38,6 +91,15 @@ def home():
     return render_template("index.html")
 
 
+def busy_page():
+    """too many logins/signups are hashing passwords right now, ask to retry"""
+    return (
+        render_template("index.html", message="Server busy, please try again"),
+        503,
+        {"Retry-After": "1"},
+    )
+
+
 @app.route("/signup", methods=["GET", "POST"])
 def signup():
     """Signup Route"""
@@ -46,17 +108,23 @@ def signup():
         password = request.form.get("password")
         if not (username and password):
             return render_template("index.html", message="All fields are required")
+        taken = "Account with this username already created."
         if db.accounts.find_one({"username": username}):
-            return render_template(
-                "index.html", message="Account with this username already created."
-            )
-        hashed_password = generate_password_hash(password)
+            return render_template("index.html", message=taken)
+        try:
+            hashed_password = hash_password(password)
+        except HashPoolBusy:
+            return busy_page()
         new_user = {
             "_id": ObjectId(),
             "username": username,
             "password": hashed_password,
         }
-        db.accounts.insert_one(new_user)
+        try:
+            db.accounts.insert_one(new_user)
+        except DuplicateKeyError:
+            # a concurrent signup took the name since the check above
+            return render_template("index.html", message=taken)
         return redirect(url_for("login"))
     return render_template("register.html")
 
@@ -70,26 +138,121 @@ def login():
 
         user = db.accounts.find_one({"username": username})
 
-        if user and check_password_hash(user["password"], password):
+        try:
+            valid = user is not None and verify_password(user["password"], password)
+        except HashPoolBusy:
+            return busy_page()
+        if valid:
             session["user_id"] = str(user["_id"])
+            # usernames never change, so the signed cookie can carry it for /profile
+            session["username"] = user["username"]
             return redirect(url_for("profile"))
 
         return render_template("index.html", message="Invalid username or password")
     return render_template("login.html")
 
 
+def session_user_id():
+    """the logged in user's id, None for anonymous visitors"""
+    user_id = session.get("user_id")
+    return ObjectId(user_id) if user_id else None
+
+
+def user_history(user_id, before=None, limit=None):
+    """one page of a user's transcripts, newest first, and the id to pass as
+    ?before= for the next page (None on the last one). pages are _id ranges on
+    the (user_id, _id) index rather than skip/limit, so deep pages cost the same"""
+    limit = limit or HISTORY_PAGE_SIZE
+    # recordings still being transcribed (or whose processing failed) only have
+    # a partials document, finished results and older ones without a status count
+    query = {"user_id": user_id, "status": {"$ne": "transcribing"}}
+    if before is not None:
+        query["_id"] = {"$lt": before}
+    docs = list(
+        db.messages.find(
+            query,
+            {"transcript": 1, "summary": 1, "timestamp": 1, "source_audio_id": 1},
+            sort=[("_id", -1)],
+            limit=limit + 1,
+        )
+    )
+    next_before = str(docs[limit - 1]["_id"]) if len(docs) > limit else None
+    return docs[:limit], next_before
+
+
+def history_cursor():
+    """the ?before= page cursor, ignored if it isn't an ObjectId"""
+    before = request.args.get("before", "")
+    return ObjectId(before) if ObjectId.is_valid(before) else None
+
+
 @app.route("/profile")
 def profile():
-    """Profile Route"""
+    """Profile Route, with the user's transcripts page by page"""
     if "user_id" in session:
         user_id = ObjectId(session["user_id"])
-        user = db.accounts.find_one({"_id": user_id})
-        username = user["username"]
-        return render_template("profile.html", username=username)
+        username = session.get("username")
+        if username is None:
+            # sessions from before the username was stored in the cookie
+            username = db.accounts.find_one({"_id": user_id})["username"]
+            session["username"] = username
+        history, next_before = user_history(user_id, history_cursor())
+        return render_template(
+            "profile.html",
+            username=username,
+            history=history,
+            next_before=next_before,
+        )
 
     return redirect(url_for("login"))
 
 
+@app.route("/profile/history")
+def profile_history():
+    """the same history as json for clients that page through it themselves"""
+    user_id = session_user_id()
+    if user_id is None:
+        return jsonify({"error": "not logged in"}), 401
+    history, next_before = user_history(user_id, history_cursor())
+    return jsonify(
+        {"items": [message_item(doc) for doc in history], "next_before": next_before}
+    )
+
+
+def message_item(doc):
+    """the json shape of one transcript in history and search results"""
+    item = {
+        "job_id": str(doc["source_audio_id"]),
+        "Transcript": doc.get("transcript", ""),
+        "Summary": doc.get("summary", ""),
+        "timestamp": doc["timestamp"].isoformat() if doc.get("timestamp") else None,
+    }
+    if "score" in doc:
+        item["score"] = doc["score"]
+    return item
+
+
+@app.route("/search")
+def search_messages():
+    """search the user's transcripts, ?q=words&mode=text|semantic&k=10"""
+    user_id = session_user_id()
+    if user_id is None:
+        return jsonify({"error": "not logged in"}), 401
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    limit = min(max(request.args.get("k", SEARCH_RESULTS, type=int), 1), 50)
+
+    # semantic only when the embedding index is turned on, keywords otherwise
+    mode = request.args.get("mode", "text")
+    if mode == "semantic" and search.embedding_index() is not None:
+        results = search.semantic_search(user_id, query, limit)
+    else:
+        mode = "text"
+        results = search.text_search(user_id, query, limit)
+    return jsonify({"mode": mode, "items": [message_item(doc) for doc in results]})
+
+
 @app.route("/logout")
 def logout():
     """Logout Route"""
@@ -103,86 +266,376 @@ def logout():
 
 
 # look for the next file, file numbers are sequential
-def get_next_file_number():
-    """this gets the next file number, the recording number should always be one greater"""
-    # Find all recordings in the database
-    recordings = list(db.recordings.find({}))
+RECORDING_COUNTER_ID = "recording_number"
 
-    # If no recordings
-    if not recordings:
-        return 1
 
-    numbers = []
-    for recording in recordings:
+def highest_recording_number():
+    """scans recording filenames for the highest number, only used once to seed the
+    counter on a database that has recordings from before the counter existed"""
+    numbers = [0]
+    for recording in db.recordings.find({}, {"filename": 1, "_id": 0}):
         try:
             filename = recording["filename"]
             num_str = filename.split("_")[1].split(".")[0]
             numbers.append(int(num_str))
-        except (IndexError, ValueError):
+        except (IndexError, KeyError, ValueError):
             continue
+    return max(numbers)
 
-    return max(numbers) + 1 if numbers else 1
+
+def get_next_file_number():
+    """this gets the next file number, the recording number should always be one greater
+    uses an atomic $inc on a counter document so it costs the same at any history size
+    """
+    counter = db.counters.find_one_and_update(
+        {"_id": RECORDING_COUNTER_ID},
+        {"$inc": {"seq": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if counter is None:
+        # first upload since the counter was introduced, start above existing files
+        # $max keeps this safe if two uploads seed at the same time
+        db.counters.update_one(
+            {"_id": RECORDING_COUNTER_ID},
+            {"$max": {"seq": highest_recording_number()}},
+            upsert=True,
+        )
+        counter = db.counters.find_one_and_update(
+            {"_id": RECORDING_COUNTER_ID},
+            {"$inc": {"seq": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+    return counter["seq"]
 
 
 # main page for recording
 @app.route("/record")
 def index():
-    """flask render the main page"""
-    return render_template("record.html")
+    """flask render the main page, the recorder streams opus at AUDIO_BITRATE
+    in UPLOAD_CHUNK_MS slices to /uploads while recording"""
+    return render_template(
+        "record.html", audio_bitrate=AUDIO_BITRATE, chunk_ms=UPLOAD_CHUNK_MS
+    )
 
 
-# uploads to the mongodb in the database speech2text in recordings as a blob binary
-@app.route("/upload", methods=["POST"])
-def upload_audio():
-    """see if the file is in the request and store it in the database speech2text,
-    in recordings as a blob"""
-    if "audio" not in request.files:
-        return jsonify({"success": False})
+class CountingStream:  # pylint: disable=too-few-public-methods
+    """wraps an upload stream to count the bytes gridfs reads from it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_read = 0
 
-    audio_file = request.files["audio"]
+    def read(self, size=-1):
+        """read from the wrapped stream"""
+        data = self.stream.read(size)
+        self.bytes_read += len(data)
+        return data
 
+
+def store_recording(audio_stream, user_id=None):
+    """stream the audio into gridfs chunk by chunk, then add a recordings document
+    pointing at it, returns (filename, job_id), the recording id doubles as the job id
+    """
     next_number = get_next_file_number()
 
     filename = f"recording_{next_number}.webm"
 
-    # Reads the binary data from the file which is recorded in webm format
-    audio_data = audio_file.read()
-
-    # Create a new record in the recordings collection
-    # now not about file it is about db
-    db.recordings.insert_one({"filename": filename, "audioData": audio_data})
+    # upload_from_stream reads one gridfs chunk at a time, so the whole recording
+    # is never held in memory and isn't limited by the 16MB document size
+    audio_stream = CountingStream(audio_stream)
+    with STAGE_SECONDS.time(stage="gridfs_write"):
+        file_id = db.audio_fs.upload_from_stream(
+            filename, audio_stream, metadata={"contentType": "audio/webm"}
+        )
+    UPLOAD_BYTES.observe(audio_stream.bytes_read)
+
+    # Create a new record in the recordings collection, owned by the uploader
+    # so the ml client can tag the transcript with the same user
+    # the size lets the ml client's scheduler estimate the recording's length
+    recording = {
+        "filename": filename,
+        "audioFileId": file_id,
+        "size_bytes": audio_stream.bytes_read,
+    }
+    if user_id is not None:
+        recording["user_id"] = user_id
+    with STAGE_SECONDS.time(stage="mongo_write"):
+        result = db.recordings.insert_one(recording)
+
+    # no need to call the ml client, its workers watch recordings for inserts
+    return filename, str(result.inserted_id)
+
+
+def queue_full():
+    """seconds to ask a new upload to wait while the queue is over
+    MAX_QUEUE_DEPTH, about how long the workers need to get back under it,
+    None when there is room"""
+    if MAX_QUEUE_DEPTH <= 0:
+        return None
+    now = time.monotonic()
+    if now - _queue_depth["at"] > QUEUE_DEPTH_TTL:
+        _queue_depth.update(value=queue_depth(db.db), at=now)
+    excess = _queue_depth["value"] - MAX_QUEUE_DEPTH
+    if excess < 0:
+        return None
+    return min(60, max(1, math.ceil((excess + 1) / QUEUE_DRAIN_RATE)))
+
+
+def queue_full_response(retry_after):
+    """429 for an upload that came while the queue was full"""
+    UPLOADS_REJECTED.inc()
+    return (
+        jsonify(
+            {
+                "success": False,
+                "error": "processing queue is full",
+                "retry_after": retry_after,
+            }
+        ),
+        429,
+        {"Retry-After": str(retry_after)},
+    )
 
-    # audop data is a binary
-    return jsonify({"success": True, "filename": filename})
 
+# uploads the audio into gridfs in the database speech2text, recordings points at it
+@app.route("/upload", methods=["POST"])
+def upload_audio():
+    """upload a whole recording in one request, as a multipart 'audio' field
+    or a raw audio/* request body"""
+    retry_after = queue_full()
+    if retry_after is not None:
+        return queue_full_response(retry_after)
+    if "audio" in request.files:
+        audio_stream = request.files["audio"].stream
+    elif request.mimetype.startswith("audio/"):
+        audio_stream = request.stream
+    else:
+        return jsonify({"success": False})
 
-@app.route("/result")
-def get_result():
-    """get resulting transcript and summary and return to front end"""
+    filename, job_id = store_recording(audio_stream, session_user_id())
+    return jsonify({"success": True, "filename": filename, "job_id": job_id})
+
+
+@app.errorhandler(uploads.UploadError)
+def upload_error(error):
+    """answer a chunked upload problem with its status and details as json"""
+    body = {"success": False, "error": str(error), **error.details}
+    return jsonify(body), error.status
+
+
+def find_upload(upload_id):
+    """the session user's upload, UploadError 404 for bad or foreign ids"""
+    if not ObjectId.is_valid(upload_id):
+        raise uploads.UploadError("no such upload", 404)
+    return uploads.find(ObjectId(upload_id), session_user_id())
+
+
+@app.route("/uploads", methods=["POST"])
+def start_upload():
+    """begin a resumable upload, chunks go to /uploads/<id>/chunks/<index>.
+    only starting one is refused while the queue is full, an upload that has
+    begun can always finish"""
+    retry_after = queue_full()
+    if retry_after is not None:
+        return queue_full_response(retry_after)
+    upload_id = uploads.create(session_user_id())
+    return (
+        jsonify(
+            {
+                "success": True,
+                "upload_id": str(upload_id),
+                "max_chunk_bytes": uploads.MAX_CHUNK_BYTES,
+            }
+        ),
+        201,
+    )
 
-    max_retries = 3
-    retry_count = 0
 
-    while retry_count < max_retries:
-        time.sleep(10)
-        try:
-            response = request.post("http://ml-client:5001/process_audio")
-            if not response.ok:
-                break
-            retry_count += 1
-            time.sleep(2)
+@app.route("/uploads/<upload_id>/chunks/<int:chunk_index>", methods=["PUT"])
+def upload_chunk(upload_id, chunk_index):
+    """store one chunk, safe to retry"""
+    upload = find_upload(upload_id)
+    if (request.content_length or 0) > uploads.MAX_CHUNK_BYTES:
+        raise uploads.UploadError(
+            "chunk too large", 413, max_chunk_bytes=uploads.MAX_CHUNK_BYTES
+        )
+    # a chunked request has no content length, never read more than one byte
+    # past the limit, put_chunk() refuses it then
+    data = request.stream.read(uploads.MAX_CHUNK_BYTES + 1)
+    uploads.put_chunk(upload, chunk_index, data)
+    return jsonify({"success": True, "index": chunk_index})
+
+
+@app.route("/uploads/<upload_id>")
+def upload_status(upload_id):
+    """which chunks arrived, a client resuming after a dropped connection resends
+    everything else"""
+    upload = find_upload(upload_id)
+    return jsonify(
+        {
+            "upload_id": upload_id,
+            "state": upload["state"],
+            "chunks": uploads.received(upload["_id"]),
+            "job_id": upload.get("job_id"),
+        }
+    )
 
-        except request.exceptions.RequestException:
-            retry_count += 1
-            time.sleep(2)
 
-    # retrieve result not changed
+@app.route("/uploads/<upload_id>/complete", methods=["POST"])
+def complete_upload(upload_id):
+    """assemble the chunks into a recording and queue it, body {"chunks": count}
+    409 lists the missing chunk indexes, retrying after success returns the same job"""
+    upload = find_upload(upload_id)
+    payload = request.get_json(silent=True) or {}
+    chunk_count = payload.get("chunks")
+    if not isinstance(chunk_count, int) or chunk_count < 1:
+        raise uploads.UploadError("chunks must be a positive count", 400)
+
+    filename, job_id = uploads.complete(
+        upload,
+        chunk_count,
+        lambda stream: store_recording(stream, upload.get("user_id")),
+    )
+    return jsonify({"success": True, "filename": filename, "job_id": job_id})
+
+
+def find_job_result(job_id, user_id=None):
+    """return the messages document for a recording, None if nothing is written yet
+    while transcribing it only holds the finished segments under 'partials'
+    another user's result counts as not written, anonymous uploads are readable by id
+    a recording the ml client gave up on comes back with status 'failed'"""
+    doc = db.messages.find_one({"source_audio_id": ObjectId(job_id)})
+    if doc is not None and doc.get("user_id") not in (None, user_id):
+        return None
+    if not job_done(doc):
+        recording = db.recordings.find_one(
+            {"_id": ObjectId(job_id), "failed": True}, {"user_id": 1, "error": 1}
+        )
+        if recording is not None and recording.get("user_id") in (None, user_id):
+            return {
+                **(doc or {}),
+                "status": "failed",
+                "error": recording.get("error", "the recording could not be processed"),
+            }
+    return doc
+
+
+def job_done(doc):
+    """a result counts as done once the ml client marked it so, older ones have no status"""
+    return doc is not None and doc.get("status", "done") == "done"
+
+
+def job_finished(doc):
+    """nothing more is coming for a job that is done or failed"""
+    return job_done(doc) or (doc is not None and doc.get("status") == "failed")
+
+
+def partial_transcript(doc):
+    """the segments transcribed so far, in recording order"""
+    partials = doc.get("partials", {})
+    return " ".join(partials[key] for key in sorted(partials, key=int) if partials[key])
+
+
+def job_payload(job_id, doc):
+    """shape a job status response, same keys as /result plus the job status"""
+    if job_done(doc):
+        return {
+            "job_id": job_id,
+            "status": "done",
+            "Transcript": doc.get("transcript", ""),
+            "Summary": doc.get("summary", ""),
+        }
+    if doc is None:
+        return {"job_id": job_id, "status": "pending", "Transcript": "", "Summary": ""}
+    if doc["status"] == "failed":
+        return {
+            "job_id": job_id,
+            "status": "failed",
+            "error": doc["error"],
+            "Transcript": partial_transcript(doc),
+            "Summary": "",
+        }
+    return {
+        "job_id": job_id,
+        "status": "transcribing",
+        "Transcript": partial_transcript(doc),
+        "Summary": "",
+        "segments_done": len(doc.get("partials", {})),
+        "segments": doc.get("segments", 0),
+    }
+
+
+def wait_for_job(job_id, timeout, user_id=None):
+    """poll mongo until the job is done or failed, or the timeout runs out"""
+    deadline = time.monotonic() + min(timeout, JOB_WAIT_MAX)
+    doc = find_job_result(job_id, user_id)
+    while not job_finished(doc) and time.monotonic() < deadline:
+        time.sleep(JOB_POLL_INTERVAL)
+        doc = find_job_result(job_id, user_id)
+    return doc
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    """job status, pass ?wait=<seconds> to long-poll until the result is ready"""
+    try:
+        wait = float(request.args.get("wait", 0))
+        user_id = session_user_id()
+        doc = (
+            wait_for_job(job_id, wait, user_id)
+            if wait > 0
+            else find_job_result(job_id, user_id)
+        )
+    except (InvalidId, ValueError):
+        return jsonify({"error": "invalid job id"}), 404
+
+    return jsonify(job_payload(job_id, doc))
+
+
+@app.route("/jobs/<job_id>/events")
+def job_events(job_id):
+    """server-sent events version of the job status, sends a 'progress' event
+    whenever another segment is transcribed and one 'done' or 'failed' event at
+    the end"""
+    if not ObjectId.is_valid(job_id):
+        return jsonify({"error": "invalid job id"}), 404
+    # the generator runs after the request context is gone
+    user_id = session_user_id()
+
+    def stream():
+        deadline = time.monotonic() + JOB_WAIT_MAX
+        sent = None
+        while time.monotonic() < deadline:
+            doc = find_job_result(job_id, user_id)
+            payload = job_payload(job_id, doc)
+            if job_finished(doc):
+                yield f"event: {payload['status']}\ndata: {json.dumps(payload)}\n\n"
+                return
+            if doc is not None and payload != sent:
+                yield f"event: progress\ndata: {json.dumps(payload)}\n\n"
+                sent = payload
+            else:
+                # comment line keeps proxies from closing the idle connection
+                yield ": pending\n\n"
+            time.sleep(JOB_POLL_INTERVAL)
+        yield "event: timeout\ndata: {}\n\n"
+
+    return Response(stream(), mimetype="text/event-stream")
 
-    client = MongoClient("mongodb://mongodb:27017")
-    speech_db = client["speech2text"]
-    messages_collection = speech_db["messages"]
 
-    latest_doc = messages_collection.find_one(sort=[("_id", -1)])
+@app.route("/result")
+def get_result():
+    """get resulting transcript and summary and return to front end,
+    pass ?job_id=<id> for a specific recording, this no longer waits on the ml client
+    without one it's the logged in user's latest, never someone else's"""
+    job_id = request.args.get("job_id")
+    user_id = session_user_id()
+    if job_id and ObjectId.is_valid(job_id):
+        latest_doc = find_job_result(job_id, user_id)
+    elif user_id is not None:
+        latest_doc = db.messages.find_one({"user_id": user_id}, sort=[("_id", -1)])
+    else:
+        latest_doc = None
 
     transcript = latest_doc.get("transcript", "") if latest_doc else ""
     summary = latest_doc.get("summary", "") if latest_doc else ""
@@ -190,6 +643,16 @@ def get_result():
     return jsonify({"Transcript": transcript, "Summary": summary})
 
 
+@app.route("/metrics")
+def metrics_endpoint():
+    """prometheus scrape endpoint: upload sizes, stage latencies and queue depth,
+    added up over every server process that reported recently"""
+    others = metrics_store.snapshots(
+        db.db.web_metrics, exclude=metrics_store.process_id("web")
+    )
+    return Response(metrics.render(others), content_type=metrics.CONTENT_TYPE)
+
+
 def summarized_text(sometext):
     """summarized text access funciton"""
     return summarize_text_access(sometext)
@@ -197,4 +660,5 @@ def summarized_text(sometext):
 
 if __name__ == "__main__":
     PORT = os.getenv("PORT")
+    db.setup()
     app.run(host="0.0.0.0", port=3000)
@@ -1,18 +1,23 @@
 """Configuring Database"""
 
 import os
-from pymongo import MongoClient
+import sys
+from gridfs import GridFSBucket
 from dotenv import load_dotenv
 
 # import certifi
 
 load_dotenv()
 
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DBNAME = str(os.getenv("MONGO_DBNAME"))
+sys.path.append(
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "../../shared"))
+)
 
-connection = MongoClient("mongodb://mongodb:27017")
-db = connection[MONGO_DBNAME]
+# pylint: disable=import-error, wrong-import-position
+from mongo import get_client, get_database, ensure_indexes
+
+connection = get_client()
+db = get_database()
 
 acc_validator = {
     "$jsonSchema": {
@@ -39,10 +44,11 @@ mess_validator = {
 rec_validator = {
     "$jsonSchema": {
         "bsonType": "object",
-        "required": ["filename", "audioData"],
+        "required": ["filename", "audioFileId"],
         "properties": {
             "filename": {"bsonType": "string"},
-            "audioData": {"bsonType": "binData"},
+            "audioFileId": {"bsonType": "objectId"},
+            "user_id": {"bsonType": "objectId"},
         },
     }
 }
@@ -51,6 +57,19 @@ rec_validator = {
 accounts = db.accounts
 messages = db.messages
 recordings = db.recordings
+counters = db.counters
+uploads = db.uploads
+upload_chunks = db.upload_chunks
+
+# audio bytes live in GridFS (audio.files / audio.chunks), recordings only point at them
+AUDIO_CHUNK_SIZE = int(os.getenv("AUDIO_CHUNK_SIZE", str(255 * 1024)))
+audio_fs = GridFSBucket(db, bucket_name="audio", chunk_size_bytes=AUDIO_CHUNK_SIZE)
+
+
+def setup():
+    """create the indexes the web app's queries need, call once at startup"""
+    return ensure_indexes(db)
+
 
 # db.command('collMod', 'accounts', validator=acc_validator)
 # db.command('collMod', 'messages', validator=mess_validator)
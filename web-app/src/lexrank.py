@@ -0,0 +1,90 @@
+"""LexRank with the similarity graph built by NumPy instead of Python loops
+
+sumy's LexRankSummarizer compares every pair of sentences in Python, which is
+quadratic in interpreted code and gets slow on long transcripts. This keeps
+sumy's algorithm (same tf, idf, threshold, power method and tie breaking) but
+builds a TF-IDF matrix once and gets all cosine similarities from a matrix
+product, a block of rows at a time so memory stays bounded.
+"""
+
+# pylint: disable=import-error
+
+import numpy as np
+from sumy.summarizers.lex_rank import LexRankSummarizer
+
+# rows of the similarity matrix computed per matrix product
+BLOCK_ROWS = 1024
+
+
+class VectorizedLexRankSummarizer(LexRankSummarizer):
+    """Drop-in replacement for sumy's LexRankSummarizer, same rankings"""
+
+    def __call__(self, document, sentences_count):
+        sentences_words = [self._to_words_set(s) for s in document.sentences]
+        if not sentences_words:
+            return ()
+
+        weights = self.tfidf_matrix(sentences_words)
+        adjacency, degrees = self.similarity_graph(weights, self.threshold)
+        scores = self.rank(adjacency, degrees, self.epsilon)
+        ratings = dict(zip(document.sentences, scores))
+
+        return self._get_best_sentences(document.sentences, sentences_count, ratings)
+
+    @staticmethod
+    def tfidf_matrix(sentences_words):
+        """sentences x vocabulary matrix of tf * idf, tf scaled by each row's max"""
+        vocabulary = {}
+        rows, cols = [], []
+        for row, words in enumerate(sentences_words):
+            for word in words:
+                rows.append(row)
+                cols.append(vocabulary.setdefault(word, len(vocabulary)))
+
+        counts = np.zeros((len(sentences_words), len(vocabulary)))
+        np.add.at(counts, (rows, cols), 1)
+
+        row_max = np.max(counts, axis=1, initial=0)
+        row_max[row_max == 0] = 1
+        term_frequency = counts / row_max[:, None]
+
+        document_frequency = np.count_nonzero(counts, axis=0)
+        idf = np.log(len(sentences_words) / (1 + document_frequency))
+        return term_frequency * idf
+
+    @staticmethod
+    def similarity_graph(weights, threshold):
+        """0/1 adjacency of sentence pairs whose cosine similarity is over threshold,
+        and each row's degree (at least 1, as in sumy)"""
+        count = len(weights)
+        norms = np.linalg.norm(weights, axis=1)
+        # a sentence with no weighted words is similar to nothing, itself included
+        safe_norms = np.where(norms > 0, norms, 1.0)
+        unit = weights / safe_norms[:, None]
+
+        adjacency = np.zeros((count, count))
+        for start in range(0, count, BLOCK_ROWS):
+            block = unit[start : start + BLOCK_ROWS] @ unit.T
+            adjacency[start : start + BLOCK_ROWS] = block > threshold
+        adjacency[norms == 0] = 0
+        adjacency[:, norms == 0] = 0
+
+        degrees = adjacency.sum(axis=1)
+        degrees[degrees == 0] = 1
+        return adjacency, degrees
+
+    @staticmethod
+    def rank(adjacency, degrees, epsilon):
+        """sumy's power method on adjacency / degrees without building that matrix:
+        (A / d[:, None]).T @ p is the same as A.T @ (p / d)"""
+        count = len(adjacency)
+        p_vector = np.full(count, 1.0 / count)
+        lambda_val = 1.0
+
+        while lambda_val > epsilon:
+            next_p = adjacency.T @ (p_vector / degrees)
+            next_p /= np.linalg.norm(next_p)
+            lambda_val = np.linalg.norm(next_p - p_vector)
+            p_vector = next_p
+
+        return p_vector
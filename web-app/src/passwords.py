@@ -0,0 +1,70 @@
+"""Password hashing on a small bounded thread pool
+
+Hashing is deliberately slow (scrypt by default) so a burst of logins used to
+pin every request thread. Now at most PASSWORD_HASH_THREADS hashes run at
+once (OpenSSL's scrypt/pbkdf2 release the GIL, so they really run in
+parallel) and at most PASSWORD_HASH_QUEUE more wait for a thread; past that
+hash_password/verify_password raise HashPoolBusy straight away instead of
+parking yet another request thread.
+
+Every running or waiting hash holds a request thread, so the queue is sized
+from WEB_THREADS (gunicorn.conf.py): by default hashes hold at most half of
+a worker's request threads, and never all of them.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# werkzeug method string, "scrypt:<n>:<r>:<p>" or "pbkdf2:sha256:<iterations>",
+# existing hashes keep verifying whatever this is set to
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+HASH_THREADS = int(os.getenv("PASSWORD_HASH_THREADS", "2"))
+# request threads per server process, same default as gunicorn.conf.py
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+HASH_QUEUE = int(
+    os.getenv("PASSWORD_HASH_QUEUE", str(max(0, WEB_THREADS // 2 - HASH_THREADS)))
+)
+# hashes running or waiting at once, one request thread is always left free
+HASH_SLOTS = max(1, min(HASH_THREADS + HASH_QUEUE, WEB_THREADS - 1))
+
+_slots = threading.BoundedSemaphore(HASH_SLOTS)
+_executors = {}
+
+
+class HashPoolBusy(Exception):
+    """Too many hashes are already running or waiting"""
+
+
+def _executor():
+    """the pool for this process, made on first use so a forking server's
+    master doesn't hand its workers a pool whose threads are gone"""
+    pid = os.getpid()
+    if pid not in _executors:
+        _executors.clear()
+        _executors[pid] = ThreadPoolExecutor(
+            max_workers=HASH_THREADS, thread_name_prefix="password-hash"
+        )
+    return _executors[pid]
+
+
+def _run(func, *args):
+    # a non-blocking acquire can't be a with block, released below
+    if not _slots.acquire(blocking=False):  # pylint: disable=consider-using-with
+        raise HashPoolBusy()
+    try:
+        return _executor().submit(func, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password):
+    """hash a new password with HASH_METHOD"""
+    return _run(generate_password_hash, password, HASH_METHOD)
+
+
+def verify_password(pwhash, password):
+    """check a password against a stored hash"""
+    return _run(check_password_hash, pwhash, password)
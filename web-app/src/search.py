@@ -0,0 +1,280 @@
+"""Search over a user's transcripts
+
+Keyword search uses the compound (user_id, transcript/summary text) index
+from shared/mongo.py, so a query only touches the searching user's messages.
+
+Semantic search is optional (SEARCH_EMBEDDINGS=1). Every finished message
+gets one vector, appended to a float32 file that is memory-mapped for
+queries, so the page cache holds it once for every server process and a
+search is a single matrix-vector product. The index catches up with new
+messages before each search, under a file lock so several processes can
+share the folder: each embedded message is marked with the index's
+generation in 'search_indexed', and the ml client clears the mark whenever
+it writes a result, so a catch-up reads exactly the messages missing from
+the files, however late or out of order their results were written.
+
+Vectors come from hashed word counts by default, which needs nothing extra
+but only matches shared words (stems aside); set EMBEDDING_MODEL to a
+sentence-transformers model name for real semantic vectors.
+"""
+
+# pylint: disable=import-error
+
+import fcntl
+import json
+import os
+import re
+import threading
+import uuid
+import zlib
+
+import numpy as np
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+
+import db
+
+SEARCH_EMBEDDINGS = os.getenv("SEARCH_EMBEDDINGS", "0") == "1"
+SEARCH_INDEX_DIR = os.path.abspath(
+    os.getenv(
+        "SEARCH_INDEX_DIR", os.path.join(os.path.dirname(__file__), "../search_index")
+    )
+)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+HASH_DIMENSIONS = int(os.getenv("SEARCH_HASH_DIMENSIONS", "512"))
+# messages embedded per query while catching up
+SYNC_BATCH = 500
+
+RESULT_FIELDS = {"transcript": 1, "summary": 1, "timestamp": 1, "source_audio_id": 1}
+NO_OWNER = b"\0" * 12
+
+WORD = re.compile(r"[a-z0-9']+")
+
+
+def text_search(user_id, query, limit=10):
+    """the user's messages matching the words in query, best first"""
+    return list(
+        db.messages.find(
+            {"user_id": user_id, "$text": {"$search": query}},
+            {**RESULT_FIELDS, "score": {"$meta": "textScore"}},
+            sort=[("score", {"$meta": "textScore"})],
+            limit=limit,
+        )
+    )
+
+
+class HashingEmbedder:  # pylint: disable=too-few-public-methods
+    """bag of words hashed into a fixed number of signed buckets, sublinear tf,
+    unit length, so cosine similarity is a dot product"""
+
+    def __init__(self, dimensions=HASH_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def encode(self, texts):
+        """one unit row per text"""
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in WORD.findall(text.lower()):
+                bucket = zlib.crc32(word.encode())
+                sign = 1.0 if bucket & 0x80000000 else -1.0
+                vectors[row, bucket % self.dimensions] += sign
+        vectors = np.sign(vectors) * np.log1p(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class SentenceTransformerEmbedder:  # pylint: disable=too-few-public-methods
+    """a sentence-transformers model, loaded on first use"""
+
+    def __init__(self, model_name):
+        # imported here, it is optional and slow to import
+        from sentence_transformers import (  # pylint: disable=import-outside-toplevel
+            SentenceTransformer,
+        )
+
+        self.model = SentenceTransformer(model_name)
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+        self.name = model_name
+
+    def encode(self, texts):
+        """one unit row per text"""
+        return self.model.encode(
+            list(texts), normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+
+def make_embedder():
+    """the configured embedder"""
+    if EMBEDDING_MODEL:
+        return SentenceTransformerEmbedder(EMBEDDING_MODEL)
+    return HashingEmbedder()
+
+
+class EmbeddingIndex:
+    """append-only vectors on disk: vectors.f32 holds one row per message,
+    rows.bin the message and owner ids for each row, state.json the embedder
+    and the generation the embedded messages are marked with"""
+
+    def __init__(self, directory, embedder):
+        self.directory = directory
+        self.embedder = embedder
+        self.dimensions = embedder.dimensions
+        self._lock = threading.Lock()
+        self._mapped = (0, None, None)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load_generation(self):
+        """the generation of the files on disk, a new one (and empty files) if
+        there are none yet or they hold another embedder's vectors"""
+        try:
+            with open(self._path("state.json"), encoding="utf-8") as handle:
+                state = json.load(handle)
+        except FileNotFoundError:
+            state = {}
+        if state.get("embedder") == self.embedder.name and "generation" in state:
+            return state["generation"]
+        # vectors from another model aren't comparable, start over, the new
+        # generation makes every message count as not embedded
+        for name in ("vectors.f32", "rows.bin"):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        generation = uuid.uuid4().hex
+        with open(self._path("state.json"), "w", encoding="utf-8") as handle:
+            json.dump(
+                {"embedder": self.embedder.name, "generation": generation}, handle
+            )
+        return generation
+
+    def sync(self, messages):
+        """embed the finished messages not in the files yet, returns how many"""
+        added = 0
+        with self._lock, open(self._path("sync.lock"), "w", encoding="utf-8") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            generation = self._load_generation()
+            while True:
+                batch = list(
+                    messages.find(
+                        {"status": "done", "search_indexed": {"$ne": generation}},
+                        {"transcript": 1, "summary": 1, "user_id": 1, "timestamp": 1},
+                        sort=[("_id", 1)],
+                        limit=SYNC_BATCH,
+                    )
+                )
+                if not batch:
+                    break
+                self.append(batch)
+                # only marked if unchanged since it was read, a result rewritten
+                # in between stays unmarked and is embedded again next time
+                messages.bulk_write(
+                    [
+                        UpdateOne(
+                            {"_id": doc["_id"], "timestamp": doc.get("timestamp")},
+                            {"$set": {"search_indexed": generation}},
+                        )
+                        for doc in batch
+                    ],
+                    ordered=False,
+                )
+                added += len(batch)
+        return added
+
+    def _size(self, name):
+        try:
+            return os.path.getsize(self._path(name))
+        except FileNotFoundError:
+            return 0
+
+    def _truncate_partial(self):
+        """cut both files back to the rows they both hold completely, dropping
+        whatever an append that died between (or during) its writes left"""
+        vector_bytes = self.dimensions * 4
+        count = min(
+            self._size("rows.bin") // 24, self._size("vectors.f32") // vector_bytes
+        )
+        for name, width in (("vectors.f32", vector_bytes), ("rows.bin", 24)):
+            if self._size(name) > count * width:
+                os.truncate(self._path(name), count * width)
+
+    def append(self, docs):
+        """add one row per message document"""
+        # orphan vectors would shift every later row onto the wrong message
+        self._truncate_partial()
+        vectors = self.embedder.encode(
+            [f"{doc.get('summary', '')} {doc.get('transcript', '')}" for doc in docs]
+        )
+        rows = b"".join(
+            doc["_id"].binary
+            + (doc["user_id"].binary if doc.get("user_id") else NO_OWNER)
+            for doc in docs
+        )
+        with open(self._path("vectors.f32"), "ab") as handle:
+            handle.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self._path("rows.bin"), "ab") as handle:
+            handle.write(rows)
+
+    def _map(self):
+        """memory-map the files, remapped only when rows were added"""
+        try:
+            count = os.path.getsize(self._path("rows.bin")) // 24
+        except FileNotFoundError:
+            return 0, None, None
+        if count and count != self._mapped[0]:
+            vectors = np.memmap(
+                self._path("vectors.f32"),
+                dtype=np.float32,
+                mode="r",
+                shape=(count, self.dimensions),
+            )
+            # raw bytes, a bytes dtype would drop ids' trailing zero bytes
+            rows = np.memmap(
+                self._path("rows.bin"), dtype=np.uint8, mode="r", shape=(count, 24)
+            )
+            self._mapped = (count, vectors, rows)
+        return self._mapped
+
+    def search(self, user_id, query, limit=10):
+        """[(message id, score)] of the user's messages closest to query"""
+        count, vectors, rows = self._map()
+        if not count:
+            return []
+        scores = vectors @ self.embedder.encode([query])[0]
+        owner = np.frombuffer(user_id.binary, dtype=np.uint8)
+        scores[~(rows[:, 12:] == owner).all(axis=1)] = -np.inf
+
+        best = {}
+        # re-processed messages can have a stale row, keep each message once
+        for row in np.argsort(-scores)[: limit * 2 + 8]:
+            if scores[row] == -np.inf or len(best) == limit:
+                break
+            best.setdefault(ObjectId(rows[row, :12].tobytes()), float(scores[row]))
+        return list(best.items())
+
+
+_index = {}
+
+
+def embedding_index():
+    """the shared index for this process, None unless SEARCH_EMBEDDINGS=1"""
+    if not SEARCH_EMBEDDINGS:
+        return None
+    if "index" not in _index:
+        _index["index"] = EmbeddingIndex(SEARCH_INDEX_DIR, make_embedder())
+    return _index["index"]
+
+
+def semantic_search(user_id, query, limit=10):
+    """the user's messages closest in meaning to query, best first"""
+    index = embedding_index()
+    index.sync(db.messages)
+    hits = index.search(user_id, query, limit)
+    docs = {
+        doc["_id"]: doc
+        for doc in db.messages.find(
+            {"_id": {"$in": [h[0] for h in hits]}}, RESULT_FIELDS
+        )
+    }
+    return [{**docs[i], "score": score} for i, score in hits if i in docs]
@@ -4,39 +4,76 @@ no true import errors
 the text that is gotten from speech to text"""
 
 # pylint: disable=import-error,unused-import
+import functools
+import os
 import nltk
 from sumy.parsers.plaintext import PlaintextParser
 from sumy.nlp.tokenizers import Tokenizer
 from sumy.summarizers.lex_rank import LexRankSummarizer
 from sumy.nlp.stemmers import Stemmer
 from sumy.utils import get_stop_words
+from lexrank import VectorizedLexRankSummarizer
 
-# need to download NLTK data
-nltk.download("punkt_tab")
+# NLTK data ships with the image (see the Dockerfile) so nothing is downloaded
+# at import, it is only fetched into this folder if it is missing on first use
+NLTK_DATA_DIR = os.path.abspath(
+    os.getenv("NLTK_DATA_DIR", os.path.join(os.path.dirname(__file__), "../nltk_data"))
+)
+nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+# distinct words whose stems are remembered, transcripts reuse a small vocabulary
+STEM_CACHE_SIZE = 50000
 
 # import this into the webapp and run it to summarize a given note once it has
 # been converted from speech to text
 
 
+def ensure_nltk_data():
+    """make sure the punkt sentence tokenizer data is there"""
+    try:
+        nltk.data.find("tokenizers/punkt_tab")
+    except LookupError:
+        nltk.download("punkt_tab", download_dir=NLTK_DATA_DIR, quiet=True)
+
+
+@functools.lru_cache(maxsize=None)
+def get_summarizer(language):
+    """tokenizer and LexRank summarizer for a language, built once and reused
+    the stemmer is memoized so each word is only stemmed once"""
+    ensure_nltk_data()
+    tokenizer = Tokenizer(language)
+    stemmer = functools.lru_cache(maxsize=STEM_CACHE_SIZE)(Stemmer(language))
+
+    summarizer = VectorizedLexRankSummarizer(stemmer)
+
+    summarizer.stop_words = get_stop_words(language)
+    return tokenizer, summarizer
+
+
 def summarize_text(text, language, sentences_count):
     """Summarize the given text based on the LexRank Summarization which is supposed to be
 
     Better than LSA for shorter paragraphs will likely occur
+    (NumPy version of sumy's LexRank, see lexrank.py)
 
     """
-    parser = PlaintextParser.from_string(text, Tokenizer("english"))
-    stemmer = Stemmer("english")
+    return summarize_many([text], language, sentences_count)[0]
 
-    summarizer = LexRankSummarizer(stemmer)
 
-    summarizer.stop_words = get_stop_words(language)
+def summarize_many(texts, language="english", sentences_count=1):
+    """Summarize several texts with the same cached tokenizer and summarizer"""
+    tokenizer, summarizer = get_summarizer(language)
 
-    summary_array = []
-    # 2 sentence summaries
-    for sentence in summarizer(parser.document, sentences_count):
-        summary_array.append(str(sentence))
+    summaries = []
+    for text in texts:
+        parser = PlaintextParser.from_string(text, tokenizer)
+        summary_array = []
+        # 2 sentence summaries
+        for sentence in summarizer(parser.document, sentences_count):
+            summary_array.append(str(sentence))
+        summaries.append(" ".join(summary_array))
 
-    return " ".join(summary_array)
+    return summaries
 
 
 def summarize_text_access(text):
@@ -7,8 +7,9 @@ import importlib.util
 import sys
 import os
 from io import BytesIO
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 import pytest
 
 # Load the app module
@@ -29,6 +30,22 @@ def test_client():
         yield test_client
 
 
+@pytest.fixture(autouse=True)
+def empty_queue():
+    """Uploads see an empty processing queue unless a test says otherwise."""
+    app_module._queue_depth["at"] = -float("inf")  # pylint: disable=protected-access
+    with patch("app.queue_depth", return_value=0) as mock_depth:
+        yield mock_depth
+
+
+@pytest.fixture(autouse=True)
+def no_failed_recordings():
+    """Jobs haven't been given up on unless a test says otherwise."""
+    with patch.object(app_module.db, "recordings") as mock_recordings:
+        mock_recordings.find_one.return_value = None
+        yield mock_recordings
+
+
 def test_home_route(test_client):
     """Test that the home page loads successfully."""
     response = test_client.get("/")
@@ -65,6 +82,19 @@ def test_signup_post_existing_user(test_client):
         assert "Account with this username already created." in html
 
 
+def test_signup_post_concurrent_duplicate(test_client):
+    """Test a name taken between the check and the insert isn't a server error."""
+    with patch.object(app_module.db, "accounts") as mock_db:
+        mock_db.find_one.return_value = None
+        mock_db.insert_one.side_effect = DuplicateKeyError("duplicate username")
+        response = test_client.post(
+            "/signup", data={"username": "testuser", "password": "testpass"}
+        )
+        assert response.status_code == 200
+        html = response.data.decode("utf-8")
+        assert "Account with this username already created." in html
+
+
 def test_signup_post_missing_fields(test_client):
     """Test signup with missing username and password fields."""
     response = test_client.post("/signup", data={"username": "", "password": ""})
@@ -80,9 +110,10 @@ def test_login_get(test_client):
 
 def test_login_post_success(test_client):
     """Test successful login with valid credentials."""
-    with patch.object(app_module.db, "accounts") as mock_db, patch(
-        "app.check_password_hash", return_value=True
-    ):
+    with patch.object(app_module.db, "accounts") as mock_db, patch.object(
+        app_module.db, "messages"
+    ) as mock_messages, patch("app.verify_password", return_value=True):
+        mock_messages.find.return_value = []
         mock_user = {
             "_id": ObjectId(),
             "username": "testuser",
@@ -114,13 +145,19 @@ def test_profile_route_authenticated(test_client):
     with test_client.session_transaction() as sess:
         sess["user_id"] = test_user_id
 
-    with patch.object(app_module.db, "accounts") as mock_db:
+    with patch.object(app_module.db, "accounts") as mock_db, patch.object(
+        app_module.db, "messages"
+    ) as mock_messages:
         mock_db.find_one.return_value = {
             "_id": ObjectId(test_user_id),
             "username": "testuser",
         }
+        mock_messages.find.return_value = [
+            {"_id": ObjectId(), "transcript": "my words", "summary": "gist"}
+        ]
         response = test_client.get("/profile")
         assert b"testuser" in response.data
+        assert b"my words" in response.data
 
 
 def test_profile_route_not_authenticated(test_client):
@@ -157,12 +194,476 @@ def test_upload_audio_success(test_client):
     """Test successful audio file upload."""
     dummy_audio = (BytesIO(b"fake audio"), "test_audio.webm")
     data = {"audio": dummy_audio}
+    recording_id = ObjectId()
 
-    response = test_client.post(
-        "/upload", data=data, content_type="multipart/form-data"
+    with patch.object(app_module.db, "recordings") as mock_db, patch.object(
+        app_module.db, "audio_fs"
+    ) as mock_fs, patch("app.get_next_file_number", return_value=1):
+        mock_fs.upload_from_stream.return_value = ObjectId()
+        mock_db.insert_one.return_value.inserted_id = recording_id
+        response = test_client.post(
+            "/upload", data=data, content_type="multipart/form-data"
+        )
+        json_data = response.get_json()
+
+        assert response.status_code == 200
+        assert json_data["success"] is True
+        assert "filename" in json_data
+        assert json_data["job_id"] == str(recording_id)
+        mock_fs.upload_from_stream.assert_called_once()
+        stored = mock_db.insert_one.call_args.args[0]
+        assert "audioData" not in stored
+        assert stored["audioFileId"] == mock_fs.upload_from_stream.return_value
+
+
+def test_upload_audio_raw_body(test_client):
+    """Test a raw audio/webm body is streamed into gridfs like a form upload."""
+    with patch.object(app_module.db, "recordings") as mock_db, patch.object(
+        app_module.db, "audio_fs"
+    ) as mock_fs, patch("app.get_next_file_number", return_value=1):
+        mock_db.insert_one.return_value.inserted_id = ObjectId()
+        response = test_client.post(
+            "/upload", data=b"fake audio", content_type="audio/webm"
+        )
+        assert response.get_json()["success"] is True
+        stream = mock_fs.upload_from_stream.call_args.args[1]
+        assert stream.read() == b"fake audio"
+
+
+def test_job_status_pending(test_client):
+    """Test job status before the ml client has written a message."""
+    job_id = str(ObjectId())
+    with patch.object(app_module.db, "messages") as mock_db:
+        mock_db.find_one.return_value = None
+        response = test_client.get(f"/jobs/{job_id}")
+        json_data = response.get_json()
+        assert json_data["status"] == "pending"
+        assert json_data["job_id"] == job_id
+
+
+def test_job_status_done(test_client):
+    """Test job status returns the message tied to the recording."""
+    job_id = str(ObjectId())
+    with patch.object(app_module.db, "messages") as mock_db:
+        mock_db.find_one.return_value = {"transcript": "hello", "summary": "hi"}
+        response = test_client.get(f"/jobs/{job_id}")
+        json_data = response.get_json()
+        assert json_data["status"] == "done"
+        assert json_data["Transcript"] == "hello"
+        mock_db.find_one.assert_called_once_with({"source_audio_id": ObjectId(job_id)})
+
+
+def test_job_status_long_poll(test_client):
+    """Test long-poll returns as soon as the result shows up."""
+    job_id = str(ObjectId())
+    with patch.object(app_module.db, "messages") as mock_db, patch(
+        "app.time.sleep"
+    ) as mock_sleep:
+        mock_db.find_one.side_effect = [None, None, {"transcript": "t", "summary": "s"}]
+        response = test_client.get(f"/jobs/{job_id}?wait=5")
+        assert response.get_json()["status"] == "done"
+        assert mock_sleep.call_count == 2
+
+
+def test_job_status_invalid_id(test_client):
+    """Test a malformed job id is a 404."""
+    response = test_client.get("/jobs/not-an-id")
+    assert response.status_code == 404
+
+
+def test_job_events_stream(test_client):
+    """Test the event stream sends a done event with the result."""
+    job_id = str(ObjectId())
+    with patch.object(app_module.db, "messages") as mock_db:
+        mock_db.find_one.return_value = {"transcript": "t", "summary": "s"}
+        response = test_client.get(f"/jobs/{job_id}/events")
+        body = response.get_data(as_text=True)
+        assert response.mimetype == "text/event-stream"
+        assert "event: done" in body
+        assert '"Summary": "s"' in body
+
+
+def test_next_file_number_uses_counter():
+    """Test the recording number comes from the counter without scanning recordings."""
+    with patch.object(app_module.db, "counters") as mock_counters, patch.object(
+        app_module.db, "recordings"
+    ) as mock_recordings:
+        mock_counters.find_one_and_update.return_value = {"seq": 42}
+        assert app_module.get_next_file_number() == 42
+        mock_recordings.find.assert_not_called()
+
+
+def test_next_file_number_seeds_from_existing_files():
+    """Test a missing counter is seeded from the highest existing filename."""
+    with patch.object(app_module.db, "counters") as mock_counters, patch.object(
+        app_module.db, "recordings"
+    ) as mock_recordings:
+        mock_counters.find_one_and_update.side_effect = [None, {"seq": 8}]
+        mock_recordings.find.return_value = [
+            {"filename": "recording_7.webm"},
+            {"filename": "recording_3.webm"},
+            {"filename": "garbage"},
+        ]
+        assert app_module.get_next_file_number() == 8
+        seed = mock_counters.update_one.call_args.args[1]
+        assert seed == {"$max": {"seq": 7}}
+        assert mock_recordings.find.call_args.args[1] == {"filename": 1, "_id": 0}
+
+
+def test_setup_creates_hot_query_indexes():
+    """Test startup index creation covers the lookups the app does."""
+    mock_database = MagicMock()
+    with patch.object(app_module.db, "db", mock_database):
+        assert app_module.db.setup() is True
+    mock_database["accounts"].create_index.assert_any_call(
+        [("username", 1)], unique=True
+    )
+    mock_database["messages"].create_index.assert_any_call([("source_audio_id", 1)])
+    mock_database["messages"].create_index.assert_any_call(
+        [("user_id", 1), ("_id", -1)]
     )
-    json_data = response.get_json()
 
-    assert response.status_code == 200
-    assert json_data["success"] is True
-    assert "filename" in json_data
+
+def test_job_status_transcribing_partials(test_client):
+    """Test a job mid-transcription reports the segments finished so far in order."""
+    job_id = str(ObjectId())
+    with patch.object(app_module.db, "messages") as mock_db:
+        mock_db.find_one.return_value = {
+            "status": "transcribing",
+            "segments": 3,
+            "partials": {"1": "world", "0": "hello"},
+        }
+        json_data = test_client.get(f"/jobs/{job_id}").get_json()
+        assert json_data["status"] == "transcribing"
+        assert json_data["Transcript"] == "hello world"
+        assert json_data["segments_done"] == 2
+
+
+def test_job_events_progress_then_done(test_client):
+    """Test the event stream sends progress for partials before the done event."""
+    job_id = str(ObjectId())
+    with patch.object(app_module.db, "messages") as mock_db, patch("app.time.sleep"):
+        mock_db.find_one.side_effect = [
+            {"status": "transcribing", "segments": 2, "partials": {"0": "hi"}},
+            {"status": "done", "transcript": "hi there", "summary": "s"},
+        ]
+        body = test_client.get(f"/jobs/{job_id}/events").get_data(as_text=True)
+        assert body.index("event: progress") < body.index("event: done")
+
+
+def test_job_status_failed(test_client, no_failed_recordings):
+    """Test a recording the ml client gave up on reports failed with the error."""
+    job_id = str(ObjectId())
+    no_failed_recordings.find_one.return_value = {"_id": ObjectId(job_id)}
+    with patch.object(app_module.db, "messages") as mock_db, patch(
+        "app.time.sleep"
+    ) as mock_sleep:
+        mock_db.find_one.return_value = None
+        json_data = test_client.get(f"/jobs/{job_id}?wait=5").get_json()
+        assert json_data["status"] == "failed"
+        assert json_data["error"]
+        mock_sleep.assert_not_called()
+    query = no_failed_recordings.find_one.call_args.args[0]
+    assert query == {"_id": ObjectId(job_id), "failed": True}
+
+
+def test_job_events_failed_ends_stream(test_client, no_failed_recordings):
+    """Test the event stream ends with a failed event instead of waiting it out."""
+    job_id = str(ObjectId())
+    no_failed_recordings.find_one.side_effect = [
+        None,
+        {"_id": ObjectId(job_id), "error": "bad audio"},
+    ]
+    with patch.object(app_module.db, "messages") as mock_db, patch("app.time.sleep"):
+        mock_db.find_one.return_value = None
+        body = test_client.get(f"/jobs/{job_id}/events").get_data(as_text=True)
+        assert body.rstrip().endswith("}")
+        assert "event: failed" in body
+        assert '"error": "bad audio"' in body
+        assert "event: timeout" not in body
+
+
+def test_job_status_hides_other_users_failure(test_client, no_failed_recordings):
+    """Test someone else's failed recording looks pending, like their results."""
+    with test_client.session_transaction() as sess:
+        sess["user_id"] = str(ObjectId())
+    no_failed_recordings.find_one.return_value = {"user_id": ObjectId()}
+    with patch.object(app_module.db, "messages") as mock_db:
+        mock_db.find_one.return_value = None
+        response = test_client.get(f"/jobs/{ObjectId()}")
+        assert response.get_json()["status"] == "pending"
+
+
+def test_upload_audio_tags_logged_in_user(test_client):
+    """Test a logged in upload stores the uploader on the recording."""
+    user_id = ObjectId()
+    with test_client.session_transaction() as sess:
+        sess["user_id"] = str(user_id)
+    with patch.object(app_module.db, "recordings") as mock_db, patch.object(
+        app_module.db, "audio_fs"
+    ), patch("app.get_next_file_number", return_value=1):
+        mock_db.insert_one.return_value.inserted_id = ObjectId()
+        test_client.post("/upload", data=b"fake audio", content_type="audio/webm")
+        assert mock_db.insert_one.call_args.args[0]["user_id"] == user_id
+
+
+def test_job_status_hides_other_users_result(test_client):
+    """Test a job owned by someone else looks like it has no result yet."""
+    with test_client.session_transaction() as sess:
+        sess["user_id"] = str(ObjectId())
+    with patch.object(app_module.db, "messages") as mock_db:
+        mock_db.find_one.return_value = {"transcript": "secret", "user_id": ObjectId()}
+        response = test_client.get(f"/jobs/{ObjectId()}")
+        assert response.get_json()["status"] == "pending"
+
+
+def test_result_without_job_is_per_user(test_client):
+    """Test /result falls back to the user's own latest message, not the global one."""
+    user_id = ObjectId()
+    with patch.object(app_module.db, "messages") as mock_db:
+        response = test_client.get("/result")
+        assert response.get_json() == {"Transcript": "", "Summary": ""}
+        mock_db.find_one.assert_not_called()
+
+        with test_client.session_transaction() as sess:
+            sess["user_id"] = str(user_id)
+        mock_db.find_one.return_value = {"transcript": "t", "summary": "s"}
+        response = test_client.get("/result")
+        assert response.get_json()["Transcript"] == "t"
+        mock_db.find_one.assert_called_once_with(
+            {"user_id": user_id}, sort=[("_id", -1)]
+        )
+
+
+def test_profile_history_pages_by_id_range(test_client):
+    """Test history pages use an _id range and report where the next page starts."""
+    user_id = ObjectId()
+    before = ObjectId()
+    ids = [ObjectId() for _ in range(3)]
+    with test_client.session_transaction() as sess:
+        sess["user_id"] = str(user_id)
+    with patch.object(app_module.db, "messages") as mock_db, patch(
+        "app.HISTORY_PAGE_SIZE", 2
+    ):
+        mock_db.find.return_value = [
+            {"_id": i, "source_audio_id": ObjectId(), "transcript": "t"} for i in ids
+        ]
+        response = test_client.get(f"/profile/history?before={before}")
+        json_data = response.get_json()
+
+        query = mock_db.find.call_args.args[0]
+        assert query == {
+            "user_id": user_id,
+            "status": {"$ne": "transcribing"},
+            "_id": {"$lt": before},
+        }
+        assert mock_db.find.call_args.kwargs["limit"] == 3
+        assert "skip" not in mock_db.find.call_args.kwargs
+        assert len(json_data["items"]) == 2
+        assert json_data["next_before"] == str(ids[1])
+
+
+def test_history_leaves_out_unfinished_transcripts():
+    """Test the partials of recordings still being transcribed aren't listed."""
+    user_id = ObjectId()
+    with patch.object(app_module.db, "messages") as mock_db:
+        mock_db.find.return_value = []
+        app_module.user_history(user_id)
+    query = mock_db.find.call_args.args[0]
+    assert query == {"user_id": user_id, "status": {"$ne": "transcribing"}}
+
+
+def test_profile_history_requires_login(test_client):
+    """Test the history endpoint is only for logged in users."""
+    response = test_client.get("/profile/history")
+    assert response.status_code == 401
+
+
+def test_search_requires_login(test_client):
+    """Test search is only for logged in users."""
+    response = test_client.get("/search?q=hello")
+    assert response.status_code == 401
+
+
+def test_search_needs_query(test_client):
+    """Test an empty query is rejected."""
+    with test_client.session_transaction() as sess:
+        sess["user_id"] = str(ObjectId())
+    response = test_client.get("/search?q=%20")
+    assert response.status_code == 400
+
+
+def test_search_text_mode(test_client):
+    """Test keyword search only looks at the user's messages and reports scores."""
+    user_id = ObjectId()
+    with test_client.session_transaction() as sess:
+        sess["user_id"] = str(user_id)
+    with patch.object(app_module.db, "messages") as mock_db:
+        mock_db.find.return_value = [
+            {"source_audio_id": ObjectId(), "transcript": "hello", "score": 1.5}
+        ]
+        response = test_client.get("/search?q=hello&k=3")
+        json_data = response.get_json()
+
+        query = mock_db.find.call_args.args[0]
+        assert query == {"user_id": user_id, "$text": {"$search": "hello"}}
+        assert mock_db.find.call_args.kwargs["limit"] == 3
+        assert json_data["mode"] == "text"
+        assert json_data["items"][0]["Transcript"] == "hello"
+        assert json_data["items"][0]["score"] == 1.5
+
+
+def test_search_semantic_falls_back_to_text(test_client):
+    """Test semantic mode answers with keyword results when embeddings are off."""
+    with test_client.session_transaction() as sess:
+        sess["user_id"] = str(ObjectId())
+    with patch("search.embedding_index", return_value=None), patch(
+        "search.text_search", return_value=[]
+    ) as mock_text:
+        response = test_client.get("/search?q=hello&mode=semantic")
+        assert response.get_json()["mode"] == "text"
+        mock_text.assert_called_once()
+
+
+def test_upload_rejected_when_queue_full(test_client, empty_queue):
+    """Test uploads get a 429 with a retry hint once the queue is too deep."""
+    empty_queue.return_value = 12
+    with patch("app.MAX_QUEUE_DEPTH", 10), patch("app.QUEUE_DRAIN_RATE", 2), patch(
+        "app.store_recording"
+    ) as mock_store:
+        response = test_client.post("/upload", data=b"x", content_type="audio/webm")
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "2"
+        assert response.get_json()["retry_after"] == 2
+        mock_store.assert_not_called()
+
+        response = test_client.post("/uploads")
+        assert response.status_code == 429
+
+
+def test_queue_depth_is_reused(test_client, empty_queue):
+    """Test back to back uploads share one count of the queue."""
+    with patch("app.store_recording", return_value=("a.webm", "1")):
+        test_client.post("/upload", data=b"x", content_type="audio/webm")
+        test_client.post("/upload", data=b"x", content_type="audio/webm")
+    assert empty_queue.call_count == 1
+
+
+def test_metrics_after_upload(test_client):
+    """Test /metrics reports the upload size, stage latencies and queue depth."""
+    with patch.object(app_module.db, "recordings") as mock_db, patch.object(
+        app_module.db, "audio_fs"
+    ) as mock_fs, patch("app.get_next_file_number", return_value=1), patch(
+        "app.queue_depth", return_value=5
+    ), patch(
+        "metrics_store.snapshots", return_value=[]
+    ) as mock_snapshots:
+        mock_fs.upload_from_stream.side_effect = lambda name, stream, **_: stream.read()
+        mock_db.insert_one.return_value.inserted_id = ObjectId()
+        test_client.post("/upload", data=b"x" * 100, content_type="audio/webm")
+        assert mock_db.insert_one.call_args.args[0]["size_bytes"] == 100
+
+        response = test_client.get("/metrics")
+        text = response.get_data(as_text=True)
+        assert response.mimetype == "text/plain"
+        assert "recordings_queue_depth 5.0" in text
+        assert 'web_upload_bytes_bucket{le="16384.0"}' in text
+        assert 'web_stage_seconds_count{stage="gridfs_write"}' in text
+        assert 'web_stage_seconds_count{stage="mongo_write"}' in text
+        assert mock_snapshots.call_args.kwargs["exclude"].startswith("web-")
+
+
+def test_metrics_adds_other_server_processes(test_client):
+    """Test /metrics sums the snapshots other gunicorn workers stored."""
+    other = {"web_uploads_rejected_total": [{"labels": {}, "value": 1000}]}
+    with patch("metrics_store.snapshots", return_value=[other]):
+        text = test_client.get("/metrics").get_data(as_text=True)
+    total = app_module.UPLOADS_REJECTED.samples()
+    own = total[0][1] if total else 0
+    assert f"web_uploads_rejected_total {float(own + 1000)}" in text
+
+
+def test_login_caches_username_for_profile(test_client):
+    """Test /profile after login reads the username from the session, not mongo."""
+    user = {"_id": ObjectId(), "username": "testuser", "password": "hash"}
+    with patch.object(app_module.db, "accounts") as mock_db, patch.object(
+        app_module.db, "messages"
+    ) as mock_messages, patch("app.verify_password", return_value=True):
+        mock_db.find_one.return_value = user
+        mock_messages.find.return_value = []
+        test_client.post("/login", data={"username": "testuser", "password": "p"})
+        mock_db.find_one.reset_mock()
+
+        response = test_client.get("/profile")
+        assert b"testuser" in response.data
+        mock_db.find_one.assert_not_called()
+
+
+def test_login_busy_hash_pool(test_client):
+    """Test a login is turned away with a retry hint when the hash pool is full."""
+    with patch.object(app_module.db, "accounts") as mock_db, patch(
+        "app.verify_password", side_effect=app_module.HashPoolBusy
+    ):
+        mock_db.find_one.return_value = {"_id": ObjectId(), "password": "hash"}
+        response = test_client.post(
+            "/login", data={"username": "testuser", "password": "p"}
+        )
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+
+def test_chunked_upload_routes(test_client):
+    """Test a chunked upload is started, fed and completed into a recording."""
+    upload_id = ObjectId()
+    upload = {"_id": upload_id, "user_id": None, "state": "open"}
+    with patch("app.uploads.create", return_value=upload_id), patch(
+        "app.uploads.find", return_value=upload
+    ), patch("app.uploads.put_chunk") as mock_put, patch(
+        "app.uploads.complete", return_value=("recording_1.webm", "job1")
+    ) as mock_complete:
+        response = test_client.post("/uploads")
+        assert response.status_code == 201
+        assert response.get_json()["upload_id"] == str(upload_id)
+
+        response = test_client.put(f"/uploads/{upload_id}/chunks/0", data=b"opus")
+        assert response.get_json()["index"] == 0
+        mock_put.assert_called_once_with(upload, 0, b"opus")
+
+        response = test_client.post(
+            f"/uploads/{upload_id}/complete", json={"chunks": 1}
+        )
+        assert response.get_json()["job_id"] == "job1"
+        assert mock_complete.call_args.args[:2] == (upload, 1)
+
+
+def test_chunked_upload_errors(test_client):
+    """Test bad ids are 404s and a complete without a chunk count is a 400."""
+    assert test_client.put("/uploads/nope/chunks/0", data=b"x").status_code == 404
+    upload = {"_id": ObjectId(), "user_id": None, "state": "open"}
+    with patch("app.uploads.find", return_value=upload):
+        response = test_client.post(f"/uploads/{upload['_id']}/complete", json={})
+        assert response.status_code == 400
+        assert response.get_json()["success"] is False
+
+
+def test_chunk_read_is_bounded_without_content_length(test_client):
+    """Test a chunked request body is read no further than one byte over the limit."""
+    upload = {"_id": ObjectId(), "user_id": None, "state": "open"}
+    with patch("app.uploads.find", return_value=upload), patch(
+        "app.uploads.MAX_CHUNK_BYTES", 4
+    ):
+        response = test_client.put(
+            f"/uploads/{upload['_id']}/chunks/0",
+            input_stream=BytesIO(b"x" * 100),
+            headers={"Transfer-Encoding": "chunked"},
+            environ_base={"wsgi.input_terminated": True},
+        )
+    assert response.status_code == 413
+    assert response.get_json()["max_chunk_bytes"] == 4
+
+
+def test_record_page_passes_bitrate(test_client):
+    """Test the recorder is configured with the opus bitrate and chunk length."""
+    with patch("app.AUDIO_BITRATE", 24000):
+        html = test_client.get("/record").get_data(as_text=True)
+    assert "const AUDIO_BITRATE = 24000;" in html
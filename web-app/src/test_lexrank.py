@@ -0,0 +1,89 @@
+# pylint: disable=import-error
+
+
+"""Tests for the NumPy LexRank summarizer"""
+
+import random
+import pytest
+from sumy.models.dom import ObjectDocumentModel, Paragraph, Sentence
+from sumy.nlp.stemmers import Stemmer
+from sumy.summarizers.lex_rank import LexRankSummarizer
+from sumy.utils import get_stop_words
+from lexrank import VectorizedLexRankSummarizer
+
+
+class SpaceTokenizer:  # pylint: disable=too-few-public-methods
+    """Splits words on spaces, so documents can be built without NLTK data"""
+
+    language = "english"
+
+    @staticmethod
+    def to_words(text):
+        """words of a sentence"""
+        return text.split()
+
+
+def make_document(sentences):
+    """sumy document from a list of sentence strings"""
+    tokenizer = SpaceTokenizer()
+    return ObjectDocumentModel(
+        [Paragraph([Sentence(text, tokenizer) for text in sentences])]
+    )
+
+
+def random_document(count, seed):
+    """sentences of random words from a small vocabulary, some of them empty"""
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(200)] + ["the", "a", "is", "and"]
+    return make_document(
+        [
+            " ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 12)))
+            for _ in range(count)
+        ]
+    )
+
+
+def summarize(summarizer_class, document, count):
+    """run one summarizer configured like summarize_function does"""
+    summarizer = summarizer_class(Stemmer("english"))
+    summarizer.stop_words = get_stop_words("english")
+    return [str(sentence) for sentence in summarizer(document, count)]
+
+
+@pytest.mark.parametrize("count,seed", [(3, 0), (20, 1), (80, 2), (200, 3)])
+def test_same_sentences_as_sumy(count, seed):
+    """Test the vectorized version picks the same sentences as sumy's LexRank."""
+    document = random_document(count, seed)
+    assert summarize(VectorizedLexRankSummarizer, document, 5) == summarize(
+        LexRankSummarizer, document, 5
+    )
+
+
+def test_empty_document():
+    """Test an empty document gives an empty summary."""
+    assert not summarize(VectorizedLexRankSummarizer, make_document([]), 1)
+
+
+def test_scores_match_sumy_power_method():
+    """Test the scores themselves match sumy's matrix version."""
+    sentences = [
+        ["cat", "mat"],
+        ["cat", "dog"],
+        ["dog", "bone", "bone"],
+        [],
+        ["bird"],
+    ]
+    reference = LexRankSummarizer()
+    tf = reference._compute_tf(sentences)  # pylint: disable=protected-access
+    idf = reference._compute_idf(sentences)  # pylint: disable=protected-access
+    matrix = reference._create_matrix(  # pylint: disable=protected-access
+        sentences, reference.threshold, tf, idf
+    )
+    expected = reference.power_method(matrix, reference.epsilon)
+
+    weights = VectorizedLexRankSummarizer.tfidf_matrix(sentences)
+    adjacency, degrees = VectorizedLexRankSummarizer.similarity_graph(
+        weights, reference.threshold
+    )
+    scores = VectorizedLexRankSummarizer.rank(adjacency, degrees, reference.epsilon)
+    assert scores == pytest.approx(expected)
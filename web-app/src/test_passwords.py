@@ -0,0 +1,50 @@
+"""Tests for the password hashing pool"""
+
+import threading
+from unittest.mock import patch
+
+import pytest
+
+import passwords
+
+
+def test_hash_and_verify_round_trip():
+    """A hash made with the configured method verifies, a wrong password doesn't."""
+    with patch("passwords.HASH_METHOD", "pbkdf2:sha256:1000"):
+        pwhash = passwords.hash_password("secret")
+    assert pwhash.startswith("pbkdf2:sha256:1000$")
+    assert passwords.verify_password(pwhash, "secret") is True
+    assert passwords.verify_password(pwhash, "wrong") is False
+
+
+def test_full_pool_raises_busy():
+    """Once every slot is taken new hashes are refused instead of queued."""
+    slots = threading.BoundedSemaphore(1)
+    with slots, patch("passwords._slots", slots), pytest.raises(passwords.HashPoolBusy):
+        passwords.verify_password("pbkdf2:sha256:1000$salt$hash", "secret")
+
+
+def test_default_pool_refuses_before_request_threads_run_out():
+    """With the default settings a login burst is refused while a request thread is free."""
+    assert passwords.HASH_SLOTS < passwords.WEB_THREADS
+    gate = threading.Event()
+    outcomes = []
+
+    def login():
+        try:
+            outcomes.append(passwords.verify_password("hash", "secret"))
+        except passwords.HashPoolBusy:
+            outcomes.append("busy")
+
+    with patch("passwords.check_password_hash", lambda *_: gate.wait(5)):
+        threads = [threading.Thread(target=login) for _ in range(passwords.WEB_THREADS)]
+        for thread in threads:
+            thread.start()
+        # the refused ones return at once, the rest hold their slots until the gate
+        while len(outcomes) < passwords.WEB_THREADS - passwords.HASH_SLOTS:
+            gate.wait(0.01)
+        gate.set()
+        for thread in threads:
+            thread.join()
+    assert outcomes.count("busy") == passwords.WEB_THREADS - passwords.HASH_SLOTS
+    assert outcomes.count(True) == passwords.HASH_SLOTS
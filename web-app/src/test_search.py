@@ -0,0 +1,127 @@
+"""
+Unit tests for transcript search
+"""
+
+# pylint: disable=import-error, redefined-outer-name
+
+import os
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from bson.objectid import ObjectId
+
+import search
+
+
+@pytest.fixture
+def index(tmp_path):
+    """an empty embedding index in a temporary folder"""
+    return search.EmbeddingIndex(str(tmp_path), search.HashingEmbedder(64))
+
+
+def message(user_id, text, minutes=0):
+    """a finished message document"""
+    return {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "transcript": text,
+        "summary": "",
+        "timestamp": datetime(2024, 1, 1, tzinfo=timezone.utc)
+        + timedelta(minutes=minutes),
+    }
+
+
+def test_hashing_embedder_unit_rows():
+    """Test every non-empty text becomes a unit vector and equal texts match."""
+    vectors = search.HashingEmbedder(64).encode(["the cat sat", "the cat sat", ""])
+    assert vectors.shape == (3, 64)
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1.0)
+    assert np.allclose(vectors[0], vectors[1])
+    assert not vectors[2].any()
+
+
+def test_search_only_returns_own_messages(index):
+    """Test other users' messages never come back, however close they are."""
+    alice, bob = ObjectId(), ObjectId()
+    mine = message(alice, "budget meeting notes")
+    theirs = message(bob, "budget meeting notes")
+    index.append([mine, theirs, message(alice, "holiday plans")])
+
+    hits = index.search(alice, "budget meeting", limit=5)
+    assert hits[0][0] == mine["_id"]
+    assert theirs["_id"] not in [hit[0] for hit in hits]
+
+
+def test_search_keeps_ids_ending_in_zero_bytes(index):
+    """Test ids whose last bytes are zero survive the round trip through the file."""
+    user_id = ObjectId(b"\x01" * 10 + b"\0\0")
+    doc = message(user_id, "hello")
+    doc["_id"] = ObjectId(b"\x02" * 11 + b"\0")
+    index.append([doc])
+    assert index.search(user_id, "hello") == [(doc["_id"], pytest.approx(1.0))]
+
+
+def test_search_sees_rows_appended_later(index):
+    """Test the memory map is refreshed once rows are added."""
+    user_id = ObjectId()
+    assert not index.search(user_id, "hello")
+    index.append([message(user_id, "hello")])
+    assert len(index.search(user_id, "hello")) == 1
+    index.append([message(user_id, "hello again")])
+    assert len(index.search(user_id, "hello")) == 2
+
+
+def test_append_drops_a_half_finished_append(index):
+    """Test vectors left by an append that died before its rows don't shift later rows."""
+    user_id = ObjectId()
+    first = message(user_id, "budget meeting")
+    index.append([first])
+    with open(os.path.join(index.directory, "vectors.f32"), "ab") as handle:
+        handle.write(np.ones(64 * 2 + 5, dtype=np.float32).tobytes())
+    with open(os.path.join(index.directory, "rows.bin"), "ab") as handle:
+        handle.write(b"\1" * 10)
+
+    second = message(user_id, "holiday plans")
+    index.append([second])
+    assert index.search(user_id, "holiday plans")[0] == (
+        second["_id"],
+        pytest.approx(1.0),
+    )
+    assert index.search(user_id, "budget meeting")[0][0] == first["_id"]
+
+
+def test_sync_reads_only_unmarked_messages(index):
+    """Test sync reads messages without this index's mark and marks what it embedded."""
+    user_id = ObjectId()
+    docs = [message(user_id, "first", 2), message(user_id, "second", 1)]
+    messages = MagicMock()
+    messages.find.side_effect = [docs, [], []]
+
+    assert index.sync(messages) == 2
+    assert index.sync(messages) == 0
+    query = messages.find.call_args.args[0]
+    generation = query["search_indexed"]["$ne"]
+    assert query == {"status": "done", "search_indexed": {"$ne": generation}}
+    assert messages.find.call_args.kwargs["sort"] == [("_id", 1)]
+    marks = messages.bulk_write.call_args.args[0]
+    # pylint: disable=protected-access
+    assert [op._filter for op in marks] == [
+        {"_id": doc["_id"], "timestamp": doc["timestamp"]} for doc in docs
+    ]
+    assert marks[0]._doc == {"$set": {"search_indexed": generation}}
+
+
+def test_sync_starts_over_for_another_embedder(tmp_path):
+    """Test vectors from a different embedder are thrown away."""
+    user_id = ObjectId()
+    messages = MagicMock()
+    messages.find.side_effect = [[message(user_id, "hello")], [], [], []]
+    search.EmbeddingIndex(str(tmp_path), search.HashingEmbedder(64)).sync(messages)
+    first = messages.find.call_args.args[0]["search_indexed"]["$ne"]
+
+    index = search.EmbeddingIndex(str(tmp_path), search.HashingEmbedder(32))
+    index.sync(messages)
+    assert messages.find.call_args.args[0]["search_indexed"]["$ne"] != first
+    assert not index.search(user_id, "hello")
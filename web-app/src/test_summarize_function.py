@@ -0,0 +1,71 @@
+# pylint: disable=import-error
+
+
+"""Tests for the LexRank summarizer helpers"""
+
+import importlib
+from unittest.mock import patch
+import nltk
+import pytest
+import summarize_function
+
+
+def punkt_available():
+    """the sentence tokenizer data ships with the docker image, not with the repo"""
+    try:
+        nltk.data.find("tokenizers/punkt_tab")
+        return True
+    except LookupError:
+        return False
+
+
+needs_punkt = pytest.mark.skipif(
+    not punkt_available(), reason="NLTK punkt_tab data not installed"
+)
+
+TEXT = (
+    "The cat sat on the mat. Dogs are loyal animals. "
+    "The cat likes the mat a lot. The weather today is sunny and warm."
+)
+
+
+def test_import_does_not_download():
+    """Test importing the module never hits the network."""
+    with patch("nltk.download") as mock_download:
+        importlib.reload(summarize_function)
+        mock_download.assert_not_called()
+
+
+def test_missing_data_is_fetched_into_bundled_dir():
+    """Test punkt data is only downloaded when missing, into the bundled folder."""
+    with patch("nltk.data.find", side_effect=LookupError), patch(
+        "nltk.download"
+    ) as mock_download:
+        summarize_function.ensure_nltk_data()
+        mock_download.assert_called_once_with(
+            "punkt_tab", download_dir=summarize_function.NLTK_DATA_DIR, quiet=True
+        )
+
+
+@needs_punkt
+def test_summarizer_is_cached_per_language():
+    """Test the tokenizer and summarizer are built once per language."""
+    assert summarize_function.get_summarizer(
+        "english"
+    ) is summarize_function.get_summarizer("english")
+
+
+@needs_punkt
+def test_summarize_many_matches_single_calls():
+    """Test batch summaries are the same as summarizing one at a time."""
+    texts = [TEXT, "Only one sentence here."]
+    assert summarize_function.summarize_many(texts, "english", 1) == [
+        summarize_function.summarize_text(text, "english", 1) for text in texts
+    ]
+
+
+@needs_punkt
+def test_summarize_text_access_returns_a_sentence():
+    """Test the one sentence summary is a sentence from the text."""
+    summary = summarize_function.summarize_text_access(TEXT)
+    assert summary and summary in TEXT
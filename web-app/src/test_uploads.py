@@ -0,0 +1,130 @@
+"""Tests for resumable chunked uploads"""
+
+from unittest.mock import MagicMock, patch
+
+from bson import ObjectId
+import pytest
+
+import uploads
+
+
+def open_upload(**fields):
+    """an upload document that is still taking chunks"""
+    return {"_id": ObjectId(), "user_id": None, "state": uploads.OPEN, **fields}
+
+
+def test_chunk_reader_joins_chunks_in_order():
+    """Reads of any size see the chunks back to back."""
+    with patch.object(uploads.db, "upload_chunks") as chunks:
+        chunks.find.return_value = iter([{"data": b"abc"}, {"data": b"de"}])
+        reader = uploads.ChunkReader(ObjectId())
+        assert reader.read(2) == b"ab"
+        assert reader.read(2) == b"cd"
+        assert reader.read() == b"e"
+        assert reader.read(4) == b""
+        assert chunks.find.call_args.kwargs["sort"] == [("index", 1)]
+
+
+def test_put_chunk_upserts_by_index():
+    """A resent chunk overwrites the same (upload, index) document."""
+    upload = open_upload()
+    with patch.object(uploads.db, "upload_chunks") as chunks:
+        uploads.put_chunk(upload, 3, b"data")
+        query, update = chunks.update_one.call_args.args
+        assert query == {"upload_id": upload["_id"], "index": 3}
+        assert update["$set"]["data"] == b"data"
+        assert chunks.update_one.call_args.kwargs["upsert"] is True
+
+
+def test_put_chunk_rejects_closed_or_oversized():
+    """No chunks after completion, and none over the size limit."""
+    with pytest.raises(uploads.UploadError) as closed:
+        uploads.put_chunk(open_upload(state=uploads.DONE), 0, b"x")
+    assert closed.value.status == 409
+    with patch("uploads.MAX_CHUNK_BYTES", 2), pytest.raises(
+        uploads.UploadError
+    ) as large:
+        uploads.put_chunk(open_upload(), 0, b"xyz")
+    assert large.value.status == 413
+
+
+def test_complete_lists_missing_chunks():
+    """Completing with gaps names the chunks to resend."""
+    with patch("uploads.received", return_value=[0, 2]), pytest.raises(
+        uploads.UploadError
+    ) as error:
+        uploads.complete(open_upload(), 4, MagicMock())
+    assert error.value.status == 409
+    assert error.value.details == {"missing": [1, 3]}
+
+
+def test_complete_assembles_once():
+    """The chunks are stored as one recording and then dropped."""
+    upload = open_upload()
+    store = MagicMock(return_value=("recording_1.webm", "job1"))
+    with patch("uploads.received", return_value=[0, 1]), patch.object(
+        uploads.db, "uploads"
+    ) as docs, patch.object(uploads.db, "upload_chunks") as chunks:
+        docs.find_one_and_update.return_value = {**upload, "state": "assembling"}
+        assert uploads.complete(upload, 2, store) == ("recording_1.webm", "job1")
+
+        assert isinstance(store.call_args.args[0], uploads.ChunkReader)
+        done = docs.update_one.call_args.args[1]["$set"]
+        assert done == {
+            "state": "done",
+            "filename": "recording_1.webm",
+            "job_id": "job1",
+        }
+        chunks.delete_many.assert_called_once_with({"upload_id": upload["_id"]})
+
+    finished = open_upload(state=uploads.DONE, filename="f", job_id="j")
+    assert uploads.complete(finished, 2, store) == ("f", "j")
+    assert store.call_count == 1
+
+
+def test_complete_takes_over_a_stuck_assembly():
+    """An upload left assembling past its deadline can be claimed again."""
+    upload = open_upload(state=uploads.ASSEMBLING)
+    store = MagicMock(return_value=("recording_1.webm", "job1"))
+    with patch("uploads.received", return_value=[0]), patch.object(
+        uploads.db, "uploads"
+    ) as docs, patch.object(uploads.db, "upload_chunks"):
+        docs.find_one_and_update.return_value = upload
+        uploads.complete(upload, 1, store)
+
+        query, update = docs.find_one_and_update.call_args.args
+        stuck = query["$or"][1]
+        assert stuck["state"] == uploads.ASSEMBLING
+        assert stuck["assembling_until"]["$lt"] < update["$set"]["assembling_until"]
+        assert isinstance(update["$set"]["assembly_id"], ObjectId)
+        assert docs.update_one.call_args.args[1]["$unset"] == {
+            "assembly_id": "",
+            "assembling_until": "",
+        }
+
+
+def test_complete_reopens_only_its_own_claim():
+    """A failed store reopens the upload unless a retry has taken it over."""
+    upload = open_upload()
+    store = MagicMock(side_effect=RuntimeError("gridfs down"))
+    with patch("uploads.received", return_value=[0]), patch.object(
+        uploads.db, "uploads"
+    ) as docs, patch.object(uploads.db, "upload_chunks") as chunks:
+        docs.find_one_and_update.return_value = upload
+        with pytest.raises(RuntimeError):
+            uploads.complete(upload, 1, store)
+
+        claim = docs.find_one_and_update.call_args.args[1]["$set"]["assembly_id"]
+        query, update = docs.update_one.call_args.args
+        assert query == {"_id": upload["_id"], "assembly_id": claim}
+        assert update["$set"] == {"state": uploads.OPEN}
+        chunks.delete_many.assert_not_called()
+
+
+def test_find_hides_other_users_uploads():
+    """Someone else's upload id looks like it doesn't exist."""
+    with patch.object(uploads.db, "uploads") as docs:
+        docs.find_one.return_value = open_upload(user_id=ObjectId())
+        with pytest.raises(uploads.UploadError) as error:
+            uploads.find(ObjectId(), ObjectId())
+    assert error.value.status == 404
@@ -0,0 +1,151 @@
+"""Resumable chunked uploads
+
+The recorder sends each MediaRecorder chunk while it is still recording, so
+by the time the user presses stop nearly everything is already on the
+server. An upload is an 'uploads' document plus one 'upload_chunks' document
+per chunk, keyed by (upload_id, index) so a resent chunk just overwrites
+itself. complete() streams the chunks in order into gridfs like a normal
+upload, holding the upload in 'assembling' for at most
+UPLOAD_ASSEMBLE_TIMEOUT seconds so a server that dies halfway doesn't leave
+it stuck. Abandoned uploads expire with the TTL indexes in shared/mongo.py.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+
+import db
+
+# one MediaRecorder timeslice of opus is a few KB, this only stops abuse
+MAX_CHUNK_BYTES = int(os.getenv("UPLOAD_MAX_CHUNK_BYTES", str(1024 * 1024)))
+# seconds after which an upload left assembling can be completed again
+ASSEMBLE_TIMEOUT = int(os.getenv("UPLOAD_ASSEMBLE_TIMEOUT", "300"))
+
+OPEN, ASSEMBLING, DONE = "open", "assembling", "done"
+
+
+class UploadError(Exception):
+    """The upload can't take this request, status is the http status to answer with"""
+
+    def __init__(self, message, status, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def create(user_id=None):
+    """start an upload, returns its id"""
+    return db.uploads.insert_one(
+        {
+            "user_id": user_id,
+            "state": OPEN,
+            "created_at": datetime.now(timezone.utc),
+        }
+    ).inserted_id
+
+
+def find(upload_id, user_id=None):
+    """the upload document if it exists and belongs to this user"""
+    upload = db.uploads.find_one({"_id": upload_id})
+    if upload is None or upload.get("user_id") not in (None, user_id):
+        raise UploadError("no such upload", 404)
+    return upload
+
+
+def put_chunk(upload, index, data):
+    """store chunk number index, sending the same chunk twice is harmless"""
+    if upload["state"] != OPEN:
+        raise UploadError("upload already completed", 409, state=upload["state"])
+    if len(data) > MAX_CHUNK_BYTES:
+        raise UploadError("chunk too large", 413, max_chunk_bytes=MAX_CHUNK_BYTES)
+    db.upload_chunks.update_one(
+        {"upload_id": upload["_id"], "index": index},
+        {"$set": {"data": data, "created_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+
+
+def received(upload_id):
+    """indexes of the chunks stored so far, sorted, so a client can resend the rest"""
+    return [
+        doc["index"]
+        for doc in db.upload_chunks.find(
+            {"upload_id": upload_id}, {"index": 1, "_id": 0}, sort=[("index", 1)]
+        )
+    ]
+
+
+class ChunkReader:  # pylint: disable=too-few-public-methods
+    """read()-able view of an upload's chunks in order, one chunk in memory at a time"""
+
+    def __init__(self, upload_id):
+        self._chunks = db.upload_chunks.find(
+            {"upload_id": upload_id}, {"data": 1, "_id": 0}, sort=[("index", 1)]
+        )
+        self._buffer = b""
+
+    def read(self, size=-1):
+        """up to size bytes, everything left if size is negative"""
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk["data"]
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def complete(upload, chunk_count, store):
+    """assemble chunks 0..chunk_count-1 with store(stream) -> (filename, job_id),
+    only once even if the client retries, returns (filename, job_id)"""
+    if upload["state"] == DONE:
+        return upload["filename"], upload["job_id"]
+
+    missing = sorted(set(range(chunk_count)) - set(received(upload["_id"])))
+    if missing:
+        raise UploadError("chunks missing", 409, missing=missing)
+
+    # a crashed assembler's claim runs out, a retry can then take it over
+    now = datetime.now(timezone.utc)
+    assembly = {
+        "assembly_id": ObjectId(),
+        "assembling_until": now + timedelta(seconds=ASSEMBLE_TIMEOUT),
+    }
+    claimed = db.uploads.find_one_and_update(
+        {
+            "_id": upload["_id"],
+            "$or": [
+                {"state": OPEN},
+                {"state": ASSEMBLING, "assembling_until": {"$lt": now}},
+            ],
+        },
+        {"$set": {"state": ASSEMBLING, **assembly}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if claimed is None:
+        raise UploadError("upload is being completed", 409, state=ASSEMBLING)
+    unclaim = {"assembly_id": "", "assembling_until": ""}
+
+    try:
+        filename, job_id = store(ChunkReader(upload["_id"]))
+    except Exception:
+        # reopen the upload, unless a retry took it over once the claim ran out
+        db.uploads.update_one(
+            {"_id": upload["_id"], "assembly_id": assembly["assembly_id"]},
+            {"$set": {"state": OPEN}, "$unset": unclaim},
+        )
+        raise
+
+    db.uploads.update_one(
+        {"_id": upload["_id"]},
+        {
+            "$set": {"state": DONE, "filename": filename, "job_id": job_id},
+            "$unset": unclaim,
+        },
+    )
+    db.upload_chunks.delete_many({"upload_id": upload["_id"]})
+    return filename, job_id